@@ -0,0 +1,224 @@
+"""Benchmark the renderer and compare its throughput with a stored baseline.
+
+Run it with src on the Python path, e.g. through make bench.
+
+Throughput is measured in output samples per second on the best of several runs,
+with all synthesis caches cleared before each run. Baselines are only meaningful on
+the machine that recorded them, so they are stored per host name.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import runpy
+import platform
+import tempfile
+from typing import Dict, Final, Tuple, Callable, Iterator, Optional, Sequence
+from pathlib import Path
+from argparse import Namespace, ArgumentParser
+from functools import partial
+from contextlib import chdir, redirect_stdout
+
+import numpy as np
+from pedalboard.io import AudioFile  # type: ignore[attr-defined]
+
+from tablature import player
+from guitar_synth.chord import Chord
+from guitar_synth.track import AudioTrack
+from guitar_synth.stroke import Velocity
+from guitar_synth.sampler import Sampler
+from guitar_synth.temporal import Time
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer, feedback_loop
+from guitar_synth.instrument import StringTuning, PluckedStringInstrument
+from guitar_synth.processing import remove_dc_and_normalize
+
+type Case = Callable[[], int]
+
+ROOT_DIR: Final[Path] = Path(__file__).resolve().parents[1]
+DEMO_DIR: Final[Path] = ROOT_DIR / "demo"
+BASELINE_DIR: Final[Path] = ROOT_DIR / ".benchmarks"
+SAMPLE_RATE: Final[int] = 44100
+DEFAULT_THRESHOLD: Final[float] = 0.1
+DEFAULT_REPEAT: Final[int] = 3
+STRUM: Final[Velocity] = Velocity.down(Time.from_milliseconds(10))
+
+
+def main() -> None:
+    sys.exit(bench(parse_args()))
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> Namespace:
+    parser = ArgumentParser(prog="bench")
+    parser.add_argument(
+        "-k",
+        "--filter",
+        default="",
+        help="Only run the cases whose name contains this string",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Tolerated loss of throughput relative to the baseline, e.g. 0.1 for 10%%",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help="Number of runs of each case, of which the fastest is kept",
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="Store the results as the new baseline instead of comparing with it",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=BASELINE_DIR / f"{platform.node() or 'default'}.json",
+        help="Path to the baseline file (defaults to one per host name)",
+    )
+    return parser.parse_args(argv)
+
+
+def bench(args: Namespace) -> int:
+    results = {
+        name: measure(case, args.repeat)
+        for name, case in get_cases()
+        if args.filter in name
+    }
+    if args.save or not args.baseline.exists():
+        save_baseline(results, args.baseline)
+        return 0
+    with args.baseline.open(encoding="utf-8") as file:
+        baseline: Dict[str, float] = json.load(file)
+    return report(results, baseline, args.threshold)
+
+
+def measure(case: Case, repeat: int) -> float:
+    """Samples per second produced by the fastest of several runs of a case."""
+    best = float("inf")
+    num_samples = 0
+    for _ in range(max(repeat, 1)):
+        clear_caches()
+        start = time.perf_counter()
+        num_samples = case()
+        best = min(best, time.perf_counter() - start)
+    return num_samples / best
+
+
+def clear_caches() -> None:
+    VIBRATIONS.clear()
+    Synthesizer.strum_strings.cache_clear()
+    Synthesizer.strum_clip.cache_clear()
+    Sampler._vibrate.cache_clear()
+
+
+def save_baseline(results: Dict[str, float], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    for name, throughput in results.items():
+        print(f"{name:<32} {throughput:>14,.0f} samples/s")
+    print(f"Saved baseline {path}")
+
+
+def report(
+    results: Dict[str, float], baseline: Dict[str, float], threshold: float
+) -> int:
+    """Print the change of each case and return the number of regressions."""
+    num_regressions = 0
+    for name, throughput in results.items():
+        if name not in baseline:
+            print(f"{name:<32} {throughput:>14,.0f} samples/s        (no baseline)")
+            continue
+        change = throughput / baseline[name] - 1
+        regressed = change < -threshold
+        num_regressions += regressed
+        print(
+            f"{name:<32} {throughput:>14,.0f} samples/s {change:>+8.1%}"
+            + (" REGRESSION" if regressed else "")
+        )
+    return num_regressions
+
+
+def get_cases() -> Iterator[Tuple[str, Case]]:
+    yield "feedback_loop", bench_feedback_loop
+    yield "remove_dc_and_normalize", bench_remove_dc_and_normalize
+    yield "strum_strings", bench_strum_strings
+    yield "audio_track", bench_audio_track
+    for path in sorted((DEMO_DIR / "tabs").glob("*.yaml")):
+        yield f"play {path.stem}", partial(bench_play, path)
+    for path in sorted(DEMO_DIR.glob("play_*.py")):
+        yield f"demo {path.stem}", partial(bench_demo, path)
+
+
+def bench_feedback_loop() -> int:
+    num_samples = 10 * SAMPLE_RATE
+    for frequency in (82.41, 110.0, 146.83, 196.0, 246.94, 329.63):
+        buffer = np.random.uniform(-1, 1, round(SAMPLE_RATE / frequency))
+        feedback_loop(buffer, 0.498, num_samples)
+    return 6 * num_samples
+
+
+def bench_remove_dc_and_normalize() -> int:
+    samples = np.random.uniform(-1, 1, 10 * SAMPLE_RATE)
+    for _ in range(10):
+        remove_dc_and_normalize(samples, out=samples)
+    return 10 * samples.size
+
+
+def bench_strum_strings() -> int:
+    synthesizer = get_synthesizer()
+    num_samples = 0
+    for fret in range(12):
+        chord = Chord.from_numbers(fret, fret + 2, fret + 2, fret + 1, fret, fret)
+        num_samples += synthesizer.strum_strings(chord, STRUM).size
+    return num_samples
+
+
+def bench_audio_track() -> int:
+    synthesizer = get_synthesizer()
+    samples = synthesizer.strum_strings(Chord.from_numbers(0, 2, 2, 1, 0, 0), STRUM)
+    audio_track = AudioTrack(synthesizer.sample_rate)
+    for index in range(200):
+        audio_track.add_at(Time(index * 0.2), samples)
+    return 200 * samples.size
+
+
+def bench_play(path: Path) -> int:
+    with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()):
+        output = Path(directory) / "output.raw"
+        player.play(player.parse_args([str(path), "-o", str(output)]))
+        return output.stat().st_size // 2
+
+
+def bench_demo(path: Path) -> int:
+    """Run a demo script in a scratch directory, so its output is not kept."""
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        chdir(directory),
+        redirect_stdout(io.StringIO()),
+    ):
+        os.symlink(DEMO_DIR / "ir", "ir")
+        runpy.run_path(str(path), run_name="__main__")
+        num_samples = 0
+        for output in Path().glob("*.mp3"):
+            with AudioFile(str(output)) as file:
+                num_samples += file.frames
+        return num_samples
+
+
+def get_synthesizer() -> Synthesizer:
+    return Synthesizer(
+        PluckedStringInstrument(
+            tuning=StringTuning.from_notes("E2", "A2", "D3", "G3", "B3", "E4"),
+            vibration=Time(3.5),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
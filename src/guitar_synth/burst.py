@@ -1,14 +1,68 @@
-from typing import Protocol
+from typing import Tuple, Hashable, Optional, Protocol, Sequence, runtime_checkable
+from dataclasses import dataclass
 
 import numpy as np
+from numpy.typing import NDArray
 
 from guitar_synth.temporal import Hertz
 
 
-class BurstGenerator(Protocol):
+class BurstGenerator(Hashable, Protocol):
     def __call__(self, num_samples: int, sample_rate: Hertz) -> np.ndarray: ...
 
 
+@runtime_checkable
+class BatchBurstGenerator(BurstGenerator, Protocol):
+    def batch(
+        self, lengths: Sequence[int], sample_rate: Hertz
+    ) -> Tuple[NDArray[np.float64], NDArray[np.int64]]: ...
+
+
+@dataclass(frozen=True)
 class WhiteNoise:
+    seed: Optional[int] = None
+
     def __call__(self, num_samples: int, sample_rate: Hertz) -> np.ndarray:
-        return np.random.uniform(-1.0, 1.0, num_samples)
+        if self.seed is None:
+            return np.random.uniform(-1.0, 1.0, num_samples)
+        return np.random.default_rng(self.seed).uniform(-1.0, 1.0, num_samples)
+
+    def batch(
+        self, lengths: Sequence[int], sample_rate: Hertz
+    ) -> Tuple[NDArray[np.float64], NDArray[np.int64]]:
+        """Generate bursts of the given lengths with a single draw.
+
+        Unseeded bursts come out exactly as consecutive calls would produce them,
+        seeded ones all start the same sequence, as a single call does.
+        """
+        offsets = get_offsets(lengths)
+        if self.seed is None:
+            return np.random.uniform(-1.0, 1.0, offsets[-1]), offsets
+        noise = self(max(lengths, default=0), sample_rate)
+        bursts = np.empty(offsets[-1], dtype=np.float64)
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            bursts[start:end] = noise[: end - start]
+        return bursts, offsets
+
+
+def generate_bursts(
+    generator: BurstGenerator, lengths: Sequence[int], sample_rate: Hertz
+) -> Tuple[NDArray[np.float64], NDArray[np.int64]]:
+    """Bursts of the given lengths packed into one buffer, with their offsets.
+
+    The i-th burst is bursts[offsets[i] : offsets[i + 1]]. Generators providing a
+    batch method produce all of them at once, others are called once per burst.
+    """
+    if isinstance(generator, BatchBurstGenerator):
+        return generator.batch(lengths, sample_rate)
+    offsets = get_offsets(lengths)
+    bursts = np.empty(offsets[-1], dtype=np.float64)
+    for length, start in zip(lengths, offsets):
+        bursts[start : start + length] = generator(length, sample_rate)  # noqa: E203
+    return bursts, offsets
+
+
+def get_offsets(lengths: Sequence[int]) -> NDArray[np.int64]:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
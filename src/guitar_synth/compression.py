@@ -0,0 +1,77 @@
+import enum
+from typing import Final
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+DECODE_BLOCK_SIZE: Final[int] = 65536
+
+
+class Compression(enum.StrEnum):
+    INT16 = enum.auto()
+    FLOAT16 = enum.auto()
+
+
+@dataclass(frozen=True, eq=False)
+class CompressedSamples:
+    """Samples stored as 16-bit codes with a scale shared by the whole clip.
+
+    INT16 spreads the peak of the clip over the integer range, which bounds the
+    error of every sample by half a step, i.e. peak / 65534. FLOAT16 keeps the
+    relative precision of half floats, bounding the error by peak / 2048.
+    """
+
+    codes: NDArray[np.int16] | NDArray[np.float16]
+    scale: float
+
+    @classmethod
+    def encode(
+        cls, samples: NDArray[np.float64], compression: Compression
+    ) -> "CompressedSamples":
+        peak = float(np.max(np.abs(samples), initial=0.0))
+        match compression:
+            case Compression.INT16:
+                scale = peak / np.iinfo(np.int16).max if peak > 0 else 1.0
+                codes: NDArray[np.int16] | NDArray[np.float16] = np.rint(
+                    samples / scale
+                ).astype(np.int16)
+            case Compression.FLOAT16:
+                scale = peak if peak > 0 else 1.0
+                codes = (samples / scale).astype(np.float16)
+        codes.flags.writeable = False
+        return cls(codes, scale)
+
+    def __len__(self) -> int:
+        return self.codes.size
+
+    def __getitem__(self, index: slice) -> "CompressedSamples":
+        return CompressedSamples(self.codes[index], self.scale)
+
+    @property
+    def size(self) -> int:
+        return self.codes.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def decode(self) -> NDArray[np.float64]:
+        return np.multiply(self.codes, self.scale, dtype=np.float64)
+
+    def add_to(self, out: NDArray[np.float64]) -> None:
+        """Decode into a buffer of the same length, one block at a time."""
+        for start in range(0, self.size, DECODE_BLOCK_SIZE):
+            end = min(start + DECODE_BLOCK_SIZE, self.size)
+            out[start:end] += np.multiply(self.codes[start:end], self.scale)
+
+
+type Clip = NDArray[np.float64] | CompressedSamples
+
+
+def mix_into(out: NDArray[np.float64], samples: Clip) -> None:
+    """Add plain or compressed samples to a buffer of the same length."""
+    if isinstance(samples, CompressedSamples):
+        samples.add_to(out)
+    else:
+        out += samples
@@ -1,11 +1,17 @@
-from typing import Self, Tuple, Optional
+from typing import Self, Final, Tuple, Optional
 from functools import cache, cached_property
 from dataclasses import dataclass
 
+import numpy as np
+from numpy.typing import NDArray, ArrayLike
+
 from guitar_synth.chord import Chord
 from guitar_synth.pitch import Pitch
 from guitar_synth.temporal import Time
 
+DEFAULT_NUM_FRETS: Final[int] = 24
+MUTED: Final[int] = -1
+
 
 @dataclass(frozen=True)
 class VibratingString:
@@ -36,15 +42,50 @@ class PluckedStringInstrument:
     tuning: StringTuning
     vibration: Time
     damping: float = 0.5
+    num_frets: int = DEFAULT_NUM_FRETS
 
     def __post_init__(self) -> None:
         if not (0 < self.damping <= 0.5):
             raise ValueError("Damping must be between 0 and 0.5")
+        if self.num_frets < 0:
+            raise ValueError("Number of frets must not be negative")
+        self.fret_frequencies  # Precompute the lookup table up front
 
     @cached_property
     def num_strings(self) -> int:
         return len(self.tuning.strings)
 
+    @cached_property
+    def fret_frequencies(self) -> NDArray[np.float64]:
+        """Frequencies of every string (rows) pressed at every fret (columns)."""
+        return get_fret_frequencies(self.tuning, self.num_frets)
+
+    def get_fret_frequencies(self, max_fret: int) -> NDArray[np.float64]:
+        """A frequency table with columns up to max_fret at least.
+
+        Frets past num_frets are not limited, they are looked up in a larger table.
+        """
+        if max_fret <= self.num_frets:
+            return self.fret_frequencies
+        return get_fret_frequencies(self.tuning, max_fret)
+
+    def resolve(self, chords: ArrayLike) -> NDArray[np.float64]:
+        """Look up the frequencies of an array of chords in one go.
+
+        Chords are rows of fret numbers in the string order of the tuning, muted
+        strings are marked with MUTED and resolve to NaN.
+        """
+        frets = np.asarray(chords, dtype=np.int64)
+        if frets.ndim == 0 or frets.shape[-1] != self.num_strings:
+            raise ValueError(
+                "Chord must have the same number of strings as the instrument"
+            )
+        table = self.get_fret_frequencies(int(frets.max(initial=0)))
+        muted = frets < 0
+        frequencies = table[np.arange(self.num_strings), np.where(muted, 0, frets)]
+        frequencies[muted] = np.nan
+        return frequencies
+
     @cache
     def downstroke(self, chord: Chord) -> Tuple[Pitch, ...]:
         return tuple(reversed(self.upstroke(chord)))
@@ -55,8 +96,23 @@ class PluckedStringInstrument:
             raise ValueError(
                 "Chord must have the same number of strings as the instrument"
             )
+        frets = [fret for fret in chord if fret is not None]
+        table = self.get_fret_frequencies(max(frets, default=0))
         return tuple(
-            string.press_fret(fret_number)
-            for string, fret_number in zip(self.tuning.strings, chord)
-            if fret_number is not None
+            Pitch(float(table[string, fret]))
+            for string, fret in enumerate(chord)
+            if fret is not None
         )
+
+
+@cache
+def get_fret_frequencies(tuning: StringTuning, num_frets: int) -> NDArray[np.float64]:
+    table = np.array(
+        [
+            [string.press_fret(fret).frequency for fret in range(num_frets + 1)]
+            for string in tuning.strings
+        ],
+        dtype=np.float64,
+    )
+    table.flags.writeable = False
+    return table
@@ -1,9 +1,12 @@
 import re
-from typing import Self
+from typing import Self, Final, Tuple
 from dataclasses import dataclass
 
 from guitar_synth.temporal import Hertz
 
+NOTATION_PATTERN: Final[re.Pattern[str]] = re.compile(r"([A-G]#?)(-?\d+)?")
+SEMITONES: Final[Tuple[str, ...]] = tuple("C C# D D# E F F# G G# A A# B".split())
+
 
 @dataclass(frozen=True)
 class Pitch:
@@ -11,11 +14,10 @@ class Pitch:
 
     @classmethod
     def from_scientific_notation(cls, notation: str) -> Self:
-        if match := re.match(r"([A-G]#?)(-?\d+)?", notation):
+        if match := NOTATION_PATTERN.match(notation):
             note = match.group(1)
             octave = int(match.group(2) or 0)
-            semitones = "C C# D D# E F F# G G# A A# B".split()
-            index = octave * 12 + semitones.index(note) - 57
+            index = octave * 12 + SEMITONES.index(note) - 57
             return cls(frequency=440.0 * 2 ** (index / 12))
         else:
             raise ValueError(f"Invalid pitch notation: '{notation}'")
@@ -1,10 +1,155 @@
+from typing import Final, Optional
+
 import numpy as np
 from numpy.typing import NDArray
 
+from guitar_synth.temporal import Hertz
+
+INT16_SCALE: Final[int] = 2**15 - 1
+CONVOLUTION_BLOCK_SIZE: Final[int] = 2048
+
+
+class RunningStats:
+    """Mean and extremes of a signal arriving in blocks."""
+
+    def __init__(self) -> None:
+        self.num_samples = 0
+        self.total = np.float64(0)
+        self.maximum = np.float64(-np.inf)
+        self.minimum = np.float64(np.inf)
+
+    @property
+    def mean(self) -> np.float64:
+        return np.float64(self.total / self.num_samples)
+
+    @property
+    def peak(self) -> np.float64:
+        """Peak amplitude of the signal once its DC offset is removed."""
+        return max(self.maximum - self.mean, self.mean - self.minimum)
+
+    def update(self, samples: NDArray[np.float64]) -> None:
+        if samples.size:
+            self.num_samples += samples.size
+            self.total += samples.sum()
+            self.maximum = max(self.maximum, samples.max())
+            self.minimum = min(self.minimum, samples.min())
+
+    def apply(
+        self, samples: NDArray[np.float64], out: Optional[NDArray[np.float64]] = None
+    ) -> NDArray[np.float64]:
+        """Remove the DC offset from a block and normalize it to the running peak."""
+        out = np.subtract(samples, self.mean, out=out)
+        return np.divide(out, self.peak, out=out)
+
+
+class PartitionedConvolver:
+    """Uniformly-partitioned overlap-add FFT convolution of a signal arriving in blocks.
+
+    The impulse response is split into partitions of the block size whose spectra
+    are computed once by partition_spectra and can be shared by any number of
+    convolvers. Blocks of any length are convolved without latency: a partially
+    filled partition is convolved as far as it goes and again once it is complete.
+    """
+
+    def __init__(self, spectra: NDArray[np.complex128]) -> None:
+        self.spectra = spectra
+        self.block_size = spectra.shape[1] - 1
+        self.history = np.zeros_like(spectra)
+        self.block = np.zeros(self.block_size, dtype=np.float64)
+        self.overlap = np.zeros(self.block_size, dtype=np.float64)
+        self.num_buffered = 0
+
+    def __call__(self, samples: NDArray[np.float64]) -> NDArray[np.float64]:
+        output = np.empty(samples.size, dtype=np.float64)
+        start = 0
+        while start < samples.size:
+            begin = self.num_buffered
+            end = min(self.block_size, begin + samples.size - start)
+            self.block[begin:end] = samples[start : start + end - begin]  # noqa: E203
+            self.history[0] = np.fft.rfft(self.block, 2 * self.block_size)
+            spectrum = np.einsum("ij,ij->j", self.history, self.spectra)
+            convolved = np.fft.irfft(spectrum, 2 * self.block_size)
+            output[start : start + end - begin] = (  # noqa: E203
+                convolved[begin:end] + self.overlap[begin:end]
+            )
+            start += end - begin
+            self.num_buffered = end
+            if end == self.block_size:
+                self.overlap = convolved[self.block_size :]  # noqa: E203
+                self.history[1:] = self.history[:-1]
+                self.block[:] = 0
+                self.num_buffered = 0
+        return output
+
+
+def partition_spectra(
+    impulse_response: NDArray[np.float64], block_size: int = CONVOLUTION_BLOCK_SIZE
+) -> NDArray[np.complex128]:
+    """Spectra of consecutive partitions of an impulse response, one per row."""
+    num_partitions = max(-(-impulse_response.size // block_size), 1)
+    partitions = np.zeros(num_partitions * block_size, dtype=np.float64)
+    partitions[: impulse_response.size] = impulse_response
+    spectra: NDArray[np.complex128] = np.fft.rfft(
+        partitions.reshape(num_partitions, block_size), 2 * block_size, axis=1
+    )
+    spectra.flags.writeable = False
+    return spectra
+
+
+def remove_dc(
+    samples: NDArray[np.float64], out: Optional[NDArray[np.float64]] = None
+) -> NDArray[np.float64]:
+    return np.subtract(samples, np.float64(samples.mean()), out=out)
+
+
+def normalize(
+    samples: NDArray[np.float64], out: Optional[NDArray[np.float64]] = None
+) -> NDArray[np.float64]:
+    return np.divide(samples, get_peak(samples), out=out)
+
+
+def remove_dc_and_normalize(
+    samples: NDArray[np.float64], out: Optional[NDArray[np.float64]] = None
+) -> NDArray[np.float64]:
+    """Same as normalize(remove_dc(samples)) without intermediate arrays."""
+    stats = RunningStats()
+    stats.update(samples)
+    return stats.apply(samples, out=out)
+
+
+def get_peak(samples: NDArray[np.float64]) -> np.float64:
+    """Same as np.abs(samples).max() without an intermediate array."""
+    return np.float64(max(samples.max(), -samples.min()))
+
+
+def resample(
+    samples: NDArray[np.float64], source_rate: Hertz, target_rate: Hertz
+) -> NDArray[np.float64]:
+    if source_rate == target_rate:
+        return samples
+    num_samples = round(samples.size * target_rate / source_rate)
+    resampled: NDArray[np.float64] = np.interp(
+        np.arange(num_samples) * (source_rate / target_rate),
+        np.arange(samples.size),
+        samples,
+    )
+    return resampled
+
+
+def fade_out(samples: NDArray[np.float64]) -> NDArray[np.float64]:
+    return samples * np.linspace(1.0, 0.0, samples.size, endpoint=False)
 
-def remove_dc(samples: NDArray[np.float64]) -> NDArray[np.float64]:
-    return samples - np.float64(samples.mean())
 
+def quantize(samples: NDArray[np.float64], dither: bool = False) -> NDArray[np.int16]:
+    """Convert samples in the range [-1, 1] to 16-bit integers.
 
-def normalize(samples: NDArray[np.float64]) -> NDArray[np.float64]:
-    return samples / np.float64(np.abs(samples).max())
+    Dithering adds triangular noise of one least significant bit to decorrelate the
+    rounding error from the signal.
+    """
+    scaled = samples * INT16_SCALE
+    if dither:
+        scaled += np.random.uniform(-0.5, 0.5, samples.size)
+        scaled += np.random.uniform(-0.5, 0.5, samples.size)
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, -INT16_SCALE - 1, INT16_SCALE, out=scaled)
+    return scaled.astype("<i2")
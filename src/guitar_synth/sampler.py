@@ -0,0 +1,97 @@
+from typing import Dict, Tuple, Optional
+from functools import cache, cached_property
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from guitar_synth.chord import Chord
+from guitar_synth.stroke import Velocity
+from guitar_synth.temporal import Time, Hertz
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer
+
+
+class SampleBank:
+    """Pre-rendered vibrations indexed by their frequency."""
+
+    def __init__(
+        self, samples: Dict[float, NDArray[np.float64]], num_samples: Optional[int] = None
+    ) -> None:
+        if num_samples is None:
+            num_samples = max(sound.size for sound in samples.values())
+        self.num_samples = num_samples
+        self.frequencies = np.array(sorted(samples), dtype=np.float64)
+        self.samples = tuple(samples[float(frequency)] for frequency in self.frequencies)
+        for sound in self.samples:
+            sound.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def play(self, frequency: Hertz, num_samples: int) -> Optional[NDArray[np.float64]]:
+        """Serve a note from the closest sample at or above the requested frequency.
+
+        Notes matching a sample exactly are returned as a view of its prefix, others
+        are resampled. Samples cut short by a silence threshold yield shorter notes.
+        Returns None when the note is longer than the bank was rendered for.
+        """
+        index = int(np.searchsorted(self.frequencies, frequency))
+        if index == len(self) or num_samples > self.num_samples:
+            return None
+        source = self.samples[index]
+        ratio = frequency / self.frequencies[index]
+        if ratio == 1.0:
+            return source[:num_samples]
+        positions = np.arange(num_samples) * ratio
+        positions = positions[positions <= source.size - 1]
+        resampled: NDArray[np.float64] = np.interp(
+            positions, np.arange(source.size), source
+        )
+        return resampled
+
+
+@dataclass(frozen=True)
+class Sampler(Synthesizer):
+    """Synthesizer rendering every fret of the instrument once when it is created."""
+
+    def __post_init__(self) -> None:
+        self.bank  # Render the whole bank up front
+
+    @cached_property
+    def bank(self) -> SampleBank:
+        frequencies = [
+            float(frequency) for frequency in np.unique(self.instrument.fret_frequencies)
+        ]
+        sounds = VIBRATIONS.vibrate_many(
+            [
+                self.get_vibration(
+                    frequency, self.instrument.vibration, self.instrument.damping
+                )
+                for frequency in frequencies
+            ]
+        )
+        return SampleBank(
+            dict(zip(frequencies, sounds)),
+            self.instrument.vibration.get_num_samples(self.sample_rate),
+        )
+
+    def _vibrate_strings(
+        self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
+    ) -> Tuple[NDArray[np.float64], ...]:
+        """Vibrations of the strings of a strum, played from the bank one by one."""
+        if vibration is None:
+            vibration = self.instrument.vibration
+        return tuple(
+            self._vibrate(pitch.frequency, vibration, self.instrument.damping)
+            for pitch in self._stroke(chord, velocity)
+        )
+
+    @cache
+    def _vibrate(
+        self, frequency: Hertz, duration: Time, damping: float = 0.5
+    ) -> NDArray[np.float64]:
+        if damping == self.instrument.damping:
+            sound = self.bank.play(frequency, duration.get_num_samples(self.sample_rate))
+            if sound is not None:
+                return sound
+        return super()._vibrate(frequency, duration, damping)
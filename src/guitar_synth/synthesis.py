@@ -1,70 +1,381 @@
-from typing import Final, Iterator, Optional, Sequence
+import threading
+from typing import (
+    Any,
+    Dict,
+    List,
+    Final,
+    Tuple,
+    Mapping,
+    Hashable,
+    Iterable,
+    Optional,
+    Sequence,
+)
 from functools import cache
-from itertools import cycle
-from dataclasses import dataclass
+from dataclasses import replace, dataclass
 
 import numpy as np
 from numpy.typing import NDArray
 
-from guitar_synth.burst import WhiteNoise, BurstGenerator
+from guitar_synth.burst import WhiteNoise, BurstGenerator, generate_bursts
 from guitar_synth.chord import Chord
+from guitar_synth.pitch import Pitch
 from guitar_synth.stroke import Velocity, Direction
 from guitar_synth.temporal import Time, Hertz
 from guitar_synth.instrument import PluckedStringInstrument
-from guitar_synth.processing import normalize, remove_dc
+from guitar_synth.processing import remove_dc_and_normalize
+from guitar_synth.compression import Clip, Compression, CompressedSamples
 
 AUDIO_CD_SAMPLING_RATE: Final[int] = 44100
 
 
+@dataclass(frozen=True)
+class StringVibration:
+    """Physical parameters that fully determine a synthesized string vibration."""
+
+    frequency: Hertz
+    duration: Time
+    damping: float
+    sample_rate: int
+    burst_generator: BurstGenerator
+    silence_threshold: Optional[float] = None
+
+    @property
+    def num_burst_samples(self) -> int:
+        return round(self.sample_rate / self.frequency)
+
+    def render(self, burst: Optional[NDArray[np.float64]] = None) -> NDArray[np.float64]:
+        """Render the vibration, consuming the given burst if any."""
+        assert 0 < self.damping <= 0.5
+
+        if burst is None:
+            burst = self.burst_generator(
+                num_samples=self.num_burst_samples, sample_rate=self.sample_rate
+            )
+        samples = feedback_loop(
+            burst,
+            self.damping,
+            self.duration.get_num_samples(self.sample_rate),
+            self.silence_threshold,
+        )
+        return remove_dc_and_normalize(samples, out=samples)
+
+    @property
+    def string(self) -> "StringVibration":
+        """The same vibration regardless of its duration."""
+        return replace(self, duration=Time(0))
+
+
+class VibrationPrefix:
+    """Output of the feedback loop of a string, extended one period at a time.
+
+    Vibrations of the string lasting any duration are prefixes of it, as long as
+    they start from the same burst.
+    """
+
+    def __init__(
+        self,
+        burst: NDArray[np.float64],
+        damping: float,
+        silence_threshold: Optional[float] = None,
+    ) -> None:
+        self.buffer = burst
+        self.damping = damping
+        if silence_threshold is None:
+            self.min_amplitude = None
+        else:
+            self.min_amplitude = np.ptp(burst) * 10 ** (silence_threshold / 20)
+        self.samples = np.empty(0, dtype=np.float64)
+        self.num_samples = 0
+        self.silent = False
+
+    def extend(self, num_samples: int) -> NDArray[np.float64]:
+        """The first num_samples samples, fewer if the string fell silent before."""
+        period_size = self.buffer.size
+        while self.num_samples < num_samples and not self.silent:
+            if self.num_samples + period_size > self.samples.size:
+                size = get_prefix_size(self.samples.size, num_samples, period_size)
+                samples = np.empty(size, dtype=np.float64)
+                samples[: self.num_samples] = self.samples[: self.num_samples]
+                self.samples = samples
+            start, self.num_samples = self.num_samples, self.num_samples + period_size
+            period = self.samples[start : self.num_samples]  # noqa: E203
+            period[:] = self.buffer
+            if self.min_amplitude is not None and np.ptp(period) < self.min_amplitude:
+                self.silent = True
+            else:
+                advance(self.buffer, self.damping)
+        return self.samples[: min(num_samples, self.num_samples)]
+
+
+class SynthesisCache:
+    """Rendered vibrations shared by all tracks and songs of the process.
+
+    The feedback loop output of every string is kept whatever the duration, so
+    vibrations differing only in duration are normalized from the same samples
+    instead of being synthesized again. Prefixes are extended in place, so cache
+    updates hold a lock for renders running in several threads. The cache grows
+    while rendering, trim bounds it to maxsize entries between renders.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None) -> None:
+        self.entries: Dict[Hashable, NDArray[np.float64]] = {}
+        self.prefixes: Dict[StringVibration, VibrationPrefix] = {}
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def vibrate(self, vibration: StringVibration) -> NDArray[np.float64]:
+        with self.lock:
+            samples = self.get(vibration)
+            if samples is None:
+                samples = self.render(vibration)
+                self.put(vibration, samples)
+            return samples
+
+    def vibrate_many(
+        self, vibrations: Sequence[StringVibration]
+    ) -> Tuple[NDArray[np.float64], ...]:
+        """Like vibrate, generating the bursts of all missing vibrations in batches."""
+        with self.lock:
+            missing = [
+                vibration
+                for vibration in dict.fromkeys(vibrations)
+                if self.get(vibration) is None
+            ]
+            strings: Dict[Tuple[BurstGenerator, int], List[StringVibration]] = {}
+            for string in dict.fromkeys(vibration.string for vibration in missing):
+                if string not in self.prefixes:
+                    key = (string.burst_generator, string.sample_rate)
+                    strings.setdefault(key, []).append(string)
+            for (burst_generator, sample_rate), group in strings.items():
+                bursts, offsets = generate_bursts(
+                    burst_generator,
+                    [string.num_burst_samples for string in group],
+                    sample_rate,
+                )
+                for string, start, end in zip(group, offsets[:-1], offsets[1:]):
+                    self.prefixes[string] = VibrationPrefix(
+                        bursts[start:end], string.damping, string.silence_threshold
+                    )
+            for vibration in missing:
+                self.put(vibration, self.render(vibration))
+            return tuple(self.entries[vibration] for vibration in vibrations)
+
+    def render(self, vibration: StringVibration) -> NDArray[np.float64]:
+        """Render a vibration, extending the output of its string if needed."""
+        assert 0 < vibration.damping <= 0.5
+
+        num_samples = vibration.duration.get_num_samples(vibration.sample_rate)
+        with self.lock:
+            prefix = self.prefixes.get(vibration.string)
+            if prefix is None:
+                burst = vibration.burst_generator(
+                    num_samples=vibration.num_burst_samples,
+                    sample_rate=vibration.sample_rate,
+                )
+                prefix = VibrationPrefix(
+                    burst, vibration.damping, vibration.silence_threshold
+                )
+                self.prefixes[vibration.string] = prefix
+            samples = prefix.extend(num_samples)
+        return remove_dc_and_normalize(samples)
+
+    def get(self, key: Hashable) -> Optional[NDArray[np.float64]]:
+        samples = self.entries.pop(key, None)
+        if samples is None:
+            self.misses += 1
+        else:
+            self.entries[key] = samples  # Most recently used last
+            self.hits += 1
+        return samples
+
+    def put(self, key: Hashable, samples: NDArray[np.float64]) -> None:
+        self.entries[key] = samples
+
+    def update(self, entries: Mapping[Hashable, NDArray[np.float64]]) -> None:
+        self.entries.update(entries)
+
+    def trim(self) -> None:
+        """Evict the least recently used entries past maxsize, and unused prefixes."""
+        with self.lock:
+            if self.maxsize is not None and len(self.entries) > self.maxsize:
+                num_evicted = len(self.entries) - self.maxsize
+                self.retain(list(self.entries)[num_evicted:])
+
+    def retain(self, keys: Iterable[Hashable]) -> None:
+        """Evict the entries other than the given ones, and unused prefixes."""
+        with self.lock:
+            retained = set(keys)
+            self.entries = {
+                key: samples for key, samples in self.entries.items() if key in retained
+            }
+            strings = {
+                key.string for key in self.entries if isinstance(key, StringVibration)
+            }
+            self.prefixes = {
+                string: prefix
+                for string, prefix in self.prefixes.items()
+                if string in strings
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.prefixes.clear()
+            self.hits = self.misses = 0
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "maxsize": self.maxsize,
+            "currsize": len(self),
+        }
+
+
+VIBRATIONS: Final[SynthesisCache] = SynthesisCache()
+
+
 @dataclass(frozen=True)
 class Synthesizer:
     instrument: PluckedStringInstrument
     burst_generator: BurstGenerator = WhiteNoise()
     sample_rate: int = AUDIO_CD_SAMPLING_RATE
+    silence_threshold: Optional[float] = None
+    compression: Optional[Compression] = None
 
     @cache
     def strum_strings(
         self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
     ) -> NDArray[np.float64]:
+        return self._strum(chord, velocity, vibration)
+
+    @cache
+    def strum_clip(
+        self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
+    ) -> Clip:
+        """Cached strum, stored compactly when the synthesizer has a compression."""
+        if self.compression is None:
+            return self.strum_strings(chord, velocity, vibration)
+        return CompressedSamples.encode(
+            self._strum(chord, velocity, vibration), self.compression
+        )
+
+    def _strum(
+        self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
+    ) -> NDArray[np.float64]:
+        sounds = self._vibrate_strings(chord, velocity, vibration)
+        return self._overlay(sounds, velocity.delay)
+
+    def pluck_strings(
+        self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
+    ) -> Tuple[Tuple[int, int, NDArray[np.float64]], ...]:
+        """Vibrations of a strum kept apart, with their string and delay in samples."""
+        return tuple(
+            (string, offset, sound)
+            for (string, offset), sound in zip(
+                self.get_string_offsets(chord, velocity),
+                self._vibrate_strings(chord, velocity, vibration),
+            )
+        )
+
+    def render_into(
+        self,
+        out: NDArray[np.float64],
+        offset: int,
+        chord: Chord,
+        velocity: Velocity,
+        vibration: Optional[Time] = None,
+        gain: float = 1.0,
+    ) -> None:
+        """Add a strum to a buffer from an offset on, one string vibration at a time.
+
+        Unlike adding the output of strum_strings, this allocates no buffer for the
+        strum itself. Samples falling outside of the buffer are left out.
+        """
+        for _, delay, sound in self.pluck_strings(chord, velocity, vibration):
+            start = offset + delay
+            first, last = max(-start, 0), min(sound.size, out.size - start)
+            if first >= last:
+                continue
+            target = out[start + first : start + last]  # noqa: E203
+            if gain == 1.0:
+                target += sound[first:last]
+            else:
+                target += gain * sound[first:last]
+
+    def get_string_offsets(
+        self, chord: Chord, velocity: Velocity
+    ) -> Tuple[Tuple[int, int], ...]:
+        """Strings plucked by a strum in order, with their delay in samples."""
+        strings = [string for string, fret in enumerate(chord) if fret is not None]
+        if velocity.direction != Direction.UP:
+            strings.reverse()
+        delay = velocity.delay.get_num_samples(self.sample_rate)
+        return tuple((string, i * delay) for i, string in enumerate(strings))
+
+    def get_num_samples(
+        self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
+    ) -> int:
+        """Length of the strum_strings output, computed without synthesizing it.
+
+        With a silence threshold this is an upper bound, as vibrations may be cut short.
+        """
         if vibration is None:
             vibration = self.instrument.vibration
-        if velocity.direction == Direction.UP:
-            stroke = self.instrument.upstroke
-        else:
-            stroke = self.instrument.downstroke
+        num_strings = len(self.instrument.upstroke(chord))
+        if num_strings == 0:
+            return 0
+        return (num_strings - 1) * velocity.delay.get_num_samples(
+            self.sample_rate
+        ) + vibration.get_num_samples(self.sample_rate)
 
-        sounds = tuple(
-            self._vibrate(pitch.frequency, vibration, self.instrument.damping)
-            for pitch in stroke(chord)
+    def get_vibrations(
+        self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
+    ) -> Tuple[StringVibration, ...]:
+        """String vibrations a strum is made of."""
+        if vibration is None:
+            vibration = self.instrument.vibration
+        return tuple(
+            self.get_vibration(pitch.frequency, vibration, self.instrument.damping)
+            for pitch in self._stroke(chord, velocity)
         )
 
-        return self._overlay(sounds, velocity.delay)
+    def get_vibration(
+        self, frequency: Hertz, duration: Time, damping: float = 0.5
+    ) -> StringVibration:
+        return StringVibration(
+            frequency=frequency,
+            duration=duration,
+            damping=damping,
+            sample_rate=self.sample_rate,
+            burst_generator=self.burst_generator,
+            silence_threshold=self.silence_threshold,
+        )
 
-    @cache
     def _vibrate(
         self, frequency: Hertz, duration: Time, damping: float = 0.5
     ) -> NDArray[np.float64]:
-        assert 0 < damping <= 0.5
+        return VIBRATIONS.vibrate(self.get_vibration(frequency, duration, damping))
 
-        def feedback_loop() -> Iterator[float]:
-            buffer = self.burst_generator(
-                num_samples=round(self.sample_rate / frequency),
-                sample_rate=self.sample_rate,
-            )
-            for i in cycle(range(buffer.size)):
-                yield (current_sample := buffer[i])
-                next_sample = buffer[(i + 1) % buffer.size]
-                buffer[i] = (current_sample + next_sample) * damping
-
-        return normalize(
-            remove_dc(
-                np.fromiter(
-                    feedback_loop(),
-                    np.float64,
-                    duration.get_num_samples(self.sample_rate),
-                )
-            )
-        )
+    def _vibrate_strings(
+        self, chord: Chord, velocity: Velocity, vibration: Optional[Time] = None
+    ) -> Tuple[NDArray[np.float64], ...]:
+        """Vibrations of the strings of a strum, synthesizing missing ones in a batch."""
+        return VIBRATIONS.vibrate_many(self.get_vibrations(chord, velocity, vibration))
+
+    def _stroke(self, chord: Chord, velocity: Velocity) -> Tuple[Pitch, ...]:
+        if velocity.direction == Direction.UP:
+            return self.instrument.upstroke(chord)
+        return self.instrument.downstroke(chord)
 
     def _overlay(
         self, sounds: Sequence[NDArray[np.float64]], delay: Time
@@ -78,3 +389,48 @@ class Synthesizer:
             offset = i * num_delay_samples
             samples[offset : offset + sound.size] += sound  # noqa: E203
         return samples
+
+
+def feedback_loop(
+    buffer: NDArray[np.float64],
+    damping: float,
+    num_samples: int,
+    silence_threshold: Optional[float] = None,
+) -> NDArray[np.float64]:
+    """Run the Karplus-Strong feedback loop one period of the buffer at a time.
+
+    With a silence threshold in dBFS, the loop stops after the first period whose
+    amplitude falls that far below the amplitude of the burst.
+    """
+    samples = np.empty(num_samples, dtype=np.float64)
+    if silence_threshold is None:
+        min_amplitude = None
+    else:
+        min_amplitude = np.ptp(buffer) * 10 ** (silence_threshold / 20)
+    for start in range(0, num_samples, buffer.size):
+        period = samples[start : start + buffer.size]  # noqa: E203
+        period[:] = buffer[: period.size]
+        if min_amplitude is not None and np.ptp(period) < min_amplitude:
+            return samples[: start + period.size]
+        advance(buffer, damping)
+    return samples
+
+
+def advance(buffer: NDArray[np.float64], damping: float) -> None:
+    """Run one period of the Karplus-Strong recurrence over the buffer in place."""
+    first_sample = buffer[0]
+    buffer[:-1] = (buffer[:-1] + buffer[1:]) * damping
+    buffer[-1] = (buffer[-1] + (buffer[0] if buffer.size > 1 else first_sample)) * (
+        damping
+    )
+
+
+def get_prefix_size(size: int, num_samples: int, period_size: int) -> int:
+    """Capacity of a prefix of the given capacity once extended to num_samples.
+
+    Capacities are whole periods and at least double when they grow, so that
+    renders of increasing durations copy the samples a few times only.
+    """
+    if num_samples <= size:
+        return size
+    return max(-(-num_samples // period_size) * period_size, 2 * size)
@@ -1,15 +1,35 @@
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple, Optional
 from decimal import Decimal
+from operator import itemgetter
 
 import numpy as np
 from numpy.typing import NDArray
 
 from guitar_synth.temporal import Time, Hertz
+from guitar_synth.compression import Clip, CompressedSamples, mix_into
 
 
 class AudioTrack:
-    def __init__(self, sampling_rate: Hertz) -> None:
+    """Mono audio mixed from samples placed at given instants.
+
+    Samples are kept in the optional preallocated buffer, e.g. a np.memmap backed by
+    a file on disk, as long as they fit in it. Past its end, they move to a buffer at
+    least twice as long, so growing the track copies each sample about once.
+    """
+
+    def __init__(
+        self,
+        sampling_rate: Hertz,
+        start: Time = Time(0),
+        buffer: Optional[NDArray[np.float64]] = None,
+    ) -> None:
         self.sampling_rate = sampling_rate
-        self.samples: NDArray[np.float64] = np.array([], dtype=np.float64)
+        self.start = start
+        self.buffer = buffer
+        self.samples: NDArray[np.float64] = (
+            np.array([], dtype=np.float64) if buffer is None else buffer[:0]
+        )
 
     def __len__(self) -> int:
         return self.samples.size
@@ -19,19 +39,134 @@ class AudioTrack:
         return Time(len(self) / self.sampling_rate)
 
     def add(self, samples: NDArray[np.float64]) -> None:
-        self.samples = np.append(self.samples, samples)
+        end = len(self) + samples.size
+        buffer = self._reserve(end)
+        buffer[len(self) : end] = samples  # noqa: E203
+        self.samples = buffer[:end]
 
-    def add_at(self, instant: Time, samples: NDArray[np.float64]) -> None:
-        samples_offset = round(
-            Decimal(str(float(instant.seconds))) * Decimal(self.sampling_rate)
-        )
-        if samples_offset == len(self):
+    def add_at(self, instant: Time, samples: Clip) -> None:
+        self.add_at_offset(self.get_offset(instant), samples)
+
+    def add_at_offset(self, samples_offset: int, samples: Clip) -> None:
+        """Mix samples in, decoding compressed ones straight into the track."""
+        if samples_offset < 0:
+            samples = samples[-samples_offset:]
+            samples_offset = 0
+        if isinstance(samples, CompressedSamples) or samples_offset < len(self):
+            end = samples_offset + len(samples)
+            self.pad(end)
+            mix_into(self.samples[samples_offset:end], samples)
+        elif samples_offset == len(self):
             self.add(samples)
-        elif samples_offset > len(self):
+        else:
             self.add(np.zeros(samples_offset - len(self)))
             self.add(samples)
-        else:
-            end = samples_offset + len(samples)
-            if end > len(self):
-                self.add(np.zeros(end - len(self)))
-            self.samples[samples_offset:end] += samples
+
+    def pad(self, num_samples: int) -> None:
+        """Extend the track with silence up to num_samples, if it is shorter."""
+        if num_samples > len(self):
+            buffer = self._reserve(num_samples)
+            buffer[len(self) : num_samples] = 0  # noqa: E203
+            self.samples = buffer[:num_samples]
+
+    def trim(self, duration: Time) -> None:
+        self.samples = self.samples[: duration.get_num_samples(self.sampling_rate)]
+
+    def get_window(self, start: int, stop: int) -> NDArray[np.float64]:
+        return self.samples[start:stop]
+
+    def get_offset(self, instant: Time) -> int:
+        return self._to_samples(instant) - self._to_samples(self.start)
+
+    def _reserve(self, num_samples: int) -> NDArray[np.float64]:
+        """Buffer holding at least num_samples, grown geometrically if it is shorter."""
+        if self.buffer is None or self.buffer.size < num_samples:
+            buffer = np.empty(max(num_samples, 2 * len(self)), dtype=np.float64)
+            buffer[: len(self)] = self.samples
+            self.buffer = buffer
+        return self.buffer
+
+    def _to_samples(self, instant: Time) -> int:
+        return round(Decimal(str(float(instant.seconds))) * Decimal(self.sampling_rate))
+
+
+class SparseAudioTrack(AudioTrack):
+    """Audio track keeping the placed samples as clips instead of mixing them.
+
+    Clips are views of the added arrays, e.g. cached strums, or compressed samples
+    decoded only into the requested windows, so memory grows with the number of
+    notes rather than the duration. They are kept sorted by offset, with the order
+    they were added in, so windows of the mix are summed from the overlapping clips
+    in that order and are identical to the same window of a dense track.
+    """
+
+    def __init__(self, sampling_rate: Hertz, start: Time = Time(0)) -> None:
+        self.sampling_rate = sampling_rate
+        self.start = start
+        self.clips: List[Tuple[int, int, Clip]] = []
+        self.offsets: List[int] = []
+        self.max_clip_size = 0
+        self.num_clips = 0
+        self.num_samples = 0
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    @property
+    def samples(self) -> NDArray[np.float64]:
+        return self.get_window(0, len(self))
+
+    @samples.setter
+    def samples(self, samples: NDArray[np.float64]) -> None:
+        self.clips, self.offsets = [], []
+        self.max_clip_size = self.num_clips = self.num_samples = 0
+        self.add_at_offset(0, samples)
+
+    def add(self, samples: NDArray[np.float64]) -> None:
+        self.add_at_offset(len(self), samples)
+
+    def pad(self, num_samples: int) -> None:
+        self.num_samples = max(self.num_samples, num_samples)
+
+    def add_at_offset(self, samples_offset: int, samples: Clip) -> None:
+        if samples_offset < 0:
+            samples = samples[-samples_offset:]
+            samples_offset = 0
+        if samples.size > 0:
+            position = bisect_right(self.offsets, samples_offset)
+            self.offsets.insert(position, samples_offset)
+            self.clips.insert(position, (samples_offset, self.num_clips, samples))
+            self.max_clip_size = max(self.max_clip_size, samples.size)
+            self.num_clips += 1
+        self.num_samples = max(self.num_samples, samples_offset + samples.size)
+
+    def trim(self, duration: Time) -> None:
+        num_samples = duration.get_num_samples(self.sampling_rate)
+        self.clips = [
+            (offset, index, clip[: num_samples - offset])
+            for offset, index, clip in self.clips[
+                : bisect_left(self.offsets, num_samples)
+            ]
+        ]
+        self.offsets = [offset for offset, _, _ in self.clips]
+        self.max_clip_size = max((clip.size for _, _, clip in self.clips), default=0)
+        self.num_samples = min(self.num_samples, num_samples)
+
+    def get_window(self, start: int, stop: int) -> NDArray[np.float64]:
+        stop = min(stop, len(self))
+        window = np.zeros(max(stop - start, 0), dtype=np.float64)
+        first_clip = bisect_right(self.offsets, start - self.max_clip_size)
+        last_clip = bisect_left(self.offsets, stop)
+        overlapping = sorted(
+            (
+                clip
+                for clip in self.clips[first_clip:last_clip]
+                if clip[0] + clip[2].size > start
+            ),
+            key=itemgetter(1),
+        )
+        for offset, _, clip in overlapping:
+            first, last = max(start - offset, 0), min(stop - offset, clip.size)
+            begin, end = offset + first - start, offset + last - start
+            mix_into(window[begin:end], clip[first:last])
+        return window
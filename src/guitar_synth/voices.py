@@ -0,0 +1,74 @@
+from typing import List, Final, Optional
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from guitar_synth.track import AudioTrack
+from guitar_synth.temporal import Time
+from guitar_synth.processing import fade_out
+
+DEFAULT_FADE: Final[Time] = Time.from_milliseconds(5)
+
+
+@dataclass(frozen=True, eq=False)
+class Voice:
+    string: int
+    offset: int
+    samples: NDArray[np.float64]
+
+
+class VoiceManager:
+    """Hold back string vibrations until it is known how long they ring.
+
+    A string plucked again cuts off its previous vibration and, with a voice limit,
+    the oldest voice is stolen to make room for a new one. Voices are mixed into the
+    audio track only once released, so the silenced parts are never added.
+    """
+
+    def __init__(
+        self,
+        audio_track: AudioTrack,
+        cut_off: bool = True,
+        max_voices: Optional[int] = None,
+        fade: Time = DEFAULT_FADE,
+    ) -> None:
+        if max_voices is not None and max_voices < 1:
+            raise ValueError("Maximum number of voices must be at least 1")
+        self.audio_track = audio_track
+        self.cut_off = cut_off
+        self.max_voices = max_voices
+        self.num_fade_samples = fade.get_num_samples(audio_track.sampling_rate)
+        self.voices: List[Voice] = []
+
+    def __len__(self) -> int:
+        return len(self.voices)
+
+    def pluck(self, string: int, offset: int, samples: NDArray[np.float64]) -> None:
+        """Start a new voice on the string at the given offset in samples."""
+        self.mute(string, offset)
+        if self.max_voices is not None and len(self) >= self.max_voices:
+            self._release(min(self.voices, key=lambda voice: voice.offset), offset)
+        self.voices.append(Voice(string, offset, samples))
+
+    def mute(self, string: int, offset: int) -> None:
+        """Stop the voice of the string at the given offset in samples."""
+        if self.cut_off:
+            for voice in [voice for voice in self.voices if voice.string == string]:
+                self._release(voice, offset)
+
+    def flush(self) -> None:
+        """Mix all remaining voices in full."""
+        for voice in list(self.voices):
+            self._release(voice)
+
+    def _release(self, voice: Voice, offset: Optional[int] = None) -> None:
+        self.voices.remove(voice)
+        if offset is None:
+            self.audio_track.add_at_offset(voice.offset, voice.samples)
+            return
+        cut = max(0, offset - voice.offset)
+        self.audio_track.add_at_offset(voice.offset, voice.samples[:cut])
+        tail = voice.samples[cut : cut + self.num_fade_samples]  # noqa: E203
+        if tail.size:
+            self.audio_track.add_at_offset(voice.offset + cut, fade_out(tail))
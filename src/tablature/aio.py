@@ -0,0 +1,204 @@
+"""Asynchronous rendering API for embedding the player in asyncio services.
+
+CPU-bound work runs in an executor one measure at a time, or one pass through a
+section for tablatures with a form, as the synchronous render reads them. The
+event loop stays responsive, progress can be reported as measures are read and
+cancelling the awaiting task stops the render at the next boundary. Relative paths in
+effect parameters are resolved against the working directory of the process.
+
+Measures are read in place into their tracks, so executors must be thread pools
+of this process. Tracks rendered concurrently share the synthesis cache, which
+locks its updates, and come out the same as the synchronous render.
+"""
+
+import asyncio
+from typing import (
+    Dict,
+    List,
+    Final,
+    Tuple,
+    Callable,
+    Hashable,
+    Optional,
+    Sequence,
+    AsyncIterator,
+)
+from functools import partial
+from concurrent.futures import Executor
+
+import numpy as np
+from numpy.typing import NDArray
+
+from tablature import models
+from guitar_synth.track import AudioTrack
+from tablature.rendering import (
+    SAMPLING_RATE,
+    RenderOptions,
+    mix,
+    apply_bus,
+    get_voices,
+    read_phrase,
+    get_submixes,
+    read_measure,
+    apply_effects,
+    get_synthesizer,
+)
+from guitar_synth.temporal import MeasuredTimeline
+from tablature.progressive import render_progressively
+from guitar_synth.processing import resample
+
+type ProgressCallback = Callable[[float], None]
+
+DEFAULT_BLOCK_SIZE: Final[int] = 4096
+
+
+async def render_song(
+    song: models.Song,
+    options: RenderOptions = RenderOptions(),
+    progress: Optional[ProgressCallback] = None,
+    executor: Optional[Executor] = None,
+) -> NDArray[np.float64]:
+    """Render and mix all tracks of a song concurrently at the output sampling rate."""
+    submixes = get_submixes(song)
+    inserts = [
+        (song.tracks[name], effects)
+        for submix in submixes
+        for name, effects in submix.inserts.items()
+    ]
+    num_measures = [len(track.tablature.measures) for track, _ in inserts]
+    num_measures_read = [0.0] * len(inserts)
+
+    def get_callback(index: int) -> ProgressCallback:
+        def report(fraction: float) -> None:
+            num_measures_read[index] = fraction * num_measures[index]
+            if progress is not None:
+                progress(sum(num_measures_read) / sum(num_measures))
+
+        return report
+
+    tracks = iter(
+        await asyncio.gather(
+            *(
+                render_track(track, options, get_callback(index), executor, effects)
+                for index, (track, effects) in enumerate(inserts)
+            )
+        )
+    )
+    loop = asyncio.get_running_loop()
+    outputs = []
+    for submix in submixes:
+        weighted = [song.tracks[name].weight * next(tracks) for name in submix.inserts]
+        outputs.extend(
+            await loop.run_in_executor(
+                executor, apply_bus, submix, weighted, options.sample_rate
+            )
+        )
+    samples = await loop.run_in_executor(executor, mix, outputs)
+    return await loop.run_in_executor(
+        executor, resample, samples, options.sample_rate, SAMPLING_RATE
+    )
+
+
+async def render_track(
+    track: models.Track,
+    options: RenderOptions = RenderOptions(),
+    progress: Optional[ProgressCallback] = None,
+    executor: Optional[Executor] = None,
+    effects: Optional[Sequence[models.Effect]] = None,
+) -> NDArray[np.float32]:
+    """Render a single track with its effects at the sampling rate of the options.
+
+    Effects other than those of the instrument may be given, e.g. its bus inserts.
+    """
+    loop = asyncio.get_running_loop()
+    synthesizer = await loop.run_in_executor(
+        executor, get_synthesizer, track.instrument, options
+    )
+    audio_track = AudioTrack(synthesizer.sample_rate, start=options.window.start)
+    timeline = MeasuredTimeline()
+    voices = get_voices(audio_track, options)
+    phrases: Dict[Hashable, NDArray[np.float64]] = {}
+    steps: List[Tuple[int, Callable[[], None]]]
+    if track.tablature.form and voices is None:
+        steps = [
+            (
+                len(measures),
+                partial(
+                    read_phrase,
+                    track.tablature,
+                    key,
+                    measures,
+                    synthesizer,
+                    audio_track,
+                    timeline,
+                    options.window,
+                    phrases,
+                ),
+            )
+            for key, measures in track.tablature.phrases
+        ]
+    else:
+        steps = [
+            (
+                1,
+                partial(
+                    read_measure,
+                    track.tablature,
+                    measure,
+                    synthesizer,
+                    audio_track,
+                    timeline,
+                    options.window,
+                    voices,
+                ),
+            )
+            for measure in track.tablature.measures
+        ]
+    num_measures_read = 0
+    for num_measures, read_step in steps:
+        if not options.window.is_over(timeline.instant):
+            await loop.run_in_executor(executor, read_step)
+        num_measures_read += num_measures
+        if progress is not None:
+            progress(num_measures_read / len(track.tablature.measures))
+    if voices is not None:
+        voices.flush()
+    if options.window.duration is not None:
+        audio_track.trim(options.window.duration)
+    if effects is None:
+        effects = track.instrument.effects
+    return await loop.run_in_executor(executor, apply_effects, audio_track, effects)
+
+
+async def stream_song(
+    song: models.Song,
+    options: RenderOptions = RenderOptions(),
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    executor: Optional[Executor] = None,
+    gain: Optional[float] = None,
+) -> AsyncIterator[NDArray[np.float64]]:
+    """Render a song and yield the mix in blocks of at most block_size samples.
+
+    Normalization needs the peak of the whole mix, so the first block is available
+    once every track has been rendered. With a fixed gain instead, e.g. from
+    get_headroom_gain, blocks are yielded as soon as they are final and progress is
+    not reported.
+    """
+    if gain is None:
+        samples = await render_song(song, options, progress, executor)
+        for start in range(0, samples.size, block_size):
+            yield samples[start : start + block_size]  # noqa: E203
+        return
+    if options.sample_rate != SAMPLING_RATE:
+        raise ValueError("Progressive rendering requires the output sampling rate")
+    loop = asyncio.get_running_loop()
+    blocks = render_progressively(song, options, block_size)
+
+    def read_block() -> Optional[NDArray[np.float64]]:
+        return next(blocks, None)
+
+    while (block := await loop.run_in_executor(executor, read_block)) is not None:
+        block = np.clip(gain * block, -1, 1)
+        for start in range(0, block.size, block_size):
+            yield block[start : start + block_size]  # noqa: E203
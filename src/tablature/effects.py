@@ -0,0 +1,156 @@
+"""Native effects running alongside pedalboard plugins."""
+
+import math
+from typing import Any, List, Final, Tuple, Optional, Sequence
+from pathlib import Path
+from functools import cache
+
+import numpy as np
+import pedalboard
+from numpy.typing import NDArray
+from pedalboard.io import AudioFile  # type: ignore[attr-defined]
+
+from guitar_synth.processing import (
+    CONVOLUTION_BLOCK_SIZE,
+    PartitionedConvolver,
+    partition_spectra,
+)
+
+NORMALIZED_IMPULSE_RESPONSE_GAIN: Final[float] = 0.125
+
+
+class Convolution:
+    """Drop-in replacement for pedalboard.Convolution built on PartitionedConvolver.
+
+    Impulse responses are read, resampled and normalized like pedalboard does once
+    per file and sample rate, and their spectra are shared by every track and render.
+    Input is convolved and mixed one partition at a time into a float32 output.
+    """
+
+    def __init__(self, impulse_response_filename: str, mix: float = 1.0) -> None:
+        self.path = Path(impulse_response_filename).resolve()
+        self.modified = self.path.stat().st_mtime_ns
+        self.mix = mix
+        self.convolver: Optional[PartitionedConvolver] = None
+
+    def __call__(
+        self, input_array: NDArray[Any], sample_rate: float, reset: bool = True
+    ) -> NDArray[np.float32]:
+        if reset or self.convolver is None:
+            spectra = get_impulse_response_spectra(
+                self.path, self.modified, round(sample_rate)
+            )
+            self.convolver = PartitionedConvolver(spectra)
+        convolver = self.convolver
+        output = np.empty(np.shape(input_array), dtype=np.float32)
+        start = 0
+        while start < output.size:
+            # Stop at the end of each partition, so temporaries stay one block long
+            stop = min(output.size, start + convolver.block_size - convolver.num_buffered)
+            dry = np.asarray(input_array[start:stop], dtype=np.float64)
+            output[start:stop] = self.mix * convolver(dry) + (1 - self.mix) * dry
+            start = stop
+        return output
+
+
+def get_convolution_size(
+    impulse_response_filename: str,
+    sample_rate: int,
+    block_size: int = CONVOLUTION_BLOCK_SIZE,
+) -> int:
+    """Bytes held by a Convolution, from the header of its impulse response file.
+
+    This counts the cached impulse response and spectra, the history of the
+    convolver, and the temporaries of resampling and of one block.
+    """
+    with AudioFile(str(Path(impulse_response_filename).resolve())) as file:
+        num_frames, source_rate = file.frames, file.samplerate
+    num_samples = round(max(1.0, num_frames * sample_rate / source_rate))
+    num_partitions = max(-(-num_samples // block_size), 1)
+    float64, complex128 = np.dtype(np.float64).itemsize, np.dtype(np.complex128).itemsize
+    spectra = num_partitions * (block_size + 1) * complex128
+    return (
+        (num_frames + 2 * num_samples + num_partitions * block_size) * float64
+        + 3 * spectra
+        + 8 * block_size * float64
+    )
+
+
+class EffectChain:
+    """Effects run in order, with consecutive pedalboard plugins in one Pedalboard."""
+
+    def __init__(self, effects: Sequence[Any]) -> None:
+        self.stages: List[Any] = []
+        for effect in effects:
+            if not isinstance(effect, pedalboard.Plugin):
+                self.stages.append(effect)
+            elif self.stages and isinstance(self.stages[-1], pedalboard.Pedalboard):
+                self.stages[-1].append(effect)
+            else:
+                self.stages.append(pedalboard.Pedalboard([effect]))
+
+    def __call__(
+        self, input_array: NDArray[Any], sample_rate: float, reset: bool = True
+    ) -> NDArray[np.float32]:
+        samples = input_array
+        for stage in self.stages:
+            samples = stage(samples, sample_rate, reset=reset)
+        return np.asarray(samples, dtype=np.float32)
+
+
+@cache
+def get_impulse_response_spectra(
+    path: Path, modified: int, sample_rate: int, block_size: int = CONVOLUTION_BLOCK_SIZE
+) -> NDArray[np.complex128]:
+    samples, source_rate = read_impulse_response(path, modified)
+    samples = resample_impulse_response(samples, source_rate, sample_rate)
+    energy = np.sqrt(np.dot(samples, samples))
+    if energy > 0:
+        samples = samples * (NORMALIZED_IMPULSE_RESPONSE_GAIN / energy)
+    return partition_spectra(samples, block_size)
+
+
+def resample_impulse_response(
+    samples: NDArray[np.float64], source_rate: float, target_rate: float
+) -> NDArray[np.float64]:
+    """Resample like JUCE, so impulse responses sound as they do in pedalboard.
+
+    A second-order Butterworth low-pass at the lower Nyquist frequency filters the
+    signal before linear interpolation when downsampling, and after it otherwise.
+    """
+    if source_rate == target_rate:
+        return samples
+    ratio = source_rate / target_rate
+    n = 1 / math.tan(math.pi * max(0.001, 0.5 / ratio if ratio > 1 else 0.5 * ratio))
+    c = 1 / (1 + math.sqrt(2) * n + n**2)
+    coefficients = (c, 2 * c, c, 2 * c * (1 - n**2), c * (1 - math.sqrt(2) * n + n**2))
+    if ratio > 1:
+        samples = biquad(samples, *coefficients)
+    num_samples = round(max(1.0, samples.size / ratio))
+    resampled: NDArray[np.float64] = np.interp(
+        np.arange(num_samples) * ratio, np.arange(samples.size), samples
+    )
+    if ratio < 1:
+        resampled = biquad(resampled, *coefficients)
+    return resampled
+
+
+def biquad(
+    samples: NDArray[np.float64], b0: float, b1: float, b2: float, a1: float, a2: float
+) -> NDArray[np.float64]:
+    """Direct form I biquad filter, for short signals such as impulse responses."""
+    filtered = np.empty_like(samples)
+    x1 = x2 = y1 = y2 = 0.0
+    for i, x0 in enumerate(samples.tolist()):
+        y0 = b0 * x0 + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+        x1, x2, y1, y2 = x0, x1, y0, y1
+        filtered[i] = y0
+    return filtered
+
+
+@cache
+def read_impulse_response(path: Path, modified: int) -> Tuple[NDArray[np.float64], float]:
+    """First channel of an impulse response file and its sample rate."""
+    with AudioFile(str(path)) as file:
+        samples = file.read(file.frames)[0].astype(np.float64)
+        return samples, float(file.samplerate)
@@ -0,0 +1,225 @@
+import re
+import tracemalloc
+from typing import Dict, Final, Tuple, TextIO, Iterable, Iterator, Optional, Sequence
+from contextlib import contextmanager
+from collections import Counter
+from dataclasses import replace, dataclass
+
+import numpy as np
+
+from tablature import models
+from tablature.effects import Convolution, get_convolution_size
+from tablature.rendering import (
+    Notation,
+    RenderOptions,
+    get_submixes,
+    get_vibrations,
+    get_synthesizer,
+    get_audible_strums,
+    can_render_in_place,
+)
+from guitar_synth.synthesis import StringVibration, get_prefix_size
+from guitar_synth.compression import Compression
+
+SIZE_PATTERN: Final[re.Pattern[str]] = re.compile(
+    r"(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?", re.I
+)
+SIZE_UNITS: Final[str] = "KMGT"
+
+
+@dataclass(frozen=True)
+class MemoryEstimate:
+    """Expected peak memory of a render in bytes."""
+
+    tracks: int
+    caches: int
+    track_lengths: Tuple[int, ...] = ()
+
+    @property
+    def total(self) -> int:
+        return self.tracks + self.caches
+
+
+class MemoryMonitor:
+    """Measure the peak memory allocated by each stage of a render."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.peaks: Dict[str, int] = {}
+
+    def __enter__(self) -> "MemoryMonitor":
+        if self.enabled:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        if self.enabled:
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+    def report(self, file: TextIO) -> None:
+        print("Peak memory by stage:", file=file)
+        for name, peak in self.peaks.items():
+            print(f"  {name:<32} {format_size(peak):>10}", file=file)
+
+
+def parse_size(value: str) -> int:
+    """Parse a number of bytes with an optional binary unit, e.g. 512M or 2GiB."""
+    if match := SIZE_PATTERN.fullmatch(value.strip()):
+        number, unit = match.groups()
+        exponent = SIZE_UNITS.index(unit.upper()) + 1 if unit else 0
+        return round(float(number) * (1 << 10 * exponent))
+    raise ValueError(f"Invalid size: '{value}'")
+
+
+def format_size(num_bytes: int) -> str:
+    size = float(num_bytes)
+    for unit in ("B", *(f"{unit}iB" for unit in SIZE_UNITS)):
+        if size < 1024 or unit == "TiB":
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
+
+
+def estimate_memory(
+    song: models.Song, options: RenderOptions = RenderOptions()
+) -> MemoryEstimate:
+    """Estimate the peak memory of an in-memory render without synthesizing anything.
+
+    Tracks are budgeted for their growing float64 buffer, the float32 output of the
+    effects and the mix, caches for every cached strum and string vibration, the
+    outputs of the feedback loops the vibrations are cut from and the state of
+    convolutions. Relative paths of impulse responses are read from the working
+    directory.
+    """
+    track_lengths = []
+    num_cached_strum_samples = 0
+    track_vibrations = {}
+    for name, track in song.tracks.items():
+        vibrations: Dict[StringVibration, None] = {}
+        track_vibrations[name] = vibrations
+        synthesizer = get_synthesizer(track.instrument, replace(options, sampler=False))
+        start = options.window.start.get_num_samples(synthesizer.sample_rate)
+        num_samples = 0
+        strums: Counter[Notation] = Counter()
+        for strum in get_audible_strums(track.tablature, synthesizer, options.window):
+            offset = strum.instant.get_num_samples(synthesizer.sample_rate) - start
+            length = synthesizer.get_num_samples(*strum.notation)
+            num_samples = max(num_samples, offset + length)
+            strums[strum.notation] += 1
+        if options.window.duration is not None:
+            num_samples = min(
+                num_samples,
+                options.window.duration.get_num_samples(synthesizer.sample_rate),
+            )
+        track_lengths.append(num_samples)
+        if options.sampler:
+            instrument = synthesizer.instrument
+            vibrations.update(
+                (
+                    synthesizer.get_vibration(
+                        float(frequency), instrument.vibration, instrument.damping
+                    ),
+                    None,
+                )
+                for frequency in np.unique(instrument.fret_frequencies)
+            )
+        in_place = can_render_in_place(options) and not (
+            track.tablature.form and not options.manages_voices
+        )
+        for notation, count in strums.items():
+            if not options.manages_voices and (count > 1 or not in_place):
+                num_cached_strum_samples += synthesizer.get_num_samples(*notation)
+        vibrations.update(get_vibrations([track], options))
+    longest = max(track_lengths, default=0)
+    float32, float64 = np.dtype(np.float32).itemsize, np.dtype(np.float64).itemsize
+    strum_size = float64 if options.compression is None else np.dtype(np.int16).itemsize
+    return MemoryEstimate(
+        tracks=sum(track_lengths) * float32 + longest * (3 * float64 + float32),
+        caches=estimate_vibrations(
+            [
+                track_vibrations[name]
+                for submix in get_submixes(song)
+                for name in submix.inserts
+            ],
+            options.compression,
+        )
+        * float64
+        + num_cached_strum_samples * strum_size
+        + estimate_convolutions(song, options.sample_rate),
+        track_lengths=tuple(track_lengths),
+    )
+
+
+def estimate_vibrations(
+    track_vibrations: Sequence[Dict[StringVibration, None]],
+    compression: Optional[Compression] = None,
+) -> int:
+    """Peak samples of the cached vibrations and their prefixes, read track by track.
+
+    With compression, render() evicts the vibrations no later track plays after
+    each track, otherwise all of them stay cached.
+    """
+    vibrations: Dict[StringVibration, None] = {}
+    num_samples = 0
+    for index, current in enumerate(track_vibrations):
+        if compression is None:
+            vibrations.update(current)
+        else:
+            later = set().union(*track_vibrations[index:])
+            vibrations = {
+                vibration: None for vibration in vibrations if vibration in later
+            }
+            vibrations.update(current)
+        num_samples = max(
+            num_samples,
+            sum(
+                vibration.duration.get_num_samples(vibration.sample_rate)
+                for vibration in vibrations
+            )
+            + estimate_prefixes(vibrations),
+        )
+    return num_samples
+
+
+def estimate_prefixes(vibrations: Iterable[StringVibration]) -> int:
+    """Samples of the string outputs the vibrations are cut from, rendered in order.
+
+    A prefix being extended briefly holds both its old and new samples.
+    """
+    sizes: Dict[StringVibration, int] = {}
+    num_copied_samples = 0
+    for vibration in vibrations:
+        size = sizes.get(vibration.string, 0)
+        sizes[vibration.string] = get_prefix_size(
+            size,
+            vibration.duration.get_num_samples(vibration.sample_rate),
+            vibration.num_burst_samples,
+        )
+        if sizes[vibration.string] > size:
+            num_copied_samples = max(num_copied_samples, size)
+    return sum(sizes.values()) + num_copied_samples
+
+
+def estimate_convolutions(song: models.Song, sample_rate: int) -> int:
+    chains = [track.instrument.effects for track in song.tracks.values()]
+    chains.extend(bus.effects for bus in song.buses.values())
+    return sum(
+        get_convolution_size(params["impulse_response_filename"], sample_rate)
+        for effects in chains
+        for effect in effects
+        if isinstance(effect, dict)
+        for name, params in effect.items()
+        if name == Convolution.__name__
+    )
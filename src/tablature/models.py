@@ -4,19 +4,26 @@ from fractions import Fraction
 from functools import cached_property
 
 import yaml
+import numpy as np
 from pydantic import (
     Field,
     HttpUrl,
     BaseModel,
+    InstanceOf,
     PositiveInt,
     PositiveFloat,
     NonNegativeInt,
     NonNegativeFloat,
     model_validator,
 )
+from numpy.typing import NDArray
+
+from tablature.notation import CompactNotes, parse_notes, check_num_frets
+from guitar_synth.instrument import MUTED
 
 DEFAULT_STRING_DAMPING: Final[float] = 0.5
 DEFAULT_ARPEGGIO_SECONDS: Final[float] = 0.005
+YAML_LOADER: Final[type] = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 class Note(BaseModel):
@@ -29,7 +36,15 @@ class Note(BaseModel):
 
 class Measure(BaseModel):
     time_signature: Annotated[str, Field(pattern=r"\d+/\d+")]
-    notes: Tuple[Note, ...] = tuple()
+    notes: Tuple[Note, ...] | InstanceOf[CompactNotes] = tuple()
+
+    @model_validator(mode="before")
+    @classmethod
+    def parse_compact_notes(cls, data: Any) -> Any:
+        """Parse notes in compact notation, e.g. "x32010 d 1/8; ...", into arrays."""
+        if not isinstance(data, dict) or not isinstance(data.get("notes"), str):
+            return data
+        return data | {"notes": parse_notes(data["notes"], DEFAULT_ARPEGGIO_SECONDS)}
 
     @cached_property
     def beats_per_measure(self) -> int:
@@ -39,10 +54,97 @@ class Measure(BaseModel):
     def note_value(self) -> Fraction:
         return Fraction(1, int(self.time_signature.split("/")[1]))
 
+    @cached_property
+    def compact_notes(self) -> CompactNotes:
+        """Fields of the notes as arrays, whichever notation they were given in."""
+        if isinstance(self.notes, CompactNotes):
+            return self.notes
+        check_num_frets([note.frets for note in self.notes])
+        frets = [
+            [MUTED if fret is None else fret for fret in note.frets]
+            for note in self.notes
+        ]
+        return CompactNotes(
+            frets=np.array(frets, dtype=np.int64).reshape(len(frets), -1 if frets else 0),
+            offsets=tuple(note.offset for note in self.notes),
+            upstrokes=np.array([note.upstroke for note in self.notes], dtype=bool),
+            arpeggios=np.array([note.arpeggio for note in self.notes], dtype=np.float64),
+            vibrations=np.array(
+                [
+                    np.nan if note.vibration is None else note.vibration
+                    for note in self.notes
+                ],
+                dtype=np.float64,
+            ),
+        )
+
+    @cached_property
+    def frets(self) -> NDArray[np.int64]:
+        return self.compact_notes.frets
+
+
+type PhraseKey = Tuple[str, Optional[int]]
+
+
+class Section(BaseModel):
+    measures: Tuple[Measure, ...]
+    repeat: PositiveInt = 1
+    endings: Tuple[Tuple[Measure, ...], ...] = tuple()
+
+    @model_validator(mode="after")
+    def check_endings(self) -> Self:
+        if len(self.endings) > self.repeat:
+            raise ValueError("Section must not have more endings than repeats")
+        return self
+
+    @cached_property
+    def passes(self) -> Tuple[Tuple[Optional[int], Tuple[Measure, ...]], ...]:
+        """Measures played on each repeat, with the index of their ending if any.
+
+        Repeats past the last ending play the last ending again.
+        """
+        if not self.endings:
+            return ((None, self.measures),) * self.repeat
+        return tuple(
+            (ending, self.measures + self.endings[ending])
+            for ending in (min(i, len(self.endings) - 1) for i in range(self.repeat))
+        )
+
 
 class Tablature(BaseModel):
     beats_per_minute: PositiveInt
-    measures: Tuple[Measure, ...]
+    measures: Tuple[Measure, ...] = tuple()
+    sections: Dict[str, Section] = {}
+    form: Tuple[str, ...] = tuple()
+
+    @model_validator(mode="after")
+    def expand_form(self) -> Self:
+        """Spell out the measures of the sections played in the form."""
+        if bool(self.form) == ("measures" in self.model_fields_set):
+            raise ValueError("Tablature must have either measures or a form")
+        for name in self.form:
+            if name not in self.sections:
+                raise ValueError(f"Unknown section '{name}'")
+        if self.form:
+            self.measures = tuple(
+                measure for _, measures in self.phrases for measure in measures
+            )
+        return self
+
+    @cached_property
+    def phrases(self) -> Tuple[Tuple[PhraseKey, Tuple[Measure, ...]], ...]:
+        """Measures of each pass through the sections of the form, in order.
+
+        Passes sharing a key play the same measures, so they sound the same.
+        """
+        return tuple(
+            ((name, ending), measures)
+            for name in self.form
+            for ending, measures in self.sections[name].passes
+        )
+
+
+type Effect = str | Dict[Any, Any]
 
 
 class Instrument(BaseModel):
@@ -51,12 +153,17 @@ class Instrument(BaseModel):
     ]
     vibration: PositiveFloat
     damping: Annotated[float, Field(ge=0, le=0.5)] = DEFAULT_STRING_DAMPING
-    effects: Tuple[str | Dict[Any, Any], ...] = tuple()
+    effects: Tuple[Effect, ...] = tuple()
+
+
+class Bus(BaseModel):
+    effects: Tuple[Effect, ...] = tuple()
 
 
 class Track(BaseModel):
     url: Optional[HttpUrl] = None
     weight: NonNegativeFloat = 1.0
+    bus: Optional[str] = None
     instrument: Instrument
     tablature: Tablature
 
@@ -64,18 +171,25 @@ class Track(BaseModel):
     def check_frets(self) -> Self:
         num_strings = len(self.instrument.tuning)
         for measure in self.tablature.measures:
-            for notes in measure.notes:
-                if len(notes.frets) != num_strings:
-                    raise ValueError("All notes must have the same number of frets")
+            if measure.notes and measure.frets.shape[1] != num_strings:
+                raise ValueError("All notes must have the same number of frets")
         return self
 
 
 class Song(BaseModel):
     title: Optional[str] = None
     artist: Optional[str] = None
+    buses: Dict[str, Bus] = {}
     tracks: Dict[str, Track]
 
+    @model_validator(mode="after")
+    def check_buses(self) -> Self:
+        for track in self.tracks.values():
+            if track.bus is not None and track.bus not in self.buses:
+                raise ValueError(f"Unknown bus '{track.bus}'")
+        return self
+
     @classmethod
     def from_file(cls, path: str | Path) -> Self:
         with Path(path).open(encoding="utf-8") as file:
-            return cls(**yaml.safe_load(file))
+            return cls(**yaml.load(file, Loader=YAML_LOADER))
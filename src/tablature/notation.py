@@ -0,0 +1,106 @@
+"""Compact notation for the notes of a measure.
+
+Notes are separated by semicolons or new lines, each made of its frets followed by
+optional fields in this order:
+
+    x32010 d 1/8 a0.04 v3.5
+
+Frets are one character per string, or separated by dashes when some need two
+digits, e.g. x-10-12-12-11-x, with x for strings left alone. The stroke is d (down,
+the default) or u (up), the offset a fraction of a whole note since the previous
+note (0/1 by default), then the arpeggio and vibration in seconds prefixed with a
+and v.
+"""
+
+import re
+from typing import Final, Sized, Tuple, Optional, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from guitar_synth.instrument import MUTED
+
+DEFAULT_OFFSET: Final[str] = "0/1"
+
+NOTE_PATTERN: Final[re.Pattern[str]] = re.compile(
+    r"""
+    (?P<frets>[0-9x]+|(?:[0-9]+|x)(?:-(?:[0-9]+|x))+)
+    (?:\s+(?P<stroke>[du]))?
+    (?:\s+(?P<offset>\d+/\d+))?
+    (?:\s+a(?P<arpeggio>\d+(?:\.\d*)?|\.\d+))?
+    (?:\s+v(?P<vibration>\d+(?:\.\d*)?|\.\d+))?
+    """,
+    re.VERBOSE,
+)
+SEPARATOR_PATTERN: Final[re.Pattern[str]] = re.compile(r"[;\n]")
+
+
+@dataclass(frozen=True)
+class CompactNotes:
+    """Fields of the notes of a measure, one array entry per note."""
+
+    frets: NDArray[np.int64]
+    offsets: Tuple[str, ...]
+    upstrokes: NDArray[np.bool_]
+    arpeggios: NDArray[np.float64]
+    vibrations: NDArray[np.float64]
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+
+def parse_notes(text: str, default_arpeggio: float) -> CompactNotes:
+    """Parse the notes of a measure into arrays and validate them together.
+
+    Strings left alone are MUTED and missing vibrations are NaN. The pattern
+    of the notes guarantees the other fields are in range.
+    """
+    fields = []
+    for note in filter(None, map(str.strip, SEPARATOR_PATTERN.split(text))):
+        match = NOTE_PATTERN.fullmatch(note)
+        if match is None:
+            raise ValueError(f"Invalid note '{note}'")
+        fields.append(match.groups())
+    frets, strokes, offsets, arpeggios, vibrations = zip(*fields) if fields else [()] * 5
+    vibration_array = parse_seconds(vibrations, np.nan)
+    if np.any(vibration_array == 0):
+        raise ValueError("Vibrations must be positive")
+    return CompactNotes(
+        frets=parse_frets(frets),
+        offsets=tuple(offset or DEFAULT_OFFSET for offset in offsets),
+        upstrokes=np.array([stroke == "u" for stroke in strokes], dtype=bool),
+        arpeggios=parse_seconds(arpeggios, default_arpeggio),
+        vibrations=vibration_array,
+    )
+
+
+def parse_frets(tokens: Sequence[str]) -> NDArray[np.int64]:
+    """Fret numbers of the notes, decoded at once when they are one character each."""
+    if not tokens:
+        return np.empty((0, 0), dtype=np.int64)
+    if any("-" in token for token in tokens):
+        rows = [token.split("-") if "-" in token else list(token) for token in tokens]
+        check_num_frets(rows)
+        return np.array(
+            [[MUTED if cell == "x" else int(cell) for cell in row] for row in rows],
+            dtype=np.int64,
+        )
+    check_num_frets(tokens)
+    codes = np.frombuffer("".join(tokens).encode("ascii"), dtype=np.uint8).reshape(
+        len(tokens), -1
+    )
+    frets = codes.astype(np.int64) - ord("0")
+    frets[codes == ord("x")] = MUTED
+    return frets
+
+
+def check_num_frets(rows: Sequence[Sized]) -> None:
+    if len(set(map(len, rows))) > 1:
+        raise ValueError("All notes must have the same number of frets")
+
+
+def parse_seconds(tokens: Sequence[Optional[str]], default: float) -> NDArray[np.float64]:
+    return np.array(
+        [default if token is None else token for token in tokens], dtype=np.float64
+    )
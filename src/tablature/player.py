@@ -1,52 +1,434 @@
 import os
-from typing import Any, Dict, List, Final, Generator
+import sys
+import enum
+import math
+import time
+import wave
+import tempfile
+from typing import Any, Final, BinaryIO, Optional, Sequence, Generator, ContextManager
 from pathlib import Path
-from argparse import Namespace, ArgumentParser
-from fractions import Fraction
-from contextlib import contextmanager
+from argparse import Namespace, ArgumentParser, ArgumentTypeError
+from itertools import chain
+from contextlib import nullcontext, contextmanager
+from dataclasses import replace
 
 import numpy as np
-import pedalboard
 from numpy.typing import NDArray
 from pedalboard.io import AudioFile  # type: ignore[attr-defined]
 
 from tablature import models
-from guitar_synth.chord import Chord
+from tablature.memory import (
+    MemoryMonitor,
+    MemoryEstimate,
+    parse_size,
+    format_size,
+    estimate_memory,
+)
 from guitar_synth.track import AudioTrack
-from guitar_synth.stroke import Velocity
+from tablature.rendering import (
+    SAMPLING_RATE,
+    Window,
+    RenderOptions,
+    mix,
+    warm_up,
+    apply_bus,
+    read_track,
+    synthesize,
+    get_submixes,
+    get_vibrations,
+    get_synthesizer,
+    get_audible_strums,
+    apply_effects_in_blocks,
+)
 from guitar_synth.temporal import Time, MeasuredTimeline
-from guitar_synth.synthesis import Synthesizer
-from guitar_synth.instrument import StringTuning, PluckedStringInstrument
-from guitar_synth.processing import normalize
+from tablature.progressive import get_headroom_gain, render_progressively
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer
+from guitar_synth.processing import quantize, resample, normalize
+from guitar_synth.compression import Compression
 
-SAMPLING_RATE: Final[int] = 44100
+DRAFT_SAMPLING_RATE: Final[int] = 11025
+STDOUT: Final[Path] = Path("-")
+
+
+class SampleFormat(enum.StrEnum):
+    S16LE = enum.auto()
+    F32LE = enum.auto()
 
 
 def main() -> None:
-    play(parse_args())
+    args = parse_args()
+    try:
+        play(args)
+    except ArgumentTypeError as error:
+        get_parser().error(str(error))
+
+
+def parse_args(
+    argv: Optional[Sequence[str]] = None, parser: Optional[ArgumentParser] = None
+) -> Namespace:
+    parser = get_parser(parser)
+    args = parser.parse_args(argv)
+    if args.measures is not None and (args.start is not None or args.end is not None):
+        parser.error("argument --measures: not allowed with --start or --end")
+    if args.start is not None and args.start < 0:
+        parser.error("argument --start: must not be negative")
+    if args.end is not None and args.end <= (args.start or 0):
+        parser.error("argument --end: must be after --start")
+    if args.draft is not None and not 0 < args.draft < SAMPLING_RATE:
+        parser.error(f"argument --draft: must be between 0 and {SAMPLING_RATE} Hz")
+    if args.max_voices is not None and args.max_voices < 1:
+        parser.error("argument --max-voices: must be positive")
+    if args.segments is not None and args.segments < 1:
+        parser.error("argument --segments: must be positive")
+    if args.warm_up is not None and args.warm_up < 1:
+        parser.error("argument --warm-up: must be positive")
+    if args.silence_threshold is not None and not args.silence_threshold < 0:
+        parser.error("argument --silence-threshold: must be a negative level in dBFS")
+    if args.progressive:
+        if args.draft or args.segments or args.max_memory is not None:
+            parser.error(
+                "argument --progressive: not allowed with --draft, --segments or "
+                "--max-memory"
+            )
+        if args.output is None or not (
+            args.output == STDOUT or args.output.suffix.lower() in (".raw", ".pcm")
+        ):
+            parser.error("argument --progressive: requires -o - or a .raw or .pcm file")
+    elif args.gain is not None:
+        parser.error("argument --gain: requires --progressive")
+    return args
 
 
-def parse_args() -> Namespace:
-    parser = ArgumentParser()
+def get_parser(parser: Optional[ArgumentParser] = None) -> ArgumentParser:
+    """Parser of the command line arguments, added to the given parser if any."""
+    parser = parser or ArgumentParser(prog="play-tab")
     parser.add_argument("path", type=Path, help="Path to tablature file in YAML format")
     parser.add_argument(
-        "-o", "--output", type=Path, default=None, help="Path to output audio file"
+        "-o",
+        "--output",
+        type=Path,
+        default=None,
+        help="Path to output audio file, or - to stream raw PCM to stdout",
+    )
+    parser.add_argument(
+        "--format",
+        type=SampleFormat,
+        choices=list(SampleFormat),
+        default=SampleFormat.S16LE,
+        help="Sample format of raw PCM and WAV output (defaults to s16le)",
+    )
+    parser.add_argument(
+        "--dither",
+        action="store_true",
+        help="Dither samples when quantizing them to 16 bits",
+    )
+    parser.add_argument(
+        "--sampler",
+        action="store_true",
+        help="Pre-render every fret of each instrument and play notes from the bank",
+    )
+    parser.add_argument(
+        "--draft",
+        type=int,
+        nargs="?",
+        const=DRAFT_SAMPLING_RATE,
+        default=None,
+        metavar="RATE",
+        help=(
+            "Synthesize and apply effects at a reduced sampling rate for a quick "
+            f"preview (defaults to {DRAFT_SAMPLING_RATE} Hz)"
+        ),
+    )
+    parser.add_argument(
+        "--measures",
+        type=parse_measures,
+        default=None,
+        metavar="A:B",
+        help="Render only measures A through B (counting from 1, inclusive)",
+    )
+    parser.add_argument(
+        "--start", type=float, default=None, help="Render from this many seconds"
+    )
+    parser.add_argument(
+        "--end", type=float, default=None, help="Render up to this many seconds"
+    )
+    parser.add_argument(
+        "--cut-off",
+        action="store_true",
+        help="Stop the vibration of a string when it is plucked again",
+    )
+    parser.add_argument(
+        "--max-voices",
+        type=int,
+        default=None,
+        help="Maximum number of strings ringing at once in a track",
+    )
+    parser.add_argument(
+        "--silence-threshold",
+        type=float,
+        default=None,
+        metavar="DBFS",
+        help="Stop synthesizing a string once it decays below this level, e.g. -80",
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help=(
+            "Keep tracks as clips placed in time and mix them only when needed, "
+            "which saves memory on tracks with long rests"
+        ),
+    )
+    parser.add_argument(
+        "--compress",
+        type=Compression,
+        choices=list(Compression),
+        default=None,
+        help="Keep cached strums as 16-bit samples scaled per strum, to save memory",
+    )
+    parser.add_argument(
+        "--warm-up",
+        type=int,
+        nargs="?",
+        const=os.cpu_count(),
+        default=None,
+        metavar="WORKERS",
+        help=(
+            "Synthesize all unique strums in parallel before reading the tablatures "
+            "(defaults to one worker process per CPU)"
+        ),
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        nargs="?",
+        const=os.cpu_count(),
+        default=None,
+        metavar="WORKERS",
+        help=(
+            "Read each track in time segments split on measure boundaries, in "
+            "parallel (defaults to one worker process per CPU)"
+        ),
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=parse_size,
+        default=None,
+        metavar="SIZE",
+        help=(
+            "Memory budget, e.g. 512M, above which tracks are rendered into "
+            "disk-backed buffers one at a time"
+        ),
+    )
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="Print the estimated and measured peak memory of each stage",
+    )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help=(
+            "Write raw PCM blocks as soon as they are final, at a fixed gain instead "
+            "of normalized, and report the time to the first block"
+        ),
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--gain",
+        type=float,
+        default=None,
+        metavar="DB",
+        help=(
+            "Gain of progressive output in dB, clipping anything louder (defaults to "
+            "one over the weighted number of strings, which often sounds quiet)"
+        ),
+    )
+    return parser
+
+
+def parse_measures(value: str) -> slice:
+    first, separator, last = value.partition(":")
+    try:
+        start = int(first) - 1 if first else 0
+        stop = int(last) if last else (None if separator else start + 1)
+    except ValueError:
+        raise ArgumentTypeError(f"invalid measure range: '{value}'") from None
+    if start < 0 or (stop is not None and stop <= start):
+        raise ArgumentTypeError(f"invalid measure range: '{value}'")
+    return slice(start, stop)
 
 
 def play(args: Namespace) -> None:
     song = models.Song.from_file(args.path)
-    with chdir(args.path.parent):
-        samples = normalize(
-            np.sum(
-                pad_to_longest(
-                    [track.weight * synthesize(track) for track in song.tracks.values()]
-                ),
-                axis=0,
+    options = get_options(song, args)
+    if args.progressive:
+        if args.warm_up is not None:
+            warm_up(song, options, args.warm_up)
+        stream(song, options, args)
+        return
+    enabled = args.memory_report or args.max_memory is not None
+    with MemoryMonitor(enabled) as monitor:
+        if args.warm_up is not None:
+            with monitor.stage("warm-up"):
+                warm_up(song, options, args.warm_up)
+        with chdir(args.path.parent):
+            estimate = estimate_memory(song, options) if enabled else None
+            if estimate is not None and estimate.total > (args.max_memory or math.inf):
+                samples = render_to_disk(song, options, estimate, monitor)
+            else:
+                samples = render(song, options, monitor, args.segments)
+        with monitor.stage("resample"):
+            samples = resample(samples, options.sample_rate, SAMPLING_RATE)
+        with monitor.stage("save"):
+            save(
+                samples,
+                args.output or Path.cwd() / args.path.with_suffix(".mp3").name,
+                args.format,
+                args.dither,
             )
+    if estimate is not None:
+        report_memory(estimate, monitor, args.max_memory)
+
+
+def render(
+    song: models.Song,
+    options: RenderOptions = RenderOptions(),
+    monitor: Optional[MemoryMonitor] = None,
+    segments: Optional[int] = None,
+) -> NDArray[np.float64]:
+    """Mix of the tracks of a song, normalized.
+
+    With compression, string vibrations are evicted after each track unless a later
+    track plays them, since the strums read so far are cached compressed. Those
+    cached before the render started, e.g. by a warm-up or other songs, are kept.
+    """
+    monitor = monitor or MemoryMonitor(enabled=False)
+    cached = list(VIBRATIONS.entries)
+    submixes = get_submixes(song)
+    pending = [name for submix in submixes for name in submix.inserts]
+    vibrations = {
+        name: get_vibrations([song.tracks[name]], options)
+        for name in pending
+        if options.compression is not None
+    }
+    outputs = []
+    for submix in submixes:
+        tracks = []
+        for name, effects in submix.inserts.items():
+            track = song.tracks[name]
+            with monitor.stage(f"synthesize {name}"):
+                tracks.append(
+                    track.weight * synthesize(track, options, segments, effects)
+                )
+            pending.remove(name)
+            if options.compression is not None:
+                VIBRATIONS.retain(
+                    chain(cached, *(vibrations[later] for later in pending))
+                )
+        with monitor.stage(f"effects {submix.label}"):
+            outputs.extend(apply_bus(submix, tracks, options.sample_rate))
+    with monitor.stage("mix"):
+        return mix(outputs)
+
+
+def render_to_disk(
+    song: models.Song,
+    options: RenderOptions,
+    estimate: MemoryEstimate,
+    monitor: Optional[MemoryMonitor] = None,
+) -> NDArray[np.float64]:
+    """Lower-memory strategy for renders that would not fit in the memory budget.
+
+    Tracks are read one at a time into disk-backed buffers sized from the estimate,
+    run through their effects block by block and mixed straight into a disk-backed
+    mix. Cached strums and the string vibrations added by the render are dropped
+    after each track, so tracks sharing strings synthesize them again.
+    """
+    monitor = monitor or MemoryMonitor(enabled=False)
+    cached = list(VIBRATIONS.entries)
+    samples = create_disk_buffer(max(estimate.track_lengths, default=0))
+    track_lengths = dict(zip(song.tracks, estimate.track_lengths))
+    for submix in get_submixes(song):
+        bus = None
+        if submix.effects:
+            num_samples = max(track_lengths[name] for name in submix.inserts)
+            bus = AudioTrack(options.sample_rate, buffer=create_disk_buffer(num_samples))
+        for name, effects in submix.inserts.items():
+            track = song.tracks[name]
+            with monitor.stage(f"synthesize {name}"):
+                audio_track = read_track(
+                    track, options, create_disk_buffer(track_lengths[name])
+                )
+            with monitor.stage(f"effects {name}"):
+                for start, block in apply_effects_in_blocks(audio_track, effects):
+                    weighted = np.multiply(block, track.weight, dtype=np.float64)
+                    if bus is None:
+                        mix_block(samples, start, weighted)
+                    else:
+                        bus.add_at_offset(start, weighted)
+            Synthesizer.strum_strings.cache_clear()
+            Synthesizer.strum_clip.cache_clear()
+            VIBRATIONS.retain(cached)
+        if bus is not None:
+            with monitor.stage(f"effects {submix.label}"):
+                for start, block in apply_effects_in_blocks(bus, submix.effects):
+                    mix_block(samples, start, block)
+    with monitor.stage("mix"):
+        return normalize(samples, out=samples)
+
+
+def mix_block(samples: NDArray[np.float64], start: int, block: NDArray[Any]) -> None:
+    """Add a block to the samples from start on, leaving out what does not fit."""
+    block = block[: samples.size - start]
+    samples[start : start + block.size] += block  # noqa: E203
+
+
+def create_disk_buffer(num_samples: int) -> NDArray[np.float64]:
+    """Zero-filled samples mapped to an anonymous temporary file."""
+    with tempfile.TemporaryFile() as file:
+        return np.memmap(file, dtype=np.float64, mode="w+", shape=(max(num_samples, 1),))
+
+
+def report_memory(
+    estimate: MemoryEstimate, monitor: MemoryMonitor, budget: Optional[int] = None
+) -> None:
+    print(
+        f"Estimated memory: {format_size(estimate.total)} "
+        f"(tracks {format_size(estimate.tracks)}, caches {format_size(estimate.caches)})",
+        file=sys.stderr,
+    )
+    if budget is not None:
+        strategy = "disk-backed" if estimate.total > budget else "in-memory"
+        print(
+            f"Memory budget: {format_size(budget)}, using {strategy} rendering",
+            file=sys.stderr,
         )
-    save(samples, args.output or Path.cwd() / args.path.with_suffix(".mp3").name)
+    monitor.report(sys.stderr)
+
+
+def stream(song: models.Song, options: RenderOptions, args: Namespace) -> None:
+    """Write the mix as raw PCM block by block, as soon as each block is final."""
+    gain = get_headroom_gain(song) if args.gain is None else 10 ** (args.gain / 20)
+    started = time.perf_counter()
+    time_to_first_block = None
+    with open_output(args.output) as file, chdir(args.path.parent):
+        for samples in render_progressively(song, options):
+            file.write(encode(np.clip(gain * samples, -1, 1), args.format, args.dither))
+            file.flush()
+            if time_to_first_block is None:
+                time_to_first_block = time.perf_counter() - started
+    if args.output != STDOUT:
+        print(f"Saved file {args.output.absolute()}")
+    print(
+        f"Time to first block: {time_to_first_block or 0:.3f} s, "
+        f"total: {time.perf_counter() - started:.3f} s",
+        file=sys.stderr,
+    )
+
+
+def open_output(path: Path) -> ContextManager[BinaryIO]:
+    if path == STDOUT:
+        return nullcontext(sys.stdout.buffer)
+    return path.open("wb")
 
 
 @contextmanager
@@ -59,71 +441,92 @@ def chdir(directory: Path) -> Generator[Any, None, None]:
         os.chdir(current_dir)
 
 
-def pad_to_longest(tracks: List[NDArray[np.float64]]) -> List[NDArray[np.float64]]:
-    max_length = max(array.size for array in tracks)
-    return [np.pad(array, (0, max_length - array.size)) for array in tracks]
-
+def save(
+    samples: NDArray[np.float64],
+    path: Path,
+    sample_format: SampleFormat = SampleFormat.S16LE,
+    dither: bool = False,
+) -> None:
+    """Save samples to an audio file, or stream raw PCM to stdout if path is "-".
 
-def save(samples: NDArray[np.float64], path: Path) -> None:
-    with AudioFile(str(path), "w", SAMPLING_RATE) as file:
-        file.write(samples)
+    WAV and raw PCM (.raw, .pcm) files are written directly in the sample format,
+    other extensions are encoded through pedalboard.
+    """
+    if path == STDOUT:
+        sys.stdout.buffer.write(encode(samples, sample_format, dither))
+        sys.stdout.buffer.flush()
+        return
+    match path.suffix.lower():
+        case ".raw" | ".pcm":
+            path.write_bytes(encode(samples, sample_format, dither))
+        case ".wav" if sample_format == SampleFormat.S16LE:
+            with wave.open(str(path), "wb") as file:
+                file.setnchannels(1)
+                file.setsampwidth(2)
+                file.setframerate(SAMPLING_RATE)
+                file.writeframes(encode(samples, sample_format, dither))
+        case ".wav":
+            with AudioFile(str(path), "w", SAMPLING_RATE, bit_depth=32) as file:
+                file.write(samples.astype(np.float32))
+        case _:
+            with AudioFile(str(path), "w", SAMPLING_RATE) as file:
+                file.write(samples)
     print(f"Saved file {path.absolute()}")
 
 
-def synthesize(track: models.Track) -> NDArray[np.float64]:
-    synthesizer = Synthesizer(
-        instrument=PluckedStringInstrument(
-            tuning=StringTuning.from_notes(*track.instrument.tuning),
-            damping=track.instrument.damping,
-            vibration=Time(track.instrument.vibration),
-        ),
-        sample_rate=SAMPLING_RATE,
-    )
-    audio_track = AudioTrack(synthesizer.sample_rate)
-    timeline = MeasuredTimeline()
-    read(track.tablature, synthesizer, audio_track, timeline)
-    return apply_effects(audio_track, track.instrument)
+def encode(
+    samples: NDArray[np.float64], sample_format: SampleFormat, dither: bool = False
+) -> bytes:
+    if sample_format == SampleFormat.F32LE:
+        return samples.astype("<f4").tobytes()
+    return quantize(samples, dither).tobytes()
 
 
-def read(
-    tablature: models.Tablature,
-    synthesizer: Synthesizer,
-    audio_track: AudioTrack,
-    timeline: MeasuredTimeline,
-) -> None:
-    beat = Time(60 / tablature.beats_per_minute)
-    for measure in tablature.measures:
-        timeline.measure = beat * measure.beats_per_measure
-        whole_note = beat * measure.note_value.denominator
-        for note in measure.notes:
-            stroke = Velocity.up if note.upstroke else Velocity.down
-            audio_track.add_at(
-                (timeline >> (whole_note * Fraction(note.offset))).instant,
-                synthesizer.strum_strings(
-                    chord=Chord(note.frets),
-                    velocity=stroke(delay=Time(note.arpeggio)),
-                    vibration=Time(note.vibration) if note.vibration else None,
-                ),
-            )
-        next(timeline)
-
+def get_options(song: models.Song, args: Namespace) -> RenderOptions:
+    """Render options of the command line arguments, for a window where notes ring.
 
-def apply_effects(
-    audio_track: AudioTrack, instrument: models.Instrument
-) -> NDArray[np.float64]:
-    effects = pedalboard.Pedalboard(get_plugins(instrument))
-    res: NDArray[np.float64] = effects(audio_track.samples, audio_track.sampling_rate)
-    return res
+    Invalid windows raise ArgumentTypeError, as they depend on the song.
+    """
+    options = RenderOptions(
+        sampler=args.sampler,
+        sample_rate=args.draft or SAMPLING_RATE,
+        window=get_window(song, args),
+        cut_off=args.cut_off,
+        max_voices=args.max_voices,
+        silence_threshold=args.silence_threshold,
+        sparse=args.sparse,
+        compression=args.compress,
+    )
+    for track in song.tracks.values():
+        synthesizer = get_synthesizer(track.instrument, replace(options, sampler=False))
+        if any(get_audible_strums(track.tablature, synthesizer, options.window)):
+            return options
+    raise ArgumentTypeError("no notes are audible in the window")
 
 
-def get_plugins(instrument: models.Instrument) -> List[Any]:
-    return [get_plugin(effect) for effect in instrument.effects]
+def get_window(song: models.Song, args: Namespace) -> Window:
+    if args.measures is not None:
+        tablature = next(iter(song.tracks.values())).tablature
+        try:
+            return find_measures(tablature, args.measures)
+        except ValueError as error:
+            raise ArgumentTypeError(f"argument --measures: {error}") from None
+    return Window(
+        start=Time(args.start or 0),
+        end=None if args.end is None else Time(args.end),
+    )
 
 
-def get_plugin(effect: str | Dict[Any, Any]) -> Any:
-    match effect:
-        case str() as class_name:
-            return getattr(pedalboard, class_name)()
-        case dict() as plugin_dict if len(plugin_dict) == 1:
-            class_name, params = list(plugin_dict.items())[0]
-            return getattr(pedalboard, class_name)(**params)
+def find_measures(tablature: models.Tablature, measures: slice) -> Window:
+    """Locate a range of measures in time without reading any notes."""
+    beat = Time(60 / tablature.beats_per_minute)
+    timeline = MeasuredTimeline()
+    start = None
+    for index, measure in enumerate(tablature.measures[: measures.stop]):
+        if index == measures.start:
+            start = timeline.instant
+        timeline.measure = beat * measure.beats_per_measure
+        next(timeline)
+    if start is None:
+        raise ValueError(f"Tablature has only {len(tablature.measures)} measures")
+    return Window(start, timeline.instant)
@@ -0,0 +1,209 @@
+"""Progressive rendering, yielding the mix of a song as soon as each part is final."""
+
+import heapq
+from typing import List, Final, Tuple, Iterator, Optional, Sequence
+from itertools import repeat, accumulate
+
+import numpy as np
+from numpy.typing import NDArray
+
+from tablature import models
+from tablature.effects import EffectChain
+from guitar_synth.track import AudioTrack
+from tablature.rendering import (
+    Submix,
+    RenderOptions,
+    get_voices,
+    get_plugins,
+    iter_strums,
+    place_strum,
+    get_submixes,
+    get_synthesizer,
+    get_single_strums,
+)
+
+PROGRESSIVE_BLOCK_SIZE: Final[int] = 8192
+
+
+def render_progressively(
+    song: models.Song,
+    options: RenderOptions = RenderOptions(),
+    block_size: int = PROGRESSIVE_BLOCK_SIZE,
+) -> Iterator[NDArray[np.float64]]:
+    """Yield the mix of a song from its start, as soon as each part of it is final.
+
+    Strums of all tracks are read in time order. A prefix of a track is final once
+    no pending strum or held voice can still add to it, and goes through the effects
+    of the track and its bus from there. Blocks are yielded when the final prefix of
+    the mix has grown by about block_size samples. Concatenated, they make the mix of
+    render() before normalization, which needs the peak of the whole mix.
+    """
+    buses = [
+        ProgressiveBus(
+            submix,
+            [
+                ProgressiveTrack(song.tracks[name], effects, options)
+                for name, effects in submix.inserts.items()
+            ],
+            options.sample_rate,
+        )
+        for submix in get_submixes(song)
+    ]
+    tracks = [track for bus in buses for track in bus.tracks]
+    mix = AudioTrack(options.sample_rate)
+    num_emitted = 0
+    for offset, index in heapq.merge(
+        *(zip(track.offsets, repeat(index)) for index, track in enumerate(tracks))
+    ):
+        tracks[index].read()
+        if offset - num_emitted < block_size:
+            continue
+        for bus in buses:
+            if block := bus.process():
+                mix.add_at_offset(*block)
+        end = min(
+            (bus.num_processed for bus in buses if not bus.finished), default=len(mix)
+        )
+        if end > num_emitted:
+            yield get_padded_window(mix, num_emitted, end)
+            num_emitted = end
+    for bus in buses:
+        if block := bus.process():
+            mix.add_at_offset(*block)
+    if len(mix) > num_emitted:
+        yield get_padded_window(mix, num_emitted, len(mix))
+
+
+class ProgressiveTrack:
+    """Track read one strum at a time, run through its effects as it becomes final."""
+
+    def __init__(
+        self,
+        track: models.Track,
+        effects: Sequence[models.Effect],
+        options: RenderOptions,
+    ) -> None:
+        self.weight = track.weight
+        self.synthesizer = get_synthesizer(track.instrument, options)
+        self.audio_track = AudioTrack(self.synthesizer.sample_rate, options.window.start)
+        self.window = options.window
+        self.voices = get_voices(self.audio_track, options)
+        self.single_strums = get_single_strums(track.tablature, self.synthesizer, options)
+        self.strums = list(iter_strums(track.tablature, options.window))
+        self.offsets = [
+            self.audio_track.get_offset(strum.instant) for strum in self.strums
+        ]
+        # Strums of overfull measures may start before the ones preceding them
+        self.frontiers = list(accumulate(reversed(self.offsets), min))[::-1]
+        self.num_read = 0
+        self.effects = EffectChain(get_plugins(effects))
+        self.num_processed = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.num_read == len(self.strums)
+
+    def read(self) -> None:
+        """Place the next strum, and wrap the track up after the last one."""
+        strum = self.strums[self.num_read]
+        place_strum(
+            strum,
+            self.synthesizer,
+            self.audio_track,
+            self.window,
+            self.voices,
+            self.single_strums,
+        )
+        self.num_read += 1
+        if self.finished:
+            if self.voices is not None:
+                self.voices.flush()
+            if self.window.duration is not None:
+                self.audio_track.trim(self.window.duration)
+
+    def get_num_final_samples(self) -> int:
+        if self.finished:
+            return len(self.audio_track)
+        end = self.frontiers[self.num_read]
+        if self.voices is not None:
+            end = min([end] + [voice.offset for voice in self.voices.voices])
+        if self.window.duration is not None:
+            end = min(
+                end, self.window.duration.get_num_samples(self.audio_track.sampling_rate)
+            )
+        return max(end, 0)
+
+    def process(self) -> Optional[Tuple[int, NDArray[np.float64]]]:
+        """Weighted output of the effects over the samples that became final."""
+        start, end = self.num_processed, self.get_num_final_samples()
+        if end <= start:
+            return None
+        self.num_processed = end
+        samples = self.effects(
+            get_padded_window(self.audio_track, start, end),
+            self.audio_track.sampling_rate,
+            reset=start == 0,
+        )
+        return start, (self.weight * samples).astype(np.float64)
+
+
+class ProgressiveBus:
+    """Submix of progressive tracks, run through its effects as it becomes final."""
+
+    def __init__(
+        self, submix: Submix, tracks: List[ProgressiveTrack], sample_rate: int
+    ) -> None:
+        self.tracks = tracks
+        self.effects = (
+            EffectChain(get_plugins(submix.effects)) if submix.effects else None
+        )
+        self.submix = AudioTrack(sample_rate)
+        self.num_processed = 0
+
+    @property
+    def finished(self) -> bool:
+        return all(track.finished for track in self.tracks)
+
+    def process(self) -> Optional[Tuple[int, NDArray[np.float64]]]:
+        """Output of the effects over the samples of the submix that became final."""
+        for track in self.tracks:
+            if block := track.process():
+                self.submix.add_at_offset(*block)
+        start = self.num_processed
+        if self.finished:
+            end = len(self.submix)
+        else:
+            end = min(track.num_processed for track in self.tracks if not track.finished)
+        if end <= start:
+            return None
+        self.num_processed = end
+        samples = get_padded_window(self.submix, start, end)
+        if self.effects is not None:
+            samples = np.asarray(
+                self.effects(samples, self.submix.sampling_rate, reset=start == 0),
+                dtype=np.float64,
+            )
+        return start, samples
+
+
+def get_padded_window(
+    audio_track: AudioTrack, start: int, stop: int
+) -> NDArray[np.float64]:
+    """Samples of a track between two offsets, with silence past its end."""
+    samples = np.zeros(stop - start, dtype=np.float64)
+    window = audio_track.get_window(start, stop)
+    samples[: window.size] = window
+    return samples
+
+
+def get_headroom_gain(song: models.Song) -> float:
+    """Fixed gain for mixes whose peak is not known yet, such as progressive ones.
+
+    It keeps the mix in range while each string rings once at full level, anything
+    louder is clipped. Strings rarely peak together, so this is quiet: the foggy demo
+    peaks at about 0.04 of full scale. Pass a gain of your own to play louder.
+    """
+    num_strings = sum(
+        track.weight * len(track.instrument.tuning) for track in song.tracks.values()
+    )
+    return 1 / num_strings if num_strings > 0 else 1.0
@@ -0,0 +1,676 @@
+"""Reading tablatures into audio tracks and running them through their effects."""
+
+import math
+from typing import (
+    Any,
+    Set,
+    Dict,
+    List,
+    Final,
+    Tuple,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    FrozenSet,
+    AbstractSet,
+)
+from fractions import Fraction
+from itertools import repeat
+from collections import Counter
+from dataclasses import replace, dataclass
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pedalboard
+from numpy.typing import NDArray
+
+from tablature import models
+from tablature.effects import Convolution, EffectChain
+from guitar_synth.chord import Chord
+from guitar_synth.track import AudioTrack, SparseAudioTrack
+from guitar_synth.stroke import Velocity
+from guitar_synth.voices import VoiceManager
+from guitar_synth.sampler import Sampler
+from guitar_synth.temporal import Time, MeasuredTimeline
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer, StringVibration
+from guitar_synth.instrument import MUTED, StringTuning, PluckedStringInstrument
+from guitar_synth.processing import normalize
+from guitar_synth.compression import Compression
+
+SAMPLING_RATE: Final[int] = 44100
+BLOCK_SIZE: Final[int] = 65536
+LINEAR_EFFECTS: Final[FrozenSet[str]] = frozenset(
+    {
+        "Chorus",
+        "Convolution",
+        "Delay",
+        "Gain",
+        "HighShelfFilter",
+        "HighpassFilter",
+        "Invert",
+        "LowShelfFilter",
+        "LowpassFilter",
+        "PeakFilter",
+        "Phaser",
+        "Reverb",
+    }
+)
+
+type Notation = Tuple[Chord, Velocity, Optional[Time]]
+
+
+@dataclass(frozen=True)
+class Window:
+    start: Time = Time(0)
+    end: Optional[Time] = None
+
+    @property
+    def duration(self) -> Optional[Time]:
+        if self.end is None:
+            return None
+        return Time(self.end.seconds - self.start.seconds)
+
+    def overlaps(self, instant: Time, duration: Time) -> bool:
+        if (instant + duration).seconds <= self.start.seconds:
+            return False
+        return self.end is None or instant.seconds < self.end.seconds
+
+    def is_over(self, instant: Time) -> bool:
+        return self.end is not None and instant.seconds >= self.end.seconds
+
+
+@dataclass(frozen=True)
+class Strum:
+    instant: Time
+    chord: Chord
+    velocity: Velocity
+    vibration: Optional[Time] = None
+
+    @property
+    def notation(self) -> Notation:
+        return self.chord, self.velocity, self.vibration
+
+
+@dataclass(frozen=True)
+class Submix:
+    """Tracks summed by weight, each through its own effects, then through shared ones.
+
+    Inserts map the names of the tracks to the effects run on them alone.
+    """
+
+    effects: Tuple[models.Effect, ...]
+    inserts: Dict[str, Tuple[models.Effect, ...]]
+    name: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return self.name or "+".join(self.inserts)
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    sampler: bool = False
+    sample_rate: int = SAMPLING_RATE
+    window: Window = Window()
+    cut_off: bool = False
+    max_voices: Optional[int] = None
+    silence_threshold: Optional[float] = None
+    sparse: bool = False
+    compression: Optional[Compression] = None
+
+    @property
+    def manages_voices(self) -> bool:
+        return self.cut_off or self.max_voices is not None
+
+
+def get_submixes(song: models.Song) -> List[Submix]:
+    """Group the tracks of a song by the effects they can share.
+
+    Tracks routed to a bus keep their own effects and share the effects of the bus.
+    Other tracks with identical chains of linear effects are mixed before running
+    the chain once. This sounds the same up to rounding, except that the tails of
+    the effects on shorter tracks ring on instead of stopping where they end.
+    """
+    buses = {name: Submix(bus.effects, {}, name) for name, bus in song.buses.items()}
+    groups: List[Submix] = []
+    for name, track in song.tracks.items():
+        effects = track.instrument.effects
+        if track.bus is not None:
+            buses[track.bus].inserts[name] = effects
+        elif all(get_effect_name(effect) in LINEAR_EFFECTS for effect in effects):
+            group = next((group for group in groups if group.effects == effects), None)
+            if group is None:
+                group = Submix(effects, {})
+                groups.append(group)
+            group.inserts[name] = ()
+        else:
+            groups.append(Submix((), {name: effects}))
+    return [submix for submix in groups + list(buses.values()) if submix.inserts]
+
+
+def apply_bus(
+    submix: Submix, tracks: List[NDArray[np.float32]], sample_rate: int
+) -> List[NDArray[np.float32]]:
+    """Run the effects of a submix once over the sum of its weighted tracks."""
+    if not submix.effects:
+        return tracks
+    bus = AudioTrack(sample_rate)
+    bus.pad(max(samples.size for samples in tracks))
+    for samples in tracks:
+        bus.samples[: samples.size] += samples
+    return [apply_effects(bus, submix.effects)]
+
+
+def mix(tracks: List[NDArray[np.float32]]) -> NDArray[np.float64]:
+    samples = np.zeros(max(array.size for array in tracks), dtype=np.float64)
+    for array in tracks:
+        samples[: array.size] += array
+    return normalize(samples, out=samples)
+
+
+def synthesize(
+    track: models.Track,
+    options: RenderOptions = RenderOptions(),
+    segments: Optional[int] = None,
+    effects: Optional[Sequence[models.Effect]] = None,
+) -> NDArray[np.float32]:
+    """Read a track and run it through its effects, or the given ones instead."""
+    if segments is None:
+        audio_track = read_track(track, options)
+    else:
+        audio_track = read_track_in_segments(track, options, segments)
+    if effects is None:
+        effects = track.instrument.effects
+    return apply_effects(audio_track, effects)
+
+
+def read_track(
+    track: models.Track,
+    options: RenderOptions = RenderOptions(),
+    buffer: Optional[NDArray[np.float64]] = None,
+) -> AudioTrack:
+    synthesizer = get_synthesizer(track.instrument, options)
+    audio_track: AudioTrack
+    if options.sparse:
+        audio_track = SparseAudioTrack(synthesizer.sample_rate, options.window.start)
+    else:
+        audio_track = AudioTrack(synthesizer.sample_rate, options.window.start, buffer)
+    timeline = MeasuredTimeline()
+    voices = get_voices(audio_track, options)
+    if track.tablature.form and voices is None:
+        read_sections(track.tablature, synthesizer, audio_track, options.window)
+    else:
+        read(
+            track.tablature,
+            synthesizer,
+            audio_track,
+            timeline,
+            options.window,
+            voices,
+            get_single_strums(track.tablature, synthesizer, options),
+        )
+    if voices is not None:
+        voices.flush()
+    if options.window.duration is not None:
+        audio_track.trim(options.window.duration)
+    return audio_track
+
+
+def read_track_in_segments(
+    track: models.Track,
+    options: RenderOptions = RenderOptions(),
+    max_workers: Optional[int] = None,
+) -> AudioTrack:
+    """Read a track in time segments rendered by worker processes.
+
+    The vibrations of all strums are rendered first and handed to every worker, so
+    that strums ringing across a boundary sound the same on both sides of it. Each
+    worker owns the samples of its segment and adds the tails of earlier strums to
+    them in the original order, which makes the stitched track bit-identical to
+    reading it at once. Voices depend on everything played before, so tracks are
+    read at once when they are managed.
+    """
+    if options.manages_voices:
+        return read_track(track, options)
+    synthesizer = get_synthesizer(track.instrument, options)
+    vibrations = get_vibrations([track], options)
+    if not options.sampler:
+        render_vibrations(vibrations, max_workers)
+    for notation in get_unique_strums(track.tablature, synthesizer, options.window):
+        synthesizer.pluck_strings(*notation)
+    if isinstance(synthesizer, Sampler):
+        for frequency in np.unique(synthesizer.instrument.fret_frequencies):
+            vibration = synthesizer.get_vibration(
+                float(frequency),
+                synthesizer.instrument.vibration,
+                track.instrument.damping,
+            )
+            vibrations[vibration] = None
+    entries: Dict[Hashable, NDArray[np.float64]] = {
+        vibration: VIBRATIONS.entries[vibration]
+        for vibration in vibrations
+        if vibration in VIBRATIONS
+    }
+    segments = split_measures(track.tablature, options.window, max_workers or 1)
+    single_strums = get_single_strums(track.tablature, synthesizer, options)
+    audio_track = AudioTrack(synthesizer.sample_rate, options.window.start)
+    with ProcessPoolExecutor(
+        max_workers, initializer=VIBRATIONS.update, initargs=(entries,)
+    ) as executor:
+        for segment, samples in zip(
+            segments,
+            executor.map(
+                read_segment,
+                repeat(track),
+                repeat(options),
+                segments,
+                repeat(single_strums),
+            ),
+        ):
+            if samples.size > 0:
+                audio_track.add_at(segment.start, samples)
+    if options.window.duration is not None:
+        audio_track.trim(options.window.duration)
+    return audio_track
+
+
+def read_segment(
+    track: models.Track,
+    options: RenderOptions,
+    segment: Window,
+    single_strums: AbstractSet[Notation] = frozenset(),
+) -> NDArray[np.float64]:
+    """Samples of a track from the start of a segment up to its end, if any.
+
+    Strums are placed like read_track does, given the single strums of the whole
+    track, so that the samples are the same.
+    """
+    synthesizer = get_synthesizer(track.instrument, options)
+    audio_track = AudioTrack(synthesizer.sample_rate, segment.start)
+    window = Window(options.window.start, segment.end)
+    for strum in get_audible_strums(track.tablature, synthesizer, window):
+        offset = audio_track.get_offset(strum.instant)
+        if offset + synthesizer.get_num_samples(*strum.notation) > 0:
+            place_strum(strum, synthesizer, audio_track, window, None, single_strums)
+    if segment.end is None or segment.end == options.window.end:
+        return audio_track.samples
+    return audio_track.samples[: audio_track.get_offset(segment.end)]
+
+
+def split_measures(
+    tablature: models.Tablature, window: Window, num_segments: int
+) -> List[Window]:
+    """Split a window into up to num_segments segments starting on measure boundaries."""
+    beat = Time(60 / tablature.beats_per_minute)
+    timeline = MeasuredTimeline()
+    boundaries = []
+    for measure in tablature.measures:
+        if window.is_over(timeline.instant):
+            break
+        if timeline.instant.seconds > window.start.seconds:
+            boundaries.append(timeline.instant)
+        timeline.measure = beat * measure.beats_per_measure
+        next(timeline)
+    step = math.ceil((len(boundaries) + 1) / max(num_segments, 1))
+    starts = [window.start, *boundaries[step - 1 :: step]]  # noqa: E203
+    return [Window(start, end) for start, end in zip(starts, [*starts[1:], window.end])]
+
+
+def get_synthesizer(
+    instrument: models.Instrument, options: RenderOptions = RenderOptions()
+) -> Synthesizer:
+    synthesizer_class = Sampler if options.sampler else Synthesizer
+    return synthesizer_class(
+        instrument=PluckedStringInstrument(
+            tuning=StringTuning.from_notes(*instrument.tuning),
+            damping=instrument.damping,
+            vibration=Time(instrument.vibration),
+        ),
+        sample_rate=options.sample_rate,
+        silence_threshold=options.silence_threshold,
+        compression=options.compression,
+    )
+
+
+def get_voices(
+    audio_track: AudioTrack, options: RenderOptions = RenderOptions()
+) -> Optional[VoiceManager]:
+    if not options.manages_voices:
+        return None
+    return VoiceManager(audio_track, options.cut_off, options.max_voices)
+
+
+def read(
+    tablature: models.Tablature,
+    synthesizer: Synthesizer,
+    audio_track: AudioTrack,
+    timeline: MeasuredTimeline,
+    window: Window = Window(),
+    voices: Optional[VoiceManager] = None,
+    single_strums: AbstractSet[Notation] = frozenset(),
+) -> None:
+    for measure in tablature.measures:
+        if window.is_over(timeline.instant):
+            break
+        read_measure(
+            tablature,
+            measure,
+            synthesizer,
+            audio_track,
+            timeline,
+            window,
+            voices,
+            single_strums,
+        )
+
+
+def read_sections(
+    tablature: models.Tablature,
+    synthesizer: Synthesizer,
+    audio_track: AudioTrack,
+    window: Window = Window(),
+) -> None:
+    """Read each distinct pass through a section once and mix copies of its audio.
+
+    Tails ringing past the end of a pass overlap the start of the next one. Voices
+    cut strings across passes, so such tablatures are read note by note instead.
+    """
+    phrases: Dict[Hashable, NDArray[np.float64]] = {}
+    timeline = MeasuredTimeline()
+    for key, measures in tablature.phrases:
+        if window.is_over(timeline.instant):
+            break
+        read_phrase(
+            tablature, key, measures, synthesizer, audio_track, timeline, window, phrases
+        )
+
+
+def read_phrase(
+    tablature: models.Tablature,
+    key: models.PhraseKey,
+    measures: Sequence[models.Measure],
+    synthesizer: Synthesizer,
+    audio_track: AudioTrack,
+    timeline: MeasuredTimeline,
+    window: Window,
+    phrases: Dict[Hashable, NDArray[np.float64]],
+) -> None:
+    """Mix a pass through a section into a track, reusing the audio in phrases.
+
+    Notes are placed at the offsets read() places them at, so passes only share
+    their audio when their audible notes fall on the same offsets from their start.
+    """
+    start = audio_track.get_offset(timeline.instant)
+    strums = [
+        (index, audio_track.get_offset(strum.instant) - start, strum.notation)
+        for index, strum in enumerate(
+            strum
+            for measure in measures
+            for strum in get_strums(tablature, measure, timeline)
+        )
+        if is_audible(strum, synthesizer, window)
+    ]
+    if not strums:
+        return
+    phrase_key = (key, tuple((index, offset) for index, offset, _ in strums))
+    if phrase_key not in phrases:
+        phrase = AudioTrack(synthesizer.sample_rate)
+        for _, offset, notation in strums:
+            phrase.add_at_offset(offset, synthesizer.strum_clip(*notation))
+        phrases[phrase_key] = phrase.samples
+    audio_track.add_at_offset(start, phrases[phrase_key])
+
+
+def read_measure(
+    tablature: models.Tablature,
+    measure: models.Measure,
+    synthesizer: Synthesizer,
+    audio_track: AudioTrack,
+    timeline: MeasuredTimeline,
+    window: Window = Window(),
+    voices: Optional[VoiceManager] = None,
+    single_strums: AbstractSet[Notation] = frozenset(),
+) -> None:
+    """Mix the audible strums of a measure into a track.
+
+    Strums in single_strums are rendered straight into the track string by string,
+    as caching them would not pay off.
+    """
+    for strum in get_strums(tablature, measure, timeline):
+        place_strum(strum, synthesizer, audio_track, window, voices, single_strums)
+
+
+def place_strum(
+    strum: Strum,
+    synthesizer: Synthesizer,
+    audio_track: AudioTrack,
+    window: Window = Window(),
+    voices: Optional[VoiceManager] = None,
+    single_strums: AbstractSet[Notation] = frozenset(),
+) -> None:
+    overlaps = is_audible(strum, synthesizer, window)
+    if voices is not None:
+        offset = audio_track.get_offset(strum.instant)
+        if overlaps:
+            for string, delay, sound in synthesizer.pluck_strings(*strum.notation):
+                voices.pluck(string, offset + delay, sound)
+        else:
+            for string, delay in synthesizer.get_string_offsets(
+                strum.chord, strum.velocity
+            ):
+                voices.mute(string, offset + delay)
+    elif overlaps and strum.notation in single_strums:
+        offset = audio_track.get_offset(strum.instant)
+        audio_track.pad(offset + synthesizer.get_num_samples(*strum.notation))
+        synthesizer.render_into(audio_track.samples, offset, *strum.notation)
+    elif overlaps:
+        audio_track.add_at(strum.instant, synthesizer.strum_clip(*strum.notation))
+
+
+def is_audible(strum: Strum, synthesizer: Synthesizer, window: Window) -> bool:
+    num_samples = synthesizer.get_num_samples(*strum.notation)
+    return window.overlaps(strum.instant, Time(num_samples / synthesizer.sample_rate))
+
+
+def get_strums(
+    tablature: models.Tablature, measure: models.Measure, timeline: MeasuredTimeline
+) -> Iterator[Strum]:
+    """Place the notes of a measure on the timeline, then move on to the next one."""
+    beat = Time(60 / tablature.beats_per_minute)
+    timeline.measure = beat * measure.beats_per_measure
+    whole_note = beat * measure.note_value.denominator
+    notes = measure.compact_notes
+    for frets, offset, upstroke, arpeggio, vibration in zip(
+        notes.frets.tolist(),
+        notes.offsets,
+        notes.upstrokes.tolist(),
+        notes.arpeggios.tolist(),
+        notes.vibrations.tolist(),
+    ):
+        stroke = Velocity.up if upstroke else Velocity.down
+        yield Strum(
+            instant=(timeline >> (whole_note * Fraction(offset))).instant,
+            chord=Chord(None if fret == MUTED else fret for fret in frets),
+            velocity=stroke(delay=Time(arpeggio)),
+            vibration=None if math.isnan(vibration) else Time(vibration),
+        )
+    next(timeline)
+
+
+def warm_up(
+    song: models.Song,
+    options: RenderOptions = RenderOptions(),
+    max_workers: Optional[int] = None,
+) -> int:
+    """Synthesize the string vibrations of all unique strums in worker processes.
+
+    The results seed the synthesis cache, so reading the tablatures afterwards only
+    mixes. Vibrations shared by several tracks are rendered once. Returns the number
+    of vibrations rendered.
+    """
+    if options.sampler:
+        return 0
+    return render_vibrations(get_vibrations(song.tracks.values(), options), max_workers)
+
+
+def get_vibrations(
+    tracks: Iterable[models.Track], options: RenderOptions = RenderOptions()
+) -> Dict[StringVibration, None]:
+    """String vibrations of the unique audible strums of the tracks.
+
+    Without a window, every note is audible, so the notes of whole tracks are
+    resolved at once instead of strum by strum.
+    """
+    vibrations: Dict[StringVibration, None] = {}
+    for track in tracks:
+        synthesizer = get_synthesizer(track.instrument, replace(options, sampler=False))
+        if options.window == Window():
+            vibrations.update(get_note_vibrations(track.tablature, synthesizer))
+            continue
+        for notation in get_unique_strums(track.tablature, synthesizer, options.window):
+            vibrations.update(dict.fromkeys(synthesizer.get_vibrations(*notation)))
+    return vibrations
+
+
+def get_note_vibrations(
+    tablature: models.Tablature, synthesizer: Synthesizer
+) -> Dict[StringVibration, None]:
+    """String vibrations of all notes of a tablature, from the frets of its measures."""
+    measures = [measure for measure in tablature.measures if measure.frets.size > 0]
+    if not measures:
+        return {}
+    frequencies = synthesizer.instrument.resolve(
+        np.concatenate([measure.frets for measure in measures])
+    )
+    durations = np.broadcast_to(
+        np.concatenate([measure.compact_notes.vibrations for measure in measures])[
+            :, np.newaxis
+        ],
+        frequencies.shape,
+    )
+    played = ~np.isnan(frequencies)
+    notes = np.unique(np.stack([frequencies[played], durations[played]], axis=-1), axis=0)
+    instrument = synthesizer.instrument
+    return {
+        synthesizer.get_vibration(
+            frequency,
+            instrument.vibration if math.isnan(duration) else Time(duration),
+            instrument.damping,
+        ): None
+        for frequency, duration in notes.tolist()
+    }
+
+
+def render_vibrations(
+    vibrations: Iterable[StringVibration], max_workers: Optional[int] = None
+) -> int:
+    """Render the vibrations missing from the synthesis cache in worker processes."""
+    missing = [vibration for vibration in vibrations if vibration not in VIBRATIONS]
+    if missing:
+        with ProcessPoolExecutor(max_workers, initializer=np.random.seed) as executor:
+            for vibration, samples in zip(
+                missing, executor.map(StringVibration.render, missing)
+            ):
+                VIBRATIONS.put(vibration, samples)
+    return len(missing)
+
+
+def get_single_strums(
+    tablature: models.Tablature, synthesizer: Synthesizer, options: RenderOptions
+) -> Set[Notation]:
+    """Audible strums played only once, which read_measure may render in place.
+
+    This needs a dense track of the exact length of the strums, which silence
+    thresholds make unknown until the strings are synthesized.
+    """
+    if not can_render_in_place(options):
+        return set()
+    counts = Counter(
+        strum.notation
+        for strum in get_audible_strums(tablature, synthesizer, options.window)
+    )
+    return {notation for notation, count in counts.items() if count == 1}
+
+
+def can_render_in_place(options: RenderOptions) -> bool:
+    return not (
+        options.sparse or options.compression or options.silence_threshold is not None
+    )
+
+
+def get_unique_strums(
+    tablature: models.Tablature, synthesizer: Synthesizer, window: Window = Window()
+) -> Set[Notation]:
+    return {
+        strum.notation for strum in get_audible_strums(tablature, synthesizer, window)
+    }
+
+
+def get_audible_strums(
+    tablature: models.Tablature, synthesizer: Synthesizer, window: Window = Window()
+) -> Iterator[Strum]:
+    for strum in iter_strums(tablature, window):
+        if is_audible(strum, synthesizer, window):
+            yield strum
+
+
+def iter_strums(
+    tablature: models.Tablature, window: Window = Window()
+) -> Iterator[Strum]:
+    """Strums of the measures starting before the end of the window, audible or not."""
+    timeline = MeasuredTimeline()
+    for measure in tablature.measures:
+        if window.is_over(timeline.instant):
+            break
+        yield from get_strums(tablature, measure, timeline)
+
+
+def apply_effects(
+    audio_track: AudioTrack, effects: Sequence[models.Effect]
+) -> NDArray[np.float32]:
+    """Run the effects over the track, block by block for sparse tracks.
+
+    Sparse tracks are never mixed as a whole, only the output of the effects is.
+    """
+    if isinstance(audio_track, SparseAudioTrack):
+        output = np.empty(len(audio_track), dtype=np.float32)
+        for start, block in apply_effects_in_blocks(audio_track, effects):
+            output[start : start + block.size] = block  # noqa: E203
+        return output
+    chain = EffectChain(get_plugins(effects))
+    return chain(audio_track.samples, audio_track.sampling_rate)
+
+
+def apply_effects_in_blocks(
+    audio_track: AudioTrack,
+    effects: Sequence[models.Effect],
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[Tuple[int, NDArray[np.float32]]]:
+    """Run the effects over consecutive blocks of the track, keeping their state."""
+    chain = EffectChain(get_plugins(effects))
+    for start in range(0, len(audio_track), block_size):
+        block = audio_track.get_window(start, start + block_size)
+        yield start, chain(
+            block.astype(np.float32), audio_track.sampling_rate, reset=start == 0
+        )
+
+
+def get_plugins(effects: Sequence[models.Effect]) -> List[Any]:
+    return [get_plugin(effect) for effect in effects]
+
+
+def get_effect_name(effect: models.Effect) -> str:
+    return effect if isinstance(effect, str) else next(iter(effect))
+
+
+def get_plugin(effect: models.Effect) -> Any:
+    match effect:
+        case str() as class_name:
+            return getattr(pedalboard, class_name)()
+        case dict() as plugin_dict if len(plugin_dict) == 1:
+            class_name, params = list(plugin_dict.items())[0]
+            if class_name == Convolution.__name__:
+                return Convolution(**params)
+            return getattr(pedalboard, class_name)(**params)
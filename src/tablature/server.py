@@ -0,0 +1,286 @@
+"""Long-running render server keeping synthesis caches warm between jobs.
+
+Jobs are submitted as the command line arguments of play-tab and rendered by a pool
+of worker processes that live as long as the server, so every job benefits from the
+imports and synthesis caches left behind by the previous ones. Caches are trimmed
+to their size in CACHE_SIZES after each job, and only the last finished jobs are
+kept for status requests. Jobs only read and write files inside the root directory
+of the server, which relative paths are resolved against, and cannot stream to its
+standard output. Only JSON bodies are accepted, so that browsers cannot submit jobs
+from other origins without a preflight request.
+
+    POST /jobs        {"args": ["song.yaml", "-o", "song.wav"]} -> 202 {"id": ...}
+    GET  /jobs/<id>   status of a job
+    GET  /metrics     queue depth, latency and cache statistics
+"""
+
+import os
+import enum
+import json
+import time
+import uuid
+import threading
+import multiprocessing
+from typing import Any, Dict, List, Final, Tuple, NoReturn, Optional, Sequence
+from pathlib import Path
+from argparse import Namespace, ArgumentParser
+from collections import Counter, deque
+from dataclasses import field, asdict, dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from tablature import player
+from tablature.effects import read_impulse_response, get_impulse_response_spectra
+from guitar_synth.sampler import Sampler
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer
+
+DEFAULT_HOST: Final[str] = "127.0.0.1"
+DEFAULT_PORT: Final[int] = 8765
+LATENCY_WINDOW: Final[int] = 100
+MAX_FINISHED_JOBS: Final[int] = 1000
+CACHE_SIZES: Final[Dict[str, int]] = {
+    "strum_strings": 1024,
+    "strum_clip": 1024,
+    "vibrate": 4096,
+    "sampler_vibrate": 4096,
+    "impulse_responses": 16,
+    "impulse_response_files": 16,
+}
+
+
+class JobStatus(enum.StrEnum):
+    QUEUED = enum.auto()
+    RUNNING = enum.auto()
+    DONE = enum.auto()
+    FAILED = enum.auto()
+
+
+@dataclass
+class RenderJob:
+    args: List[str]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class JobArgumentParser(ArgumentParser):
+    """Parser of the arguments of jobs, raising ValueError instead of exiting."""
+
+    def error(self, message: str) -> NoReturn:
+        raise ValueError(message)
+
+
+class RenderQueue:
+    def __init__(
+        self,
+        num_workers: int,
+        root: Optional[Path] = None,
+        max_finished_jobs: int = MAX_FINISHED_JOBS,
+    ) -> None:
+        self.root = (root or Path.cwd()).resolve()
+        self.jobs: Dict[str, RenderJob] = {}
+        self.finished: deque[str] = deque()
+        self.max_finished_jobs = max_finished_jobs
+        self.counts: Counter[JobStatus] = Counter()
+        self.cache_info: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self.waits: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.renders: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+        # Workers start from dispatcher threads, where forking could deadlock
+        self.workers = ProcessPoolExecutor(
+            num_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=init_worker,
+            initargs=(self.root,),
+        )
+        self.dispatchers = ThreadPoolExecutor(num_workers)
+
+    def submit(self, args: List[str]) -> RenderJob:
+        check_args(args, self.root)  # Reject invalid jobs before queueing them
+        job = RenderJob(args)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.dispatchers.submit(self.dispatch, job)
+        return job
+
+    def dispatch(self, job: RenderJob) -> None:
+        job.status, job.started_at = JobStatus.RUNNING, time.time()
+        try:
+            pid, cache_info = self.workers.submit(render, job.args).result()
+        except BaseException as exception:
+            job.status, job.error = JobStatus.FAILED, repr(exception)
+        else:
+            job.status = JobStatus.DONE
+            with self.lock:
+                self.cache_info[pid] = cache_info
+        finally:
+            job.finished_at = time.time()
+            with self.lock:
+                self.waits.append(job.started_at - job.submitted_at)
+                self.renders.append(job.finished_at - job.started_at)
+                self.counts[job.status] += 1
+                self.finished.append(job.id)
+                while len(self.finished) > self.max_finished_jobs:
+                    del self.jobs[self.finished.popleft()]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+            return {
+                "queue_depth": statuses.count(JobStatus.QUEUED),
+                "running": statuses.count(JobStatus.RUNNING),
+                "done": self.counts[JobStatus.DONE],
+                "failed": self.counts[JobStatus.FAILED],
+                "latency": {
+                    "wait": summarize(self.waits),
+                    "render": summarize(self.renders),
+                },
+                "cache": {str(pid): info for pid, info in self.cache_info.items()},
+            }
+
+    def shutdown(self) -> None:
+        self.dispatchers.shutdown(cancel_futures=True)
+        self.workers.shutdown(cancel_futures=True)
+
+
+class RenderServer(ThreadingHTTPServer):
+    def __init__(self, address: Tuple[str, int], queue: RenderQueue) -> None:
+        super().__init__(address, RenderRequestHandler)
+        self.queue = queue
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    server: RenderServer
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            self.reply(200, self.server.queue.get_metrics())
+        elif self.path.startswith("/jobs/"):
+            job = self.server.queue.jobs.get(self.path.removeprefix("/jobs/"))
+            if job is None:
+                self.reply(404, {"error": "Unknown job"})
+            else:
+                self.reply(200, asdict(job))
+        else:
+            self.reply(404, {"error": f"Unknown path: '{self.path}'"})
+
+    def do_POST(self) -> None:
+        if self.path != "/jobs":
+            self.reply(404, {"error": f"Unknown path: '{self.path}'"})
+            return
+        if self.headers.get_content_type() != "application/json":
+            self.reply(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            job = self.server.queue.submit([str(arg) for arg in body["args"]])
+        except (KeyError, TypeError, ValueError, SystemExit) as exception:
+            self.reply(400, {"error": f"Invalid job: {exception}"})
+        else:
+            self.reply(202, asdict(job))
+
+    def reply(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def check_args(args: List[str], root: Optional[Path] = None) -> Namespace:
+    """Arguments of a job, raising ValueError with the message of the parser.
+
+    With a root directory, the tablature and the output must be inside of it.
+    """
+    namespace = player.parse_args(args, JobArgumentParser(prog="play-tab"))
+    if namespace.output == player.STDOUT:
+        raise ValueError("argument -o/--output: jobs cannot stream to stdout")
+    if root is not None:
+        root = root.resolve()
+        for name, path in (("path", namespace.path), ("-o/--output", namespace.output)):
+            if path is not None and not (root / path).resolve().is_relative_to(root):
+                raise ValueError(f"argument {name}: must be inside {root}")
+    return namespace
+
+
+def init_worker(root: Path) -> None:
+    os.chdir(root)
+    VIBRATIONS.maxsize = CACHE_SIZES["vibrate"]
+
+
+def render(args: List[str]) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+    player.play(player.parse_args(args))
+    trim_caches()
+    return os.getpid(), get_cache_info()
+
+
+def get_caches() -> Dict[str, Any]:
+    """Function caches of the process, which only clear as a whole."""
+    return {
+        "strum_strings": Synthesizer.strum_strings,
+        "strum_clip": Synthesizer.strum_clip,
+        "sampler_vibrate": Sampler._vibrate,
+        "impulse_responses": get_impulse_response_spectra,
+        "impulse_response_files": read_impulse_response,
+    }
+
+
+def trim_caches() -> None:
+    """Clear the function caches grown past their size and trim the vibrations."""
+    for name, function in get_caches().items():
+        if function.cache_info().currsize > CACHE_SIZES[name]:
+            function.cache_clear()
+    VIBRATIONS.trim()
+
+
+def get_cache_info() -> Dict[str, Dict[str, Any]]:
+    info = {
+        name: function.cache_info()._asdict() | {"maxsize": CACHE_SIZES[name]}
+        for name, function in get_caches().items()
+    }
+    return info | {"vibrate": VIBRATIONS.get_info()}
+
+
+def summarize(seconds: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not seconds:
+        return {"mean": None, "max": None}
+    return {"mean": sum(seconds) / len(seconds), "max": max(seconds)}
+
+
+def main() -> None:
+    serve(parse_args())
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(prog="render-server")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to use")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes rendering jobs",
+    )
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=Path("."),
+        help="Directory jobs read and write files in (defaults to the working directory)",
+    )
+    return parser.parse_args()
+
+
+def serve(args: Namespace) -> None:
+    queue = RenderQueue(args.workers, args.root)
+    with RenderServer((args.host, args.port), queue) as server:
+        print(f"Serving on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            queue.shutdown()
@@ -1,7 +1,9 @@
 import numpy as np
 import pytest  # noqa: F401
+from numpy.testing import assert_array_equal
 
-from guitar_synth.burst import WhiteNoise
+from guitar_synth.burst import WhiteNoise, generate_bursts
+from guitar_synth.temporal import Hertz
 
 
 # Test WhiteNoise class
@@ -29,3 +31,47 @@ def test_white_noise_output_range() -> None:
     # Check if the output values are between -1 and 1
     assert np.all(output >= -1.0)
     assert np.all(output <= 1.0)
+
+
+def test_white_noise_seed() -> None:
+    generator = WhiteNoise(seed=42)
+
+    # Seeded generators are deterministic and compare equal by their seed
+    assert np.array_equal(generator(100, 44100), generator(100, 44100))
+    assert generator == WhiteNoise(seed=42)
+    assert hash(generator) == hash(WhiteNoise(seed=42))
+    assert generator != WhiteNoise()
+
+
+def test_white_noise_batch() -> None:
+    generator = WhiteNoise()
+    lengths = [3, 5, 0, 2]
+
+    np.random.seed(1)
+    expected = [generator(length, 44100) for length in lengths]
+    np.random.seed(1)
+    bursts, offsets = generator.batch(lengths, 44100)
+
+    # Bursts are packed back to back exactly as consecutive calls draw them
+    assert_array_equal(offsets, [0, 3, 8, 8, 10])
+    for burst, start, end in zip(expected, offsets[:-1], offsets[1:]):
+        assert_array_equal(bursts[start:end], burst)
+
+
+def test_white_noise_batch_seed() -> None:
+    generator = WhiteNoise(seed=42)
+    bursts, offsets = generator.batch([4, 2], 44100)
+
+    assert_array_equal(bursts[:4], generator(4, 44100))
+    assert_array_equal(bursts[4:], generator(2, 44100))
+
+
+# Test generate_bursts function
+def test_generate_bursts_without_batch() -> None:
+    def generator(num_samples: int, sample_rate: Hertz) -> np.ndarray:
+        return np.full(num_samples, num_samples, dtype=np.float64)
+
+    bursts, offsets = generate_bursts(generator, [1, 2, 3], 44100)
+
+    assert_array_equal(offsets, [0, 1, 3, 6])
+    assert_array_equal(bursts, [1, 2, 2, 3, 3, 3])
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from guitar_synth.chord import Chord
+from guitar_synth.track import AudioTrack, SparseAudioTrack
+from guitar_synth.stroke import Velocity, Direction
+from guitar_synth.temporal import Time
+from guitar_synth.synthesis import Synthesizer
+from guitar_synth.compression import Compression, CompressedSamples
+
+
+# Test CompressedSamples class
+@pytest.mark.parametrize(
+    "compression, max_error",
+    [(Compression.INT16, 1 / 65534), (Compression.FLOAT16, 1 / 2048)],
+)
+def test_compressed_samples_error(compression: Compression, max_error: float) -> None:
+    samples = np.random.uniform(-0.3, 0.3, 10000)
+    compressed = CompressedSamples.encode(samples, compression)
+
+    # Codes take a quarter of the memory, the error is bounded relative to the peak
+    assert compressed.nbytes == samples.nbytes // 4
+    error = np.abs(compressed.decode() - samples).max()
+    assert error <= max_error * np.abs(samples).max()
+
+
+def test_compressed_samples_silence() -> None:
+    compressed = CompressedSamples.encode(np.zeros(100), Compression.INT16)
+
+    assert_array_equal(compressed.decode(), np.zeros(100))
+
+
+def test_compressed_samples_add_to() -> None:
+    samples = np.random.uniform(-1, 1, 100000)
+    compressed = CompressedSamples.encode(samples, Compression.INT16)
+    out = np.ones(50000)
+
+    compressed[25000:75000].add_to(out)
+
+    assert np.allclose(out, 1 + compressed.decode()[25000:75000])
+
+
+# Test compressed samples in audio tracks
+def test_audio_track_compressed_samples() -> None:
+    samples = np.random.uniform(-1, 1, 30000)
+    compressed = CompressedSamples.encode(samples, Compression.INT16)
+    dense = AudioTrack(sampling_rate=44100, start=Time(0.5))
+    sparse = SparseAudioTrack(sampling_rate=44100, start=Time(0.5))
+
+    for audio_track in (dense, sparse):
+        audio_track.add_at(Time(0.25), compressed)
+        audio_track.add_at(Time(1), compressed)
+
+    expected = AudioTrack(sampling_rate=44100, start=Time(0.5))
+    expected.add_at(Time(0.25), compressed.decode())
+    expected.add_at(Time(1), compressed.decode())
+    assert_array_equal(dense.samples, expected.samples)
+    assert_array_equal(sparse.samples, expected.samples)
+
+
+def test_synthesizer_compression(synthesizer: Synthesizer) -> None:
+    compressed = Synthesizer(synthesizer.instrument, compression=Compression.INT16)
+    chord = Chord([0, 2, 2, 1, 0, 0])
+    velocity = Velocity(Direction.DOWN, Time(0.01))
+
+    clip = compressed.strum_clip(chord, velocity)
+
+    assert isinstance(clip, CompressedSamples)
+    assert compressed.strum_clip(chord, velocity) is clip
+    # Without compression the cached strum itself is used
+    assert synthesizer.strum_clip(chord, velocity, None) is synthesizer.strum_strings(
+        chord, velocity, None
+    )
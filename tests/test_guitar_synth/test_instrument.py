@@ -1,9 +1,17 @@
+from typing import Any
+
+import numpy as np
 import pytest
 
 from guitar_synth.chord import Chord
 from guitar_synth.pitch import Pitch
 from guitar_synth.temporal import Time
-from guitar_synth.instrument import StringTuning, VibratingString, PluckedStringInstrument
+from guitar_synth.instrument import (
+    MUTED,
+    StringTuning,
+    VibratingString,
+    PluckedStringInstrument,
+)
 
 
 # Test VibratingString class
@@ -74,3 +82,66 @@ def test_plucked_string_instrument_downstroke_chord() -> None:
     assert downstroke_pitches[3].frequency == tuning.strings[2].pitch.adjust(2).frequency
     assert downstroke_pitches[4].frequency == tuning.strings[1].pitch.adjust(2).frequency
     assert downstroke_pitches[5].frequency == tuning.strings[0].pitch.adjust(0).frequency
+
+
+def test_plucked_string_instrument_fret_frequencies() -> None:
+    tuning = StringTuning.from_notes("E4", "A3", "D4", "G4", "B3", "E2")
+    instrument = PluckedStringInstrument(tuning=tuning, vibration=Time(1), num_frets=12)
+
+    table = instrument.fret_frequencies
+
+    # One row per string, one column per fret including the open string
+    assert table.shape == (6, 13)
+    assert not table.flags.writeable
+    for row, string in zip(table, tuning.strings):
+        assert row[0] == string.pitch.frequency
+        assert row[7] == string.press_fret(7).frequency
+    # Twelfth fret is one octave above the open string
+    assert np.allclose(table[:, 12], 2 * table[:, 0])
+
+
+def test_plucked_string_instrument_resolve_chords() -> None:
+    tuning = StringTuning.from_notes("E4", "A3", "D4", "G4", "B3", "E2")
+    instrument = PluckedStringInstrument(tuning=tuning, vibration=Time(1))
+    chords = np.array(
+        [
+            [0, 2, 2, 1, 0, 0],
+            [MUTED, 0, 2, MUTED, MUTED, 3],
+        ]
+    )
+
+    frequencies = instrument.resolve(chords)
+
+    assert frequencies.shape == (2, 6)
+    for chord, row in zip(chords, frequencies):
+        for string, fret_number, frequency in zip(tuning.strings, chord, row):
+            if fret_number == MUTED:
+                assert np.isnan(frequency)
+            else:
+                assert frequency == string.press_fret(int(fret_number)).frequency
+
+
+@pytest.mark.parametrize("chords", [[[0, 2, 2]], 3])
+def test_plucked_string_instrument_resolve_invalid(chords: Any) -> None:
+    tuning = StringTuning.from_notes("E4", "A3", "D4", "G4", "B3", "E2")
+    instrument = PluckedStringInstrument(tuning=tuning, vibration=Time(1))
+
+    with pytest.raises(ValueError, match="same number of strings as the instrument"):
+        instrument.resolve(chords)
+
+
+# Test that frets past the frequency table are not limited
+def test_plucked_string_instrument_high_frets() -> None:
+    tuning = StringTuning.from_notes("E4", "A3", "D4", "G4", "B3", "E2")
+    instrument = PluckedStringInstrument(tuning=tuning, vibration=Time(1), num_frets=12)
+    chord = Chord([None, 13, 27, 0, None, 24])
+
+    frequencies = instrument.resolve([MUTED if fret is None else fret for fret in chord])
+
+    assert instrument.fret_frequencies.shape == (6, 13)
+    assert [pitch.frequency for pitch in instrument.upstroke(chord)] == [
+        string.press_fret(fret).frequency
+        for string, fret in zip(tuning.strings, chord)
+        if fret is not None
+    ]
+    assert frequencies[2] == tuning.strings[2].press_fret(27).frequency
@@ -1,7 +1,18 @@
 import numpy as np
-import pytest  # noqa: F401
+import pytest
 
-from guitar_synth.processing import normalize, remove_dc
+from guitar_synth.processing import (
+    RunningStats,
+    PartitionedConvolver,
+    fade_out,
+    get_peak,
+    quantize,
+    resample,
+    normalize,
+    remove_dc,
+    partition_spectra,
+    remove_dc_and_normalize,
+)
 
 
 # Test remove_dc function
@@ -28,3 +39,119 @@ def test_normalize() -> None:
     # Check if normalization is applied correctly
     expected = samples / np.abs(samples).max()
     assert np.allclose(result, expected)
+
+
+# Test resample function
+def test_resample_same_rate() -> None:
+    samples = np.array([1.0, -3.0, 2.0])
+    assert resample(samples, 44100, 44100) is samples
+
+
+@pytest.mark.parametrize("source_rate, target_rate", [(11025, 44100), (44100, 22050)])
+def test_resample_length(source_rate: int, target_rate: int) -> None:
+    samples = np.zeros(source_rate)  # 1 second
+    result = resample(samples, source_rate, target_rate)
+
+    # The duration should be preserved
+    assert result.size == target_rate
+
+
+def test_resample_interpolates() -> None:
+    samples = np.array([0.0, 1.0, 0.0, -1.0])
+    result = resample(samples, 11025, 22050)
+
+    # Original samples are kept and midpoints are interpolated
+    assert np.allclose(result[::2], samples)
+    assert np.allclose(result[1:-1:2], [0.5, 0.5, -0.5])
+
+
+# Test fade_out function
+def test_fade_out() -> None:
+    samples = np.ones(4)
+    result = fade_out(samples)
+
+    assert np.allclose(result, [1.0, 0.75, 0.5, 0.25])
+    assert np.all(samples == 1.0)
+
+
+# Test in-place variants
+def test_remove_dc_and_normalize_in_place() -> None:
+    samples = np.array([1.0, 2.0, 3.0, 4.0, 10.0])
+    expected = normalize(remove_dc(samples))
+
+    result = remove_dc_and_normalize(samples, out=samples)
+
+    assert result is samples
+    assert np.array_equal(result, expected)
+
+
+def test_normalize_out() -> None:
+    samples = np.array([1.0, -3.0, 2.0])
+    out = np.empty_like(samples)
+
+    result = normalize(samples, out=out)
+
+    assert result is out
+    assert np.allclose(out, samples / 3.0)
+
+
+def test_get_peak() -> None:
+    assert get_peak(np.array([1.0, -3.0, 2.0])) == 3.0
+    assert get_peak(np.array([1.0, 4.0, 2.0])) == 4.0
+
+
+# Test RunningStats class
+def test_running_stats_blocks() -> None:
+    samples = np.random.uniform(-1.0, 1.0, 1000) + 0.25
+    stats = RunningStats()
+    for start in range(0, samples.size, 300):
+        stats.update(samples[start : start + 300])  # noqa: E203
+    stats.update(np.array([]))
+
+    assert stats.num_samples == samples.size
+    assert np.isclose(stats.mean, samples.mean())
+    assert np.isclose(stats.peak, np.abs(samples - samples.mean()).max())
+
+    # Applying the stats block by block matches processing the whole signal
+    blocks = [stats.apply(samples[:500]), stats.apply(samples[500:])]
+    assert np.allclose(np.concatenate(blocks), normalize(remove_dc(samples)))
+
+
+# Test quantize function
+def test_quantize() -> None:
+    samples = np.array([-1.0, -0.5, 0.0, 0.5, 1.0, 1.5])
+    result = quantize(samples)
+
+    assert result.dtype == np.dtype("<i2")
+    assert result.tolist() == [-32767, -16384, 0, 16384, 32767, 32767]
+
+
+def test_quantize_dither() -> None:
+    samples = np.full(10000, 0.25 / 32767)
+    result = quantize(samples, dither=True)
+
+    # Dither keeps the error within one step and preserves the level on average
+    assert np.all(np.abs(result) <= 1)
+    assert np.isclose(result.mean(), 0.25, atol=0.05)
+
+
+# Test PartitionedConvolver class
+def test_partitioned_convolver() -> None:
+    impulse_response = np.random.uniform(-1, 1, 1000)
+    samples = np.random.uniform(-1, 1, 5000)
+    spectra = partition_spectra(impulse_response, block_size=256)
+
+    assert spectra.shape == (4, 257)
+    expected = np.convolve(samples, impulse_response)[: samples.size]
+    assert np.allclose(PartitionedConvolver(spectra)(samples), expected)
+
+
+def test_partitioned_convolver_blocks() -> None:
+    impulse_response = np.random.uniform(-1, 1, 1000)
+    samples = np.random.uniform(-1, 1, 5000)
+    convolver = PartitionedConvolver(partition_spectra(impulse_response, block_size=256))
+
+    # Blocks of any length come out without latency
+    blocks = [convolver(block) for block in np.split(samples, [1, 300, 301, 2048])]
+    expected = np.convolve(samples, impulse_response)[: samples.size]
+    assert np.allclose(np.concatenate(blocks), expected)
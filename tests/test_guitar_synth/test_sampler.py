@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from guitar_synth.chord import Chord
+from guitar_synth.stroke import Velocity
+from guitar_synth.sampler import Sampler, SampleBank
+from guitar_synth.temporal import Time
+from guitar_synth.instrument import StringTuning, PluckedStringInstrument
+
+
+@pytest.fixture(scope="function")
+def sampler() -> Sampler:
+    instrument = PluckedStringInstrument(
+        tuning=StringTuning.from_notes("E2", "A2", "D3"),
+        vibration=Time(0.2),
+        num_frets=5,
+    )
+    return Sampler(instrument=instrument)
+
+
+# Test SampleBank class
+def test_sample_bank_exact_frequency_is_a_view() -> None:
+    sound = np.linspace(1.0, 0.0, 100)
+    bank = SampleBank({110.0: sound})
+
+    output = bank.play(110.0, 50)
+
+    assert output is not None
+    assert np.shares_memory(output, sound)
+    assert_array_equal(output, sound[:50])
+
+
+def test_sample_bank_resamples_off_grid_frequency() -> None:
+    sound = np.arange(100, dtype=np.float64)
+    bank = SampleBank({100.0: sound})
+
+    output = bank.play(50.0, 10)
+
+    # Playing at half the frequency reads the sample at half speed
+    assert output is not None
+    assert_array_equal(output, np.arange(10) * 0.5)
+
+
+@pytest.mark.parametrize("frequency, num_samples", [(200.0, 10), (100.0, 101)])
+def test_sample_bank_out_of_range(frequency: float, num_samples: int) -> None:
+    bank = SampleBank({100.0: np.zeros(100)})
+    assert bank.play(frequency, num_samples) is None
+
+
+# Test Sampler class
+def test_sampler_renders_unique_frequencies(sampler: Sampler) -> None:
+    # A2 and D3 are the fifth fret of E2 and A2 respectively
+    assert len(sampler.bank) == np.unique(sampler.instrument.fret_frequencies).size
+    assert len(sampler.bank) < sampler.instrument.fret_frequencies.size
+
+
+def test_sampler_serves_notes_from_bank(sampler: Sampler) -> None:
+    frequency = float(sampler.instrument.fret_frequencies[0, 3])
+    output = sampler._vibrate(frequency, Time(0.1), sampler.instrument.damping)
+
+    assert output.size == Time(0.1).get_num_samples(sampler.sample_rate)
+    assert any(np.shares_memory(output, sound) for sound in sampler.bank.samples)
+
+
+def test_sampler_falls_back_to_synthesis(sampler: Sampler) -> None:
+    frequency = float(sampler.instrument.fret_frequencies[0, 3])
+    output = sampler._vibrate(frequency, Time(0.5), sampler.instrument.damping)
+
+    assert output.size == Time(0.5).get_num_samples(sampler.sample_rate)
+    assert not any(np.shares_memory(output, sound) for sound in sampler.bank.samples)
+
+
+def test_sampler_strum_strings(sampler: Sampler) -> None:
+    output = sampler.strum_strings(Chord([0, 2, None]), Velocity.down(Time(0.01)))
+
+    assert output.size > 0
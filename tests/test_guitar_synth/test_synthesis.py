@@ -1,11 +1,24 @@
+import sys
+from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import pytest  # noqa: F401
-from numpy.testing import assert_almost_equal
+import pytest
+from numpy.typing import NDArray
+from numpy.testing import assert_array_equal, assert_almost_equal
 
+from guitar_synth.burst import WhiteNoise
 from guitar_synth.chord import Chord
 from guitar_synth.stroke import Velocity, Direction
 from guitar_synth.temporal import Time
-from guitar_synth.synthesis import Synthesizer
+from guitar_synth.synthesis import (
+    VIBRATIONS,
+    Synthesizer,
+    SynthesisCache,
+    StringVibration,
+    feedback_loop,
+)
+from guitar_synth.instrument import StringTuning, PluckedStringInstrument
 
 
 # Test strum_strings method
@@ -151,3 +164,307 @@ def test_overlay_no_delay(synthesizer: Synthesizer) -> None:
         output[: sound2.size], sound1[: sound2.size] + sound2
     )  # noqa: E203
     assert_almost_equal(output[sound2.size :], sound1[sound2.size :])  # noqa: E203
+
+
+# Test that get_num_samples predicts the length of strummed chords
+@pytest.mark.parametrize(
+    "chord, vibration",
+    [
+        (Chord([0, 2, 2, 1, 0, 0]), None),
+        (Chord([None, 2, None, 1, 0, None]), Time(0.5)),
+    ],
+)
+def test_get_num_samples(
+    synthesizer: Synthesizer, chord: Chord, vibration: Time | None
+) -> None:
+    velocity = Velocity(Direction.DOWN, Time(0.05))
+
+    output = synthesizer.strum_strings(chord, velocity, vibration)
+
+    assert synthesizer.get_num_samples(chord, velocity, vibration) == output.size
+
+
+# Test that pluck_strings keeps the strings of a strum apart
+@pytest.mark.parametrize("direction", [Direction.UP, Direction.DOWN])
+def test_pluck_strings(synthesizer: Synthesizer, direction: Direction) -> None:
+    chord = Chord([None, 2, None, 1, 0, None])
+    velocity = Velocity(direction, Time(0.05))
+    num_delay_samples = velocity.delay.get_num_samples(synthesizer.sample_rate)
+
+    plucks = synthesizer.pluck_strings(chord, velocity)
+
+    strings = [1, 3, 4] if direction == Direction.UP else [4, 3, 1]
+    assert [string for string, _, _ in plucks] == strings
+    assert [offset for _, offset, _ in plucks] == [
+        0,
+        num_delay_samples,
+        2 * num_delay_samples,
+    ]
+    assert synthesizer.get_string_offsets(chord, velocity) == tuple(
+        (string, offset) for string, offset, _ in plucks
+    )
+
+    # Overlaying the plucked strings gives the strummed chord
+    assert_almost_equal(
+        synthesizer._overlay([sound for _, _, sound in plucks], velocity.delay),
+        synthesizer.strum_strings(chord, velocity),
+    )
+
+
+# Test that the strings of a strum are synthesized in one batch
+def test_strum_strings_vibrate_many(
+    synthesizer: Synthesizer, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    chord = Chord([0, 2, 2, 1, 0, 0])
+    velocity = Velocity(Direction.DOWN, Time(0.01))
+    cache = SynthesisCache()
+    calls = []
+    vibrate_many = cache.vibrate_many
+
+    def spy(vibrations: List[StringVibration]) -> Tuple[NDArray[np.float64], ...]:
+        calls.append(len(vibrations))
+        return vibrate_many(vibrations)
+
+    monkeypatch.setattr(cache, "vibrate_many", spy)
+    monkeypatch.setattr(cache, "vibrate", None)
+    monkeypatch.setattr("guitar_synth.synthesis.VIBRATIONS", cache)
+
+    np.random.seed(5)
+    plucks = synthesizer.pluck_strings(chord, velocity)
+    np.random.seed(5)
+    expected = [
+        vibration.render()
+        for vibration in synthesizer.get_vibrations(chord, velocity, None)
+    ]
+
+    assert calls == [6]
+    for (_, _, sound), samples in zip(plucks, expected):
+        assert_array_equal(sound, samples)
+
+
+# Test the feedback loop against the recurrence of the Karplus-Strong algorithm
+@pytest.mark.parametrize("buffer_size", [1, 2, 100])
+def test_feedback_loop(buffer_size: int) -> None:
+    buffer = np.random.uniform(-1.0, 1.0, buffer_size)
+    damping = 0.498
+
+    output = feedback_loop(buffer.copy(), damping, 1000)
+
+    assert output.shape == (1000,)
+    assert_array_equal(output[:buffer_size], buffer)
+    if buffer_size > 1:
+        expected = (output[:-buffer_size] + output[1:][: 1000 - buffer_size]) * damping
+        assert_array_equal(output[buffer_size:], expected)
+    else:
+        assert_array_equal(output[1:], output[:-1] * 2 * damping)
+
+
+# Test that synthesis stops once the string is silent
+def test_vibrate_silence_threshold(instrument: PluckedStringInstrument) -> None:
+    synthesizer = Synthesizer(instrument=instrument, silence_threshold=-60)
+    duration = Time(5)
+
+    output = synthesizer._vibrate(880, duration, damping=0.49)
+
+    assert 0 < output.size < duration.get_num_samples(synthesizer.sample_rate)
+    assert_almost_equal(np.abs(output).max(), 1.0, decimal=5)
+    # The last period is already below the threshold
+    period = round(synthesizer.sample_rate / 880)
+    assert np.ptp(output[-period:]) < np.ptp(output[:period]) * 10 ** (-60 / 20)
+
+
+def test_vibrate_without_silence_threshold(synthesizer: Synthesizer) -> None:
+    duration = Time(5)
+    output = synthesizer._vibrate(880, duration, damping=0.49)
+    assert output.size == duration.get_num_samples(synthesizer.sample_rate)
+
+
+# Test that seeded vibrations are served from the cache
+def test_seed_vibration(synthesizer: Synthesizer) -> None:
+    chord = Chord([None, None, None, None, 3, None])
+    velocity = Velocity(Direction.DOWN, Time(0))
+    vibration = Time(0.25)
+    (string_vibration,) = synthesizer.get_vibrations(chord, velocity, vibration)
+    samples = np.linspace(1.0, 0.0, vibration.get_num_samples(synthesizer.sample_rate))
+
+    VIBRATIONS.put(string_vibration, samples)
+    hits = VIBRATIONS.hits
+
+    assert_array_equal(synthesizer.strum_strings(chord, velocity, vibration), samples)
+    assert VIBRATIONS.hits == hits + 1
+
+
+# Test SynthesisCache class
+def test_synthesis_cache_info() -> None:
+    cache = SynthesisCache()
+    assert cache.get("key") is None
+
+    cache.put("key", np.zeros(10))
+    assert "key" in cache
+    assert cache.get("key") is not None
+    assert cache.get_info() == {"hits": 1, "misses": 1, "maxsize": None, "currsize": 1}
+
+    cache.clear()
+    assert cache.get_info() == {"hits": 0, "misses": 0, "maxsize": None, "currsize": 0}
+
+    cache.update({"a": np.zeros(10), "b": np.ones(10)})
+    assert len(cache) == 2
+    assert_array_equal(cache.entries["b"], np.ones(10))
+
+
+# Test that instruments sharing strings share their vibrations
+def test_vibrations_shared_across_instruments() -> None:
+    guitar = PluckedStringInstrument(
+        tuning=StringTuning.from_notes("E2", "A2", "D3", "G3", "B3", "E4"),
+        vibration=Time(1),
+    )
+    bass = PluckedStringInstrument(
+        tuning=StringTuning.from_notes("E1", "A1", "D2", "G2"), vibration=Time(2)
+    )
+    burst_generator = WhiteNoise(seed=7)
+    guitar_synthesizer = Synthesizer(guitar, burst_generator)
+    bass_synthesizer = Synthesizer(bass, burst_generator)
+
+    # Fret 12 on the bass E string is the guitar's open E string
+    frequency = bass.fret_frequencies[3, 12]
+    assert frequency == guitar.fret_frequencies[5, 0]
+    output = guitar_synthesizer._vibrate(frequency, Time(0.5))
+    hits = VIBRATIONS.hits
+
+    assert bass_synthesizer._vibrate(frequency, Time(0.5)) is output
+    assert VIBRATIONS.hits == hits + 1
+
+
+def test_synthesis_cache_vibrate_many(synthesizer: Synthesizer) -> None:
+    vibrations = [
+        synthesizer.get_vibration(frequency, Time(0.1)) for frequency in (110, 220, 110)
+    ]
+    cache = SynthesisCache()
+
+    np.random.seed(3)
+    output = cache.vibrate_many(vibrations)
+    np.random.seed(3)
+    expected = [vibration.render() for vibration in vibrations[:2]]
+
+    # Bursts drawn in one batch match rendering the vibrations one by one
+    assert len(cache) == 2
+    assert output[0] is output[2]
+    assert_array_equal(output[0], expected[0])
+    assert_array_equal(output[1], expected[1])
+
+
+# Test that vibrations differing only in duration share their synthesis
+@pytest.mark.parametrize("silence_threshold", [None, -20.0])
+def test_synthesis_cache_prefixes(silence_threshold: float | None) -> None:
+    vibrations = [
+        StringVibration(
+            frequency=110.0,
+            duration=Time(seconds),
+            damping=0.49,
+            sample_rate=8000,
+            burst_generator=WhiteNoise(seed=5),
+            silence_threshold=silence_threshold,
+        )
+        for seconds in (0.3, 0.1, 1.0, 0.2071)
+    ]
+    cache = SynthesisCache()
+
+    outputs = [cache.vibrate(vibration) for vibration in vibrations]
+
+    assert len(cache) == 4
+    assert list(cache.prefixes) == [vibrations[0].string]
+    for vibration, output in zip(vibrations, outputs):
+        assert_array_equal(output, vibration.render())
+
+
+# Test that trimming evicts the least recently used entries and unused prefixes
+def test_synthesis_cache_trim() -> None:
+    vibrations = [
+        StringVibration(frequency, Time(seconds), 0.49, 8000, WhiteNoise(seed=5))
+        for frequency in (110.0, 220.0)
+        for seconds in (0.1, 0.2)
+    ]
+    cache = SynthesisCache(maxsize=2)
+    for vibration in vibrations:
+        cache.vibrate(vibration)
+    cache.vibrate(vibrations[0])
+    assert len(cache) == 4
+
+    cache.trim()
+
+    assert list(cache.entries) == [vibrations[3], vibrations[0]]
+    assert set(cache.prefixes) == {vibrations[0].string, vibrations[3].string}
+    assert cache.get_info()["maxsize"] == 2
+
+    cache.maxsize = 1
+    cache.trim()
+
+    assert list(cache.entries) == [vibrations[0]]
+    assert list(cache.prefixes) == [vibrations[0].string]
+
+
+def test_synthesis_cache_retain() -> None:
+    vibrations = [
+        StringVibration(frequency, Time(seconds), 0.49, 8000, WhiteNoise(seed=5))
+        for frequency in (110.0, 220.0)
+        for seconds in (0.1, 0.2)
+    ]
+    cache = SynthesisCache()
+    outputs = [cache.vibrate(vibration) for vibration in vibrations]
+
+    cache.retain([vibrations[2], vibrations[0], "missing"])
+
+    assert list(cache.entries) == [vibrations[0], vibrations[2]]
+    assert cache.entries[vibrations[2]] is outputs[2]
+    assert list(cache.prefixes) == [vibrations[0].string, vibrations[2].string]
+
+    cache.retain([])
+
+    assert len(cache) == 0 and not cache.prefixes
+
+
+# Test that strings extended by concurrent renders match serial ones
+def test_synthesis_cache_threads() -> None:
+    vibrations = [
+        StringVibration(
+            frequency=frequency,
+            duration=Time(seconds),
+            damping=0.49,
+            sample_rate=8000,
+            burst_generator=WhiteNoise(seed=11),
+        )
+        for seconds in np.linspace(0.05, 2.0, 40)
+        for frequency in (1000.0, 2000.0)
+    ]
+    cache = SynthesisCache()
+
+    # Short periods and thread switches make interleaved extensions likely
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            outputs = list(executor.map(cache.vibrate, vibrations))
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert len(cache.prefixes) == 2
+    for vibration, output in zip(vibrations, outputs):
+        assert_array_equal(output, vibration.render())
+
+
+# Test render_into method
+@pytest.mark.parametrize("offset", [0, 100, -300, 4000])
+def test_render_into(synthesizer: Synthesizer, offset: int) -> None:
+    chord = Chord([0, 2, 2, 1, 0, 0])  # A major chord
+    velocity = Velocity(Direction.DOWN, Time(0.01))
+    strum = synthesizer.strum_strings(chord, velocity, None)
+    out = np.ones(5000)
+
+    synthesizer.render_into(out, offset, chord, velocity, None, gain=0.5)
+
+    # Only the part of the strum falling inside of the buffer is added
+    positions = np.arange(strum.size) + offset
+    inside = (positions >= 0) & (positions < out.size)
+    expected = np.ones(out.size)
+    expected[positions[inside]] += 0.5 * strum[inside]
+    assert_almost_equal(out, expected)
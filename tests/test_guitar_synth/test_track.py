@@ -2,7 +2,7 @@ import numpy as np
 import pytest  # noqa: F401
 from numpy.testing import assert_array_equal
 
-from guitar_synth.track import AudioTrack
+from guitar_synth.track import AudioTrack, SparseAudioTrack
 from guitar_synth.temporal import Time
 
 
@@ -102,3 +102,117 @@ def test_audio_track_add_at_truncate_to_end(audio_track: AudioTrack) -> None:
     assert_array_equal(audio_track.samples[44100:44200], samples2)
     assert_array_equal(audio_track.samples[88200:88300], samples3)
     assert_array_equal(audio_track.samples[132300:132400], samples4)
+
+
+def test_audio_track_add_at_with_start() -> None:
+    audio_track = AudioTrack(sampling_rate=44100, start=Time(1))
+
+    samples1 = np.arange(44200, dtype=np.float64)
+    audio_track.add_at(Time(0), samples1)
+
+    # Only the part ringing past the start of the track is kept
+    assert len(audio_track) == 100
+    assert_array_equal(audio_track.samples, samples1[44100:])
+
+    samples2 = np.ones(100)
+    audio_track.add_at(Time(1.5), samples2)
+
+    assert len(audio_track) == 22150
+    assert_array_equal(audio_track.samples[22050:22150], samples2)
+
+
+def test_audio_track_trim(audio_track: AudioTrack) -> None:
+    audio_track.add(np.ones(44100))
+    audio_track.trim(Time(0.5))
+
+    assert audio_track.duration == Time(0.5)
+
+
+def test_audio_track_buffer() -> None:
+    buffer = np.zeros(44100)
+    audio_track = AudioTrack(sampling_rate=44100, buffer=buffer)
+
+    audio_track.add_at(Time(0), np.ones(100))
+    audio_track.add_at(Time(0.5), np.ones(100))
+
+    # Samples are written into the buffer while they fit
+    assert len(audio_track) == 22150
+    assert np.shares_memory(audio_track.samples, buffer)
+    assert buffer.sum() == 200
+
+    audio_track.add_at(Time(1), np.ones(100))
+
+    assert len(audio_track) == 44200
+    assert not np.shares_memory(audio_track.samples, buffer)
+    assert audio_track.samples.sum() == 300
+
+
+def test_audio_track_growth(audio_track: AudioTrack) -> None:
+    audio_track.add(np.ones(100))
+    first_buffer = audio_track.buffer
+
+    # Tracks grow into a buffer twice as long, which later samples fill in place
+    audio_track.add(np.ones(10))
+    buffer = audio_track.buffer
+    assert buffer is not None and buffer is not first_buffer and buffer.size == 200
+    audio_track.pad(150)
+    audio_track.add_at_offset(180, np.ones(20))
+
+    assert audio_track.buffer is buffer
+    assert np.shares_memory(audio_track.samples, buffer)
+    assert len(audio_track) == 200
+    assert_array_equal(
+        audio_track.samples[100:], np.r_[np.ones(10), np.zeros(70), np.ones(20)]
+    )
+
+
+# Test SparseAudioTrack class
+def test_sparse_audio_track_matches_dense() -> None:
+    dense = AudioTrack(sampling_rate=44100, start=Time(1))
+    sparse = SparseAudioTrack(sampling_rate=44100, start=Time(1))
+    sounds = [np.random.uniform(-1, 1, 30000) for _ in range(4)]
+
+    for track in (dense, sparse):
+        track.add_at(Time(0.5), sounds[0])
+        track.add_at(Time(2), sounds[1])
+        track.add_at(Time(1.25), sounds[2])
+        track.add_at(Time(3.5), sounds[3])
+        track.trim(Time(2.6))
+
+    assert len(sparse) == len(dense)
+    assert_array_equal(sparse.samples, dense.samples)
+    assert_array_equal(sparse.get_window(40000, 50000), dense.get_window(40000, 50000))
+
+
+def test_sparse_audio_track_keeps_views() -> None:
+    audio_track = SparseAudioTrack(sampling_rate=44100)
+    samples = np.ones(100)
+    audio_track.add_at(Time(10), samples)
+
+    # Long rests take no memory, the clip is the added array itself
+    assert len(audio_track) == 441100
+    assert audio_track.clips[0][2] is samples
+    assert audio_track.get_window(441000, 441200).sum() == 100
+
+
+def test_sparse_audio_track_sorts_clips() -> None:
+    dense = AudioTrack(sampling_rate=1000)
+    sparse = SparseAudioTrack(sampling_rate=1000)
+    offsets = [300, 100, 200, 0, 250, 100]
+    sounds = [np.random.uniform(-1, 1, 400) for _ in offsets]
+
+    for track in (dense, sparse):
+        for offset, sound in zip(offsets, sounds):
+            track.add_at_offset(offset, sound)
+
+    # Clips are sorted by offset, overlapping ones are mixed in the order added
+    assert sparse.offsets == sorted(offsets)
+    assert [index for _, index, _ in sparse.clips] == [3, 1, 5, 2, 4, 0]
+    for start, stop in [(0, 700), (150, 260), (650, 700), (699, 800)]:
+        assert_array_equal(sparse.get_window(start, stop), dense.get_window(start, stop))
+
+    sparse.trim(Time(0.2))
+
+    assert sparse.offsets == [0, 100, 100]
+    assert sparse.max_clip_size == 200
+    assert_array_equal(sparse.samples, dense.samples[:200])
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from guitar_synth.track import AudioTrack
+from guitar_synth.voices import VoiceManager
+from guitar_synth.temporal import Time
+
+
+# Test VoiceManager class
+def test_voice_manager_holds_voices_until_flushed(audio_track: AudioTrack) -> None:
+    voices = VoiceManager(audio_track)
+    voices.pluck(0, 0, np.ones(100))
+    voices.pluck(1, 50, np.ones(100))
+
+    assert len(voices) == 2
+    assert len(audio_track) == 0
+
+    voices.flush()
+
+    assert len(voices) == 0
+    assert len(audio_track) == 150
+    assert_array_equal(audio_track.samples[50:100], 2 * np.ones(50))
+
+
+def test_voice_manager_cuts_off_replucked_string(audio_track: AudioTrack) -> None:
+    voices = VoiceManager(audio_track, fade=Time(0))
+    voices.pluck(0, 0, np.ones(1000))
+    voices.pluck(0, 100, 2 * np.ones(100))
+    voices.flush()
+
+    # The first vibration stops where the second one starts
+    assert len(audio_track) == 200
+    assert_array_equal(audio_track.samples[:100], np.ones(100))
+    assert_array_equal(audio_track.samples[100:], 2 * np.ones(100))
+
+
+def test_voice_manager_fades_out_cut_voice(audio_track: AudioTrack) -> None:
+    voices = VoiceManager(audio_track, fade=Time(10 / 44100))
+    voices.pluck(0, 0, np.ones(1000))
+    voices.mute(0, 100)
+
+    assert len(audio_track) == 110
+    assert_array_equal(audio_track.samples[:100], np.ones(100))
+    assert np.all(np.diff(audio_track.samples[100:]) < 0)
+
+
+def test_voice_manager_without_cut_off(audio_track: AudioTrack) -> None:
+    voices = VoiceManager(audio_track, cut_off=False)
+    voices.pluck(0, 0, np.ones(100))
+    voices.pluck(0, 50, np.ones(100))
+    voices.flush()
+
+    assert_array_equal(audio_track.samples[50:100], 2 * np.ones(50))
+
+
+def test_voice_manager_steals_oldest_voice(audio_track: AudioTrack) -> None:
+    voices = VoiceManager(audio_track, max_voices=2, fade=Time(0))
+    voices.pluck(0, 0, np.ones(1000))
+    voices.pluck(1, 10, np.ones(1000))
+    voices.pluck(2, 20, np.ones(1000))
+
+    assert len(voices) == 2
+    assert [voice.string for voice in voices.voices] == [1, 2]
+
+    voices.flush()
+
+    # The oldest voice only rang until the third string was plucked
+    assert_array_equal(audio_track.samples[:10], np.ones(10))
+    assert_array_equal(audio_track.samples[20:1000], 2 * np.ones(980))
+
+
+def test_voice_manager_invalid_max_voices(audio_track: AudioTrack) -> None:
+    with pytest.raises(ValueError, match="Maximum number of voices must be at least 1"):
+        VoiceManager(audio_track, max_voices=0)
@@ -0,0 +1,80 @@
+from typing import Any, Dict, Callable
+from pathlib import Path
+
+import yaml
+import numpy as np
+import pytest
+
+from tablature import models
+from tablature.rendering import RenderOptions, get_vibrations
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer
+
+SONG = """
+tracks:
+  rhythm:
+    weight: 0.7
+    instrument:
+      tuning: [E2, A2, D3, G3, B3, E4]
+      vibration: 0.5
+    tablature:
+      beats_per_minute: 120
+      measures:
+        - time_signature: 4/4
+          notes: x02210; x02210 u 1/4; x02210 d 1/4; x32010 u 1/4
+        - time_signature: 4/4
+          notes: 3x0003 1/1
+  lead:
+    instrument:
+      tuning: [E2, A2, D3, G3, B3, E4]
+      vibration: 0.3
+      damping: 0.49
+      effects:
+        - Compressor
+    tablature:
+      beats_per_minute: 120
+      measures:
+        - time_signature: 4/4
+          notes: xxxx1x 1/8; xxxx3x 1/4; xxxxx0 1/4; xxxx1x 1/4
+        - time_signature: 4/4
+          notes: xxx2xx 1/4; xxx0xx 1/4
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> None:
+    VIBRATIONS.clear()
+    Synthesizer.strum_strings.cache_clear()
+    Synthesizer.strum_clip.cache_clear()
+
+
+@pytest.fixture(scope="function")
+def song_data() -> Dict[str, Any]:
+    data: Dict[str, Any] = yaml.safe_load(SONG)
+    return data
+
+
+@pytest.fixture(scope="function")
+def song(song_data: Dict[str, Any]) -> models.Song:
+    return models.Song(**song_data)
+
+
+@pytest.fixture(scope="session")
+def impulse_response() -> Path:
+    return Path(__file__).parents[2] / "demo" / "ir" / "acoustic.wav"
+
+
+@pytest.fixture(scope="function")
+def seed_vibrations() -> Callable[[models.Song, RenderOptions], None]:
+    """Render the vibrations of a song from a fixed seed into emptied caches.
+
+    Renders reading them afterwards come out the same whatever order they draw in.
+    """
+
+    def seed(song: models.Song, options: RenderOptions = RenderOptions()) -> None:
+        VIBRATIONS.clear()
+        Synthesizer.strum_strings.cache_clear()
+        Synthesizer.strum_clip.cache_clear()
+        np.random.seed(0)
+        VIBRATIONS.vibrate_many(list(get_vibrations(song.tracks.values(), options)))
+
+    return seed
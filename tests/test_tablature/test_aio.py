@@ -0,0 +1,85 @@
+import asyncio
+from typing import Any, Dict, List, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+
+from tablature import models
+from tablature.aio import render_song, stream_song, render_track
+from tablature.player import render
+from tablature.rendering import SAMPLING_RATE, RenderOptions
+from tablature.progressive import get_headroom_gain, render_progressively
+from guitar_synth.processing import resample
+
+
+# Test render_song function
+@pytest.mark.parametrize("form", [False, True])
+def test_render_song(
+    song_data: Dict[str, Any],
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    form: bool,
+) -> None:
+    if form:
+        # Passes through sections are read as render() reads them
+        tablature = song_data["tracks"]["rhythm"]["tablature"]
+        tablature["beats_per_minute"] = 96
+        tablature["sections"] = {
+            "verse": {"repeat": 3, "measures": tablature.pop("measures")}
+        }
+        tablature["form"] = ["verse"]
+    song = models.Song(**song_data)
+    options = RenderOptions(sample_rate=22050)
+    seed_vibrations(song, options)
+    expected = resample(render(song, options), options.sample_rate, SAMPLING_RATE)
+
+    # Tracks rendered in threads share the synthesis cache
+    seed_vibrations(song, options)
+    progress: List[float] = []
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        samples = asyncio.run(
+            render_song(song, options, progress.append, executor=executor)
+        )
+
+    assert np.array_equal(samples, expected)
+    assert progress == sorted(progress) and progress[-1] == 1
+
+
+# Test that render_track reads tablatures with a form pass by pass
+def test_render_track_sections(song_data: Dict[str, Any]) -> None:
+    tablature = song_data["tracks"]["rhythm"]["tablature"]
+    tablature["sections"] = {
+        "verse": {"repeat": 3, "measures": tablature.pop("measures")}
+    }
+    tablature["form"] = ["verse"]
+    track = models.Song(**song_data).tracks["rhythm"]
+    progress: List[float] = []
+
+    asyncio.run(render_track(track, RenderOptions(sample_rate=22050), progress.append))
+
+    assert progress == [2 / 6, 4 / 6, 1]
+
+
+# Test stream_song function
+def test_stream_song(
+    song: models.Song, seed_vibrations: Callable[[models.Song, RenderOptions], None]
+) -> None:
+    options = RenderOptions()
+    seed_vibrations(song, options)
+    expected = render(song, options)
+
+    async def stream(gain: Optional[float] = None) -> List[NDArray[np.float64]]:
+        return [block async for block in stream_song(song, block_size=4096, gain=gain)]
+
+    # Streamed blocks concatenate to the output of render()
+    blocks = asyncio.run(stream())
+    assert all(block.size <= 4096 for block in blocks)
+    assert np.array_equal(np.concatenate(blocks), expected)
+
+    # With a fixed gain, blocks are the progressive mix at that gain
+    gain = get_headroom_gain(song)
+    mixed = np.concatenate(list(render_progressively(song, options)))
+    blocks = asyncio.run(stream(gain))
+    assert all(block.size <= 4096 for block in blocks)
+    assert np.array_equal(np.concatenate(blocks), np.clip(gain * mixed, -1, 1))
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import numpy as np
+
+from tablature.effects import Convolution, get_impulse_response_spectra
+from guitar_synth.processing import PartitionedConvolver
+
+
+# Test Convolution class
+def test_convolution_mix(impulse_response: Path) -> None:
+    samples = np.random.uniform(-1, 1, 10000).astype(np.float32)
+    convolution = Convolution(str(impulse_response), mix=0.25)
+
+    result = convolution(samples, 44100)
+
+    spectra = get_impulse_response_spectra(convolution.path, convolution.modified, 44100)
+    dry = samples.astype(np.float64)
+    wet = PartitionedConvolver(spectra)(dry)
+    assert result.dtype == np.float32
+    assert np.array_equal(result, (0.25 * wet + 0.75 * dry).astype(np.float32))
+
+
+def test_convolution_blocks(impulse_response: Path) -> None:
+    samples = np.random.uniform(-1, 1, 10000).astype(np.float32)
+    convolution = Convolution(str(impulse_response), mix=0.5)
+    expected = convolution(samples, 44100)
+
+    # Blocks keep the state of the convolution between calls
+    blocks = [
+        convolution(block, 44100, reset=index == 0)
+        for index, block in enumerate(np.split(samples, [1, 300, 4097]))
+    ]
+    assert np.array_equal(np.concatenate(blocks), expected)
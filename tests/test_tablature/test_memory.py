@@ -0,0 +1,43 @@
+import tracemalloc
+from typing import Any, Dict, Optional
+from pathlib import Path
+
+import pytest
+
+from tablature import models
+from tablature.memory import estimate_memory
+from tablature.player import render
+from tablature.rendering import RenderOptions
+from guitar_synth.synthesis import VIBRATIONS
+from guitar_synth.compression import Compression
+
+
+# Test estimate_memory function
+@pytest.mark.parametrize("compression", [None, Compression.INT16])
+def test_estimate_memory(
+    song_data: Dict[str, Any],
+    impulse_response: Path,
+    compression: Optional[Compression],
+) -> None:
+    convolution = {"impulse_response_filename": str(impulse_response), "mix": 0.5}
+    song_data["buses"] = {"room": {"effects": ["Reverb", {"Convolution": convolution}]}}
+    song_data["tracks"]["lead"]["bus"] = "room"
+    # Long vibrations make the caches dominate
+    for track in song_data["tracks"].values():
+        track["instrument"]["vibration"] = 3.0
+    song = models.Song(**song_data)
+    options = RenderOptions(compression=compression)
+
+    estimate = estimate_memory(song, options)
+    tracemalloc.start()
+    try:
+        render(song, options)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert peak <= estimate.total
+    if compression is not None:
+        # Vibrations are evicted once the strums of the last track are compressed
+        assert len(VIBRATIONS) == 0 and not VIBRATIONS.prefixes
+        assert estimate.caches < estimate_memory(song, RenderOptions()).caches
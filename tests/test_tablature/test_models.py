@@ -0,0 +1,92 @@
+from typing import Any, Dict, List
+
+import pytest
+from pydantic import ValidationError
+
+from tablature import models
+from guitar_synth.instrument import MUTED
+
+
+def get_tablature(**fields: Any) -> Dict[str, Any]:
+    return {
+        "beats_per_minute": 120,
+        "sections": {
+            "intro": {"measures": [measure("x02210")]},
+            "verse": {
+                "repeat": 3,
+                "measures": [measure("x32010")],
+                "endings": [[measure("3x0003")], [measure("022000")]],
+            },
+        },
+    } | fields
+
+
+def measure(notes: str) -> Dict[str, Any]:
+    return {"time_signature": "4/4", "notes": notes}
+
+
+def get_chords(tablature: models.Tablature) -> List[str]:
+    return [
+        "".join("x" if fret == MUTED else str(fret) for fret in bar.frets[0])
+        for bar in tablature.measures
+    ]
+
+
+# Test that the form spells out the measures of its sections
+def test_expand_form() -> None:
+    tablature = models.Tablature(**get_tablature(form=["intro", "verse", "intro"]))
+
+    # Repeats past the last ending play it again
+    assert get_chords(tablature) == [
+        "x02210",
+        "x32010",
+        "3x0003",
+        "x32010",
+        "022000",
+        "x32010",
+        "022000",
+        "x02210",
+    ]
+    assert [key for key, _ in tablature.phrases] == [
+        ("intro", None),
+        ("verse", 0),
+        ("verse", 1),
+        ("verse", 1),
+        ("intro", None),
+    ]
+
+
+# Test that sections without endings repeat their measures
+def test_expand_form_repeat() -> None:
+    data = get_tablature(form=["verse"])
+    data["sections"]["verse"]["endings"] = []
+
+    tablature = models.Tablature(**data)
+
+    assert get_chords(tablature) == ["x32010"] * 3
+    assert [key for key, _ in tablature.phrases] == [("verse", None)] * 3
+
+
+# Test that the form only plays declared sections
+def test_expand_form_unknown_section() -> None:
+    with pytest.raises(ValidationError, match="Unknown section 'chorus'"):
+        models.Tablature(**get_tablature(form=["intro", "chorus"]))
+
+
+# Test that a tablature has either measures or a form
+@pytest.mark.parametrize(
+    "fields",
+    [{}, {"form": []}, {"form": ["intro"], "measures": [measure("x02210")]}],
+)
+def test_expand_form_empty(fields: Dict[str, Any]) -> None:
+    with pytest.raises(ValidationError, match="either measures or a form"):
+        models.Tablature(**get_tablature(**fields))
+
+
+# Test that sections have no more endings than repeats
+def test_section_endings() -> None:
+    data = get_tablature(form=["verse"])
+    data["sections"]["verse"]["repeat"] = 1
+
+    with pytest.raises(ValidationError, match="more endings than repeats"):
+        models.Tablature(**data)
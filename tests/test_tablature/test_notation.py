@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+from numpy.testing import assert_array_equal
+
+from tablature.models import Measure
+from tablature.notation import parse_notes
+from guitar_synth.instrument import MUTED
+
+
+# Test parse_notes function
+def test_parse_notes() -> None:
+    notes = parse_notes("x32010\n x-10-12-12-11-x u 1/8 a0.04 v3.5 ;xx0232 3/8", 0.005)
+
+    assert len(notes) == 3
+    assert_array_equal(
+        notes.frets,
+        [
+            [MUTED, 3, 2, 0, 1, 0],
+            [MUTED, 10, 12, 12, 11, MUTED],
+            [MUTED, MUTED, 0, 2, 3, 2],
+        ],
+    )
+    assert notes.frets.dtype == np.int64
+    assert notes.offsets == ("0/1", "1/8", "3/8")
+    assert_array_equal(notes.upstrokes, [False, True, False])
+    assert_array_equal(notes.arpeggios, [0.005, 0.04, 0.005])
+    assert_array_equal(notes.vibrations, [np.nan, 3.5, np.nan])
+
+
+def test_parse_notes_empty() -> None:
+    notes = parse_notes(" ;\n", 0.005)
+
+    assert len(notes) == 0
+    assert notes.frets.shape == (0, 0)
+
+
+def test_parse_notes_muted() -> None:
+    assert_array_equal(parse_notes("xxxxxx", 0.005).frets, [[MUTED] * 6])
+    assert_array_equal(parse_notes("x-x-x", 0.005).frets, [[MUTED] * 3])
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "x32010 q",
+        "x32010 1/8 d",
+        "x3201o",
+        "x-3-2x-0",
+        "x--3",
+        "x32010 a",
+        "x32010 v-1",
+        "-x32010",
+    ],
+)
+def test_parse_notes_invalid(text: str) -> None:
+    with pytest.raises(ValueError, match="Invalid note"):
+        parse_notes(text, 0.005)
+
+
+@pytest.mark.parametrize("text", ["x32010; x3201", "x-3-2-0-1-0; x-3-2"])
+def test_parse_notes_ragged(text: str) -> None:
+    with pytest.raises(ValueError, match="same number of frets"):
+        parse_notes(text, 0.005)
+
+
+def test_parse_notes_zero_vibration() -> None:
+    with pytest.raises(ValueError, match="Vibrations must be positive"):
+        parse_notes("x32010 v0", 0.005)
+
+
+# Test that compact notation reads the same as mappings
+def test_compact_measure() -> None:
+    compact = Measure.model_validate(
+        {"time_signature": "4/4", "notes": "x32010 u 1/8 a0.04 v3.5; 3x0003"}
+    )
+    mapping = Measure.model_validate(
+        {
+            "time_signature": "4/4",
+            "notes": [
+                {
+                    "frets": [None, 3, 2, 0, 1, 0],
+                    "offset": "1/8",
+                    "upstroke": True,
+                    "arpeggio": 0.04,
+                    "vibration": 3.5,
+                },
+                {"frets": [3, None, 0, 0, 0, 3]},
+            ],
+        }
+    )
+
+    assert_array_equal(compact.frets, mapping.frets)
+    assert compact.compact_notes.offsets == mapping.compact_notes.offsets
+    assert_array_equal(compact.compact_notes.upstrokes, mapping.compact_notes.upstrokes)
+    assert_array_equal(compact.compact_notes.arpeggios, mapping.compact_notes.arpeggios)
+    assert_array_equal(compact.compact_notes.vibrations, mapping.compact_notes.vibrations)
+
+
+def test_compact_measure_invalid() -> None:
+    with pytest.raises(ValidationError, match="Invalid note 'x32o10'"):
+        Measure.model_validate({"time_signature": "4/4", "notes": "x32010; x32o10"})
@@ -0,0 +1,362 @@
+import sys
+from typing import Any, Dict, List, Callable, Optional
+from pathlib import Path
+from argparse import ArgumentTypeError
+
+import yaml
+import numpy as np
+import pytest
+import pedalboard
+from pydantic import ValidationError
+from numpy.typing import NDArray
+from numpy.testing import assert_allclose
+from pedalboard.io import AudioFile
+
+from tablature import models
+from tablature.memory import estimate_memory
+from tablature.player import (
+    STDOUT,
+    DRAFT_SAMPLING_RATE,
+    SampleFormat,
+    main,
+    save,
+    render,
+    parse_args,
+    get_options,
+    render_to_disk,
+)
+from guitar_synth.chord import Chord
+from guitar_synth.stroke import Velocity, Direction
+from tablature.rendering import (
+    SAMPLING_RATE,
+    Window,
+    RenderOptions,
+    mix,
+    synthesize,
+    get_submixes,
+)
+from guitar_synth.temporal import Time
+from tablature.progressive import render_progressively
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer
+from guitar_synth.processing import INT16_SCALE, resample
+from guitar_synth.compression import Compression
+
+
+# Test render function
+@pytest.mark.parametrize("window", [Window(), Window(Time(1.2), Time(3.7))])
+def test_render_in_segments(
+    song: models.Song,
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    window: Window,
+) -> None:
+    options = RenderOptions(sample_rate=22050, window=window)
+    seed_vibrations(song, options)
+
+    # Segmented renders of songs with single strums are bit-identical
+    assert np.array_equal(render(song, options, segments=3), render(song, options))
+
+
+# Test render function with tracks routed to a bus
+def test_render_bus(
+    song_data: Dict[str, Any],
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+) -> None:
+    song_data["buses"] = {"room": {"effects": ["Reverb"]}}
+    for track in song_data["tracks"].values():
+        track["bus"] = "room"
+    song = models.Song(**song_data)
+    options = RenderOptions(sample_rate=22050)
+    seed_vibrations(song, options)
+
+    output = render(song, options)
+
+    # Inserts run on each track, then the bus runs once on their weighted sum
+    rhythm, lead = song.tracks["rhythm"], song.tracks["lead"]
+    tracks = [rhythm.weight * synthesize(rhythm, options), synthesize(lead, options)]
+    bus = np.zeros(max(samples.size for samples in tracks), dtype=np.float32)
+    for samples in tracks:
+        bus[: samples.size] += samples
+    expected = mix([pedalboard.Reverb()(bus, options.sample_rate)])
+    assert_allclose(output, expected, atol=1e-6)
+
+
+# Test render function with tracks sharing a chain of linear effects
+def test_render_shared_chain(
+    song_data: Dict[str, Any],
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+) -> None:
+    effects = [
+        {"Gain": {"gain_db": -6.0}},
+        {"LowpassFilter": {"cutoff_frequency_hz": 2000}},
+    ]
+    for track in song_data["tracks"].values():
+        track["instrument"]["effects"] = effects
+    song = models.Song(**song_data)
+    options = RenderOptions(sample_rate=22050)
+    seed_vibrations(song, options)
+    assert len(get_submixes(song)) == 1
+
+    output = render(song, options)
+
+    # Running the chain once on the mix sounds the same as running it per track,
+    # up to where the shorter track ends and its tail rings on in the mix
+    tracks = [track.weight * synthesize(track, options) for track in song.tracks.values()]
+    end = min(samples.size for samples in tracks)
+    expected = mix(tracks)
+    assert output.size == expected.size
+    assert_allclose(output[:end], expected[:end], atol=1e-6)
+
+
+# Test that tracks are routed to declared buses only
+def test_unknown_bus(song_data: Dict[str, Any]) -> None:
+    song_data["buses"] = {"room": {"effects": ["Reverb"]}}
+    song_data["tracks"]["lead"]["bus"] = "hall"
+
+    with pytest.raises(ValidationError, match="Unknown bus 'hall'"):
+        models.Song(**song_data)
+
+
+# Test render_to_disk function
+@pytest.mark.parametrize("name", ["rhythm", "lead"])
+@pytest.mark.parametrize("bus", [None, "room"])
+def test_render_to_disk(
+    song_data: Dict[str, Any],
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    name: str,
+    bus: Optional[str],
+) -> None:
+    # Vibrations are dropped after each track, songs of one track keep seeded ones
+    song_data["buses"] = {"room": {"effects": ["Reverb"]}}
+    song_data["tracks"] = {name: song_data["tracks"][name] | {"bus": bus}}
+    song = models.Song(**song_data)
+    options = RenderOptions(sample_rate=22050)
+    seed_vibrations(song, options)
+    expected = render(song, options)
+    seed_vibrations(song, options)
+
+    output = render_to_disk(song, options, estimate_memory(song, options))
+
+    assert isinstance(output, np.memmap)
+    assert_allclose(output, expected, atol=1e-6)
+
+
+# Test that renders only evict the vibrations they added
+@pytest.mark.parametrize("to_disk", [False, True])
+def test_render_keeps_cached_vibrations(
+    song: models.Song, synthesizer: Synthesizer, to_disk: bool
+) -> None:
+    cached = synthesizer.get_vibrations(
+        Chord([0, 2, 2, 1, 0, 0]), Velocity(Direction.DOWN, Time(0.01))
+    )
+    VIBRATIONS.vibrate_many(cached)
+    options = RenderOptions(sample_rate=22050, compression=Compression.INT16)
+
+    if to_disk:
+        render_to_disk(song, options, estimate_memory(song, options))
+    else:
+        render(song, options)
+
+    assert set(VIBRATIONS.entries) == set(cached)
+    assert set(VIBRATIONS.prefixes) == {vibration.string for vibration in cached}
+
+
+# Test the window options
+@pytest.mark.parametrize(
+    "argv, message",
+    [
+        (["--start", "3", "--end", "2"], "argument --end: must be after --start"),
+        (["--end", "0"], "argument --end: must be after --start"),
+        (["--start", "-1"], "argument --start: must not be negative"),
+        (["--measures", "2:1"], "argument --measures: invalid measure range"),
+        (["--measures", "1:2", "--end", "2"], "not allowed with --start or --end"),
+    ],
+)
+def test_parse_args_invalid_window(
+    capsys: pytest.CaptureFixture[str], argv: List[str], message: str
+) -> None:
+    with pytest.raises(SystemExit):
+        parse_args(["song.yaml", *argv])
+
+    assert message in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "argv, start, end",
+    [
+        ([], 0, None),
+        (["--start", "1.5"], 1.5, None),
+        (["--start", "1", "--end", "2.5"], 1, 2.5),
+        (["--measures", "2"], 2, 4),
+        (["--measures", "1:2"], 0, 4),
+        (["--measures", "2:"], 2, 4),
+    ],
+)
+def test_get_options_window(
+    song: models.Song, argv: List[str], start: float, end: Optional[float]
+) -> None:
+    options = get_options(song, parse_args(["song.yaml", *argv]))
+
+    assert options.window.start.seconds == start
+    assert options.window.duration == (None if end is None else Time(end - start))
+
+
+@pytest.mark.parametrize(
+    "argv, message",
+    [
+        (["--start", "1000"], "no notes are audible in the window"),
+        (["--measures", "50:60"], "argument --measures: Tablature has only 2 measures"),
+    ],
+)
+def test_get_options_invalid_window(
+    song: models.Song, argv: List[str], message: str
+) -> None:
+    with pytest.raises(ArgumentTypeError, match=message):
+        get_options(song, parse_args(["song.yaml", *argv]))
+
+
+def test_main_invalid_window(
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    song_data: Dict[str, Any],
+    tmp_path: Path,
+) -> None:
+    path = tmp_path / "song.yaml"
+    path.write_text(yaml.safe_dump(song_data), encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["play-tab", str(path), "--start", "1000"])
+
+    # Windows that depend on the song are reported like other usage errors
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+
+    assert exit_info.value.code == 2
+    assert (
+        "play-tab: error: no notes are audible in the window" in capsys.readouterr().err
+    )
+
+
+# Test save function
+@pytest.mark.parametrize(
+    "sample_format, file_dtype, atol",
+    [(SampleFormat.S16LE, "int16", 1 / INT16_SCALE), (SampleFormat.F32LE, "float32", 0)],
+)
+def test_save_wav(
+    tmp_path: Path, sample_format: SampleFormat, file_dtype: str, atol: float
+) -> None:
+    samples, path = np.linspace(-1, 1, 1001), tmp_path / "song.wav"
+
+    save(samples, path, sample_format)
+
+    with AudioFile(str(path)) as file:
+        assert file.file_dtype == file_dtype
+        assert (file.samplerate, file.num_channels) == (SAMPLING_RATE, 1)
+        assert_allclose(file.read(file.frames)[0], samples.astype(np.float32), atol=atol)
+
+
+@pytest.mark.parametrize(
+    "sample_format, expected",
+    [
+        (SampleFormat.S16LE, np.array([-32767, -9830, 0, 8192, 32767], dtype="<i2")),
+        (SampleFormat.F32LE, np.array([-1.0, -0.3, 0.0, 0.25, 1.0], dtype="<f4")),
+    ],
+)
+@pytest.mark.parametrize("name", ["song.raw", "-"])
+def test_save_raw(
+    capsysbinary: pytest.CaptureFixture[bytes],
+    tmp_path: Path,
+    sample_format: SampleFormat,
+    expected: NDArray[Any],
+    name: str,
+) -> None:
+    samples = np.array([-1.0, -0.3, 0.0, 0.25, 1.0])
+
+    save(samples, tmp_path / name if name != "-" else STDOUT, sample_format)
+
+    # Raw PCM has no header, on stdout nothing but the samples is written
+    if name == "-":
+        assert capsysbinary.readouterr().out == expected.tobytes()
+    else:
+        assert (tmp_path / name).read_bytes() == expected.tobytes()
+
+
+# Test a draft render from the command line
+def test_main_draft(
+    monkeypatch: pytest.MonkeyPatch,
+    song: models.Song,
+    song_data: Dict[str, Any],
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    tmp_path: Path,
+) -> None:
+    path, output = tmp_path / "song.yaml", tmp_path / "song.raw"
+    path.write_text(yaml.safe_dump(song_data), encoding="utf-8")
+    argv = [str(path), "-o", str(output), "--format", "f32le", "--draft"]
+    monkeypatch.setattr(sys, "argv", ["play-tab", *argv])
+    options = RenderOptions(sample_rate=DRAFT_SAMPLING_RATE)
+    seed_vibrations(song, options)
+    expected = resample(render(song, options), DRAFT_SAMPLING_RATE, SAMPLING_RATE)
+    seed_vibrations(song, options)
+
+    main()
+
+    # Drafts are rendered at the reduced rate, then resampled to the output rate
+    assert np.array_equal(np.fromfile(output, dtype="<f4"), expected.astype("<f4"))
+
+
+@pytest.mark.parametrize("rate", ["0", "-1", "44100", "96000"])
+def test_parse_args_invalid_draft(capsys: pytest.CaptureFixture[str], rate: str) -> None:
+    with pytest.raises(SystemExit):
+        parse_args(["song.yaml", "--draft", rate])
+
+    assert "argument --draft: must be between 0 and 44100 Hz" in capsys.readouterr().err
+
+
+# Test that invalid values of the options are usage errors
+@pytest.mark.parametrize(
+    "argv, message",
+    [
+        (["--max-voices", "0"], "argument --max-voices: must be positive"),
+        (["--max-voices", "-2"], "argument --max-voices: must be positive"),
+        (["--segments", "0"], "argument --segments: must be positive"),
+        (["--warm-up", "0"], "argument --warm-up: must be positive"),
+        (["--silence-threshold", "0"], "argument --silence-threshold: must be"),
+        (["--silence-threshold", "80"], "argument --silence-threshold: must be"),
+        (["--silence-threshold", "nan"], "argument --silence-threshold: must be"),
+    ],
+)
+def test_parse_args_invalid_values(
+    capsys: pytest.CaptureFixture[str], argv: List[str], message: str
+) -> None:
+    with pytest.raises(SystemExit) as exit_info:
+        parse_args(["song.yaml", *argv])
+
+    assert exit_info.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+# Test the gain of progressive output
+def test_main_progressive_gain(
+    monkeypatch: pytest.MonkeyPatch,
+    song: models.Song,
+    song_data: Dict[str, Any],
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    tmp_path: Path,
+) -> None:
+    path, output = tmp_path / "song.yaml", tmp_path / "song.raw"
+    path.write_text(yaml.safe_dump(song_data), encoding="utf-8")
+    argv = [str(path), "-o", str(output), "--format", "f32le", "--progressive"]
+    monkeypatch.setattr(sys, "argv", ["play-tab", *argv, "--gain", "-6"])
+    seed_vibrations(song, RenderOptions())
+    mixed = np.concatenate(list(render_progressively(song, RenderOptions())))
+
+    main()
+
+    expected = np.clip(10 ** (-6 / 20) * mixed, -1, 1).astype("<f4")
+    assert np.array_equal(np.fromfile(output, dtype="<f4"), expected)
+
+
+def test_parse_args_gain(capsys: pytest.CaptureFixture[str]) -> None:
+    assert parse_args(["song.yaml", "-o", "-", "--progressive"]).gain is None
+
+    with pytest.raises(SystemExit):
+        parse_args(["song.yaml", "--gain", "3"])
+
+    assert "argument --gain: requires --progressive" in capsys.readouterr().err
@@ -0,0 +1,27 @@
+from typing import Callable
+
+import numpy as np
+import pytest
+
+from tablature import models
+from tablature.player import render
+from tablature.rendering import RenderOptions
+from tablature.progressive import render_progressively
+from guitar_synth.processing import normalize
+
+
+# Test render_progressively function
+@pytest.mark.parametrize("block_size", [1000, 8192])
+def test_render_progressively(
+    song: models.Song,
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    block_size: int,
+) -> None:
+    options = RenderOptions(sample_rate=22050)
+    seed_vibrations(song, options)
+
+    blocks = list(render_progressively(song, options, block_size))
+
+    # Concatenated blocks make the mix of render() before normalization
+    assert len(blocks) > 1
+    assert np.array_equal(normalize(np.concatenate(blocks)), render(song, options))
@@ -0,0 +1,153 @@
+from typing import Any, Dict, Tuple, Callable
+from dataclasses import replace
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from tablature import models
+from guitar_synth.track import AudioTrack, SparseAudioTrack
+from tablature.rendering import (
+    Submix,
+    Window,
+    RenderOptions,
+    read,
+    warm_up,
+    read_track,
+    get_submixes,
+    apply_effects,
+    read_sections,
+    get_vibrations,
+    get_synthesizer,
+    get_single_strums,
+    get_unique_strums,
+    read_track_in_segments,
+)
+from guitar_synth.temporal import Time, MeasuredTimeline
+from guitar_synth.synthesis import VIBRATIONS
+
+
+# Test read_track_in_segments function
+@pytest.mark.parametrize("name", ["rhythm", "lead"])
+def test_read_track_in_segments(
+    song: models.Song,
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    name: str,
+) -> None:
+    options = RenderOptions(sample_rate=22050)
+    track = song.tracks[name]
+    seed_vibrations(song, options)
+    synthesizer = get_synthesizer(track.instrument, options)
+    assert get_single_strums(track.tablature, synthesizer, options)
+
+    full = read_track(track, options)
+    segmented = read_track_in_segments(track, options, max_workers=2)
+
+    # Single strums rendered in place are the same on both sides of a boundary
+    assert np.array_equal(segmented.samples, full.samples)
+
+
+# Test apply_effects function
+@pytest.mark.parametrize("effects", [(), ("Compressor", "Reverb")])
+def test_apply_effects_sparse(
+    song: models.Song,
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    effects: Tuple[models.Effect, ...],
+) -> None:
+    options = RenderOptions(sample_rate=22050)
+    seed_vibrations(song, options)
+    track = song.tracks["rhythm"]
+    dense = read_track(track, options)
+    sparse = read_track(track, replace(options, sparse=True))
+    assert isinstance(sparse, SparseAudioTrack)
+
+    # Effects run block by block over the sparse track sound the same
+    output = apply_effects(sparse, effects)
+    assert output.dtype == np.float32
+    assert_allclose(output, apply_effects(dense, effects), atol=1e-6)
+
+
+# Test get_submixes function
+def test_get_submixes(song_data: Dict[str, Any]) -> None:
+    song_data["buses"] = {"room": {"effects": ["Reverb"]}}
+    song_data["tracks"]["lead"]["bus"] = "room"
+    song_data["tracks"]["bass"] = song_data["tracks"]["rhythm"] | {"weight": 0.5}
+    for name in ("rhythm", "bass"):
+        song_data["tracks"][name]["instrument"]["effects"] = ["Gain", "LowpassFilter"]
+
+    # Linear chains are shared, buses keep the inserts of their tracks
+    assert get_submixes(models.Song(**song_data)) == [
+        Submix(("Gain", "LowpassFilter"), {"rhythm": (), "bass": ()}),
+        Submix(("Reverb",), {"lead": ("Compressor",)}, "room"),
+    ]
+
+
+# Test read_sections function
+@pytest.mark.parametrize(
+    "window", [Window(), Window(Time(6), Time(9)), Window(Time(17.5))]
+)
+def test_read_sections(
+    song_data: Dict[str, Any],
+    seed_vibrations: Callable[[models.Song, RenderOptions], None],
+    window: Window,
+) -> None:
+    # Beats at 96 bpm fall between samples, so passes start at rounded offsets
+    tablature = song_data["tracks"]["rhythm"]["tablature"]
+    first, second = tablature.pop("measures")
+    tablature["beats_per_minute"] = 96
+    tablature["sections"] = {
+        "intro": {"measures": [first]},
+        "verse": {"repeat": 3, "measures": [first], "endings": [[second]]},
+    }
+    tablature["form"] = ["intro", "verse", "intro"]
+    del song_data["tracks"]["lead"]
+    song = models.Song(**song_data)
+    track = song.tracks["rhythm"]
+    options = RenderOptions(sample_rate=22050, window=window)
+    seed_vibrations(song, options)
+    synthesizer = get_synthesizer(track.instrument, options)
+    sections = AudioTrack(options.sample_rate, window.start)
+    flat = AudioTrack(options.sample_rate, window.start)
+
+    read_sections(track.tablature, synthesizer, sections, window)
+
+    # Only the vibrations of notes audible in the window are rendered
+    assert set(VIBRATIONS.entries) == set(get_vibrations([track], options))
+    read(track.tablature, synthesizer, flat, MeasuredTimeline(), window)
+    assert len(sections) == len(flat)
+    assert_allclose(sections.samples, flat.samples, atol=1e-12)
+
+
+# Test get_vibrations function
+@pytest.mark.parametrize("window", [Window(), Window(Time(1), Time(2))])
+def test_get_vibrations(song_data: Dict[str, Any], window: Window) -> None:
+    measures = song_data["tracks"]["lead"]["tablature"]["measures"]
+    measures.append({"time_signature": "4/4", "notes": "x-x-x-x-10-x v2.5; xxxx7x u 1/4"})
+    song = models.Song(**song_data)
+    options = RenderOptions(window=window)
+
+    # Notes resolved from the frets of whole tracks make the vibrations of the strums
+    for track in song.tracks.values():
+        synthesizer = get_synthesizer(track.instrument, options)
+        assert get_vibrations([track], options).keys() == {
+            vibration
+            for notation in get_unique_strums(track.tablature, synthesizer, window)
+            for vibration in synthesizer.get_vibrations(*notation)
+        }
+
+
+# Test warm_up function
+def test_warm_up(song: models.Song) -> None:
+    options = RenderOptions(sample_rate=22050)
+    vibrations = get_vibrations(song.tracks.values(), options)
+
+    # Vibrations shared by the tracks are rendered once, and only if missing
+    assert warm_up(song, options, max_workers=2) == len(vibrations)
+    assert VIBRATIONS.entries.keys() == vibrations.keys()
+    assert warm_up(song, options, max_workers=2) == 0
+    assert warm_up(song, replace(options, sampler=True)) == 0
+
+    # Reading the tablatures afterwards only mixes
+    for track in song.tracks.values():
+        read_track(track, options)
+    assert VIBRATIONS.misses == 0
@@ -0,0 +1,171 @@
+import json
+import time
+import threading
+from typing import Any, Dict, Tuple, Iterator
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import yaml
+import pytest
+
+from tablature.server import (
+    CACHE_SIZES,
+    JobStatus,
+    RenderJob,
+    RenderQueue,
+    RenderServer,
+    check_args,
+    trim_caches,
+    get_cache_info,
+)
+from guitar_synth.chord import Chord
+from guitar_synth.stroke import Velocity, Direction
+from guitar_synth.temporal import Time
+from guitar_synth.synthesis import VIBRATIONS, Synthesizer
+
+
+@pytest.fixture(scope="function")
+def queue(tmp_path: Path) -> Iterator[RenderQueue]:
+    queue = RenderQueue(1, tmp_path, max_finished_jobs=2)
+    yield queue
+    queue.shutdown()
+
+
+@pytest.fixture(scope="function")
+def server(queue: RenderQueue) -> Iterator[str]:
+    with RenderServer(("127.0.0.1", 0), queue) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+        thread.join()
+
+
+def request(
+    url: str, body: Any = None, content_type: str = "application/json"
+) -> Tuple[int, Dict[str, Any]]:
+    data = None if body is None else json.dumps(body).encode("utf-8")
+    try:
+        with urlopen(Request(url, data, {"Content-Type": content_type})) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def wait(job: RenderJob, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while job.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+# Test that jobs are rendered and reported in the metrics
+def test_render_job(
+    server: str, queue: RenderQueue, song_data: Dict[str, Any], tmp_path: Path
+) -> None:
+    path, output = tmp_path / "song.yaml", tmp_path / "song.wav"
+    path.write_text(yaml.safe_dump(song_data), encoding="utf-8")
+
+    status, body = request(f"{server}/jobs", {"args": [str(path), "-o", str(output)]})
+    assert status == 202
+    wait(queue.jobs[body["id"]])
+
+    status, body = request(f"{server}/jobs/{body['id']}")
+    assert status == 200
+    assert body["status"] == JobStatus.DONE
+    assert output.stat().st_size > 0
+
+    status, metrics = request(f"{server}/metrics")
+    assert metrics["done"] == 1
+    assert metrics["queue_depth"] == metrics["running"] == metrics["failed"] == 0
+    (cache_info,) = metrics["cache"].values()
+    assert {name: info["maxsize"] for name, info in cache_info.items()} == CACHE_SIZES
+    assert 0 < cache_info["vibrate"]["currsize"] <= CACHE_SIZES["vibrate"]
+
+
+# Test that invalid jobs are rejected with the message of the parser
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        ({"args": ["song.yaml", "--start", "3", "--end", "2"]}, "must be after --start"),
+        ({"args": ["song.yaml", "--measures", "x"]}, "argument --measures: invalid"),
+        ({"args": ["song.yaml", "-o", "-"]}, "jobs cannot stream to stdout"),
+        ({"args": ["../song.yaml"]}, "argument path: must be inside"),
+        ({"args": ["song.yaml", "-o", "/tmp/song.wav"]}, "argument -o/--output: must be"),
+        ({"args": []}, "the following arguments are required: path"),
+        ({}, "'args'"),
+    ],
+)
+def test_invalid_job(
+    server: str, queue: RenderQueue, body: Dict[str, Any], message: str
+) -> None:
+    status, reply = request(f"{server}/jobs", body)
+
+    assert status == 400
+    assert reply["error"].startswith("Invalid job: ")
+    assert message in reply["error"]
+    assert not queue.jobs
+
+
+# Test that jobs are only accepted as JSON, which cross-origin forms cannot send
+@pytest.mark.parametrize(
+    "content_type", ["text/plain", "application/x-www-form-urlencoded"]
+)
+def test_invalid_content_type(server: str, queue: RenderQueue, content_type: str) -> None:
+    status, reply = request(f"{server}/jobs", {"args": ["song.yaml"]}, content_type)
+
+    assert status == 415
+    assert reply["error"] == "Content-Type must be application/json"
+    assert not queue.jobs
+
+
+# Test that only the last finished jobs are kept, but all of them are counted
+def test_evict_finished_jobs(queue: RenderQueue, tmp_path: Path) -> None:
+    jobs = [queue.submit([str(tmp_path / f"missing{i}.yaml")]) for i in range(3)]
+    for job in jobs:
+        wait(job)
+
+    assert all(job.status == JobStatus.FAILED for job in jobs)
+    assert list(queue.jobs) == [job.id for job in jobs[1:]]
+    assert queue.get_metrics()["failed"] == 3
+
+
+def test_check_args() -> None:
+    assert check_args(["song.yaml", "-o", "song.wav"]).path == Path("song.yaml")
+
+    with pytest.raises(ValueError, match="argument --start: must not be negative"):
+        check_args(["song.yaml", "--start", "-1"])
+
+
+# Test that jobs only read and write files inside the root directory
+def test_check_args_root(tmp_path: Path) -> None:
+    (tmp_path / "songs").mkdir()
+    (tmp_path / "link").symlink_to(tmp_path.parent)
+
+    assert check_args(["songs/song.yaml", "-o", str(tmp_path / "song.wav")], tmp_path)
+
+    for args in (
+        ["../song.yaml"],
+        ["link/song.yaml"],
+        ["song.yaml", "-o", "songs/../../x"],
+    ):
+        with pytest.raises(ValueError, match="must be inside"):
+            check_args(args, tmp_path)
+
+
+# Test that caches grown past their size are trimmed
+def test_trim_caches(monkeypatch: pytest.MonkeyPatch, synthesizer: Synthesizer) -> None:
+    monkeypatch.setitem(CACHE_SIZES, "strum_strings", 0)
+    monkeypatch.setattr(VIBRATIONS, "maxsize", 1)
+    chord, velocity = Chord([0, 2, 2, 1, 0, 0]), Velocity(Direction.DOWN, Time(0.01))
+    synthesizer.strum_strings(chord, velocity)
+    vibrations = synthesizer.get_vibrations(chord, velocity)
+
+    trim_caches()
+
+    # Only the most recently used vibration is kept, with the prefix of its string
+    assert Synthesizer.strum_strings.cache_info().currsize == 0
+    assert list(VIBRATIONS.entries) == [vibrations[-1]]
+    assert list(VIBRATIONS.prefixes) == [vibrations[-1].string]
+    assert get_cache_info()["vibrate"]["maxsize"] == 1